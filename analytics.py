@@ -0,0 +1,114 @@
+# analytics.py
+import datetime
+from firebase_admin import firestore
+
+# analytics/{users,enrollments,orders} hold platform totals; one doc per UTC day and one per creator hold the breakdowns.
+ANALYTICS, DAILY, CREATORS = 'analytics', 'analytics_daily', 'analytics_creators'
+ROLES = ('customer', 'creator')
+DASHBOARD_DAYS, TOP_N = 30, 10
+
+
+class CourseUnavailable(ValueError):
+    """Raised when enrolling in a course that does not exist or is being deleted."""
+
+
+def day_key(moment=None):
+    return (moment or datetime.datetime.now(tz=datetime.timezone.utc)).strftime('%Y-%m-%d')
+
+
+def order_rollups(db, order_items, total_price, moment=None):
+    """Returns the (ref, merge data) increments an order adds to the revenue rollups.
+
+    The caller writes them in the same batch that completes the order, so the
+    rollups never count an order that failed part-way.
+    """
+    day, per_creator = day_key(moment), {}
+    for item in order_items:
+        revenue, units = per_creator.get(item.get('author_id') or 'unknown', (0, 0))
+        per_creator[item.get('author_id') or 'unknown'] = (revenue + item['price'] * item['quantity'], units + item['quantity'])
+    writes = [(db.collection(ANALYTICS).document('orders'), {'revenue': firestore.Increment(total_price), 'orders': firestore.Increment(1)}),
+              (db.collection(DAILY).document(day), {'day': day, 'revenue': firestore.Increment(total_price), 'orders': firestore.Increment(1)})]
+    for creator_id, (revenue, units) in per_creator.items():
+        writes.append((db.collection(CREATORS).document(creator_id), {'creator_id': creator_id, 'revenue': firestore.Increment(round(revenue, 2)), 'units': firestore.Increment(units)}))
+    return writes
+
+
+@firestore.transactional
+def set_role_in_transaction(transaction, db, user_ref, user_data):
+    """Writes a user's profile from role selection and moves them between the per-role counters."""
+    user_doc = user_ref.get(transaction=transaction)
+    previous = user_doc.to_dict().get('role') if user_doc.exists else None
+    counters = {} if user_doc.exists else {'total': firestore.Increment(1)}
+    if previous != user_data['role']:
+        counters[user_data['role']] = firestore.Increment(1)
+        if previous in ROLES: counters[previous] = firestore.Increment(-1)
+    transaction.set(user_ref, user_data)
+    if counters: transaction.set(db.collection(ANALYTICS).document('users'), counters, merge=True)
+
+
+@firestore.transactional
+def enroll_in_transaction(transaction, db, enrollment_ref, skill_ref, enrollment_data):
+    """Creates an enrollment once, counting it on the skill and the platform total; returns False if it existed.
+
+    The skill is read in the transaction, so an enrollment cannot land after delete_skill
+    has marked it `deleting` (and so after its background job has listed the enrollments).
+    """
+    skill_doc = skill_ref.get(transaction=transaction)
+    if not skill_doc.exists or skill_doc.to_dict().get('deleting'): raise CourseUnavailable("This course is no longer available.")
+    if enrollment_ref.get(transaction=transaction).exists: return False
+    transaction.set(enrollment_ref, enrollment_data)
+    transaction.update(skill_ref, {'enrollment_count': firestore.Increment(1)})
+    transaction.set(db.collection(ANALYTICS).document('enrollments'), {'total': firestore.Increment(1)}, merge=True)
+    return True
+
+
+def dashboard(db, days=DASHBOARD_DAYS, top_n=TOP_N, now=None):
+    """Reads the dashboard from rollup documents only: one get_all plus two top-N queries, whatever the data size."""
+    today = (now or datetime.datetime.now(tz=datetime.timezone.utc)).date()
+    day_keys = [(today - datetime.timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+    refs = [db.collection(ANALYTICS).document(name) for name in ('users', 'enrollments', 'orders')] + [db.collection(DAILY).document(day) for day in day_keys]
+    docs = {doc.reference.path: (doc.to_dict() or {}) if doc.exists else {} for doc in db.get_all(refs)}
+    users, enrollments, orders = (docs.get(ref.path, {}) for ref in refs[:3])
+    daily = [{'day': day, 'revenue': round(docs.get(ref.path, {}).get('revenue', 0), 2), 'orders': docs.get(ref.path, {}).get('orders', 0)} for day, ref in zip(day_keys, refs[3:])]
+    top_creators = [doc.to_dict() for doc in db.collection(CREATORS).order_by('revenue', direction=firestore.Query.DESCENDING).limit(top_n).stream()]
+    top_courses = [{'id': doc.id, 'name': doc.get('name'), 'enrollment_count': doc.get('enrollment_count') or 0}
+                   for doc in db.collection('skills').order_by('enrollment_count', direction=firestore.Query.DESCENDING).limit(top_n).select(['name', 'enrollment_count']).stream()]
+    return {'users': {'total': users.get('total', 0), **{role: users.get(role, 0) for role in ROLES}},
+            'enrollments': enrollments.get('total', 0), 'orders': orders.get('orders', 0), 'revenue': round(orders.get('revenue', 0), 2),
+            'daily': daily, 'top_creators': top_creators, 'top_courses': top_courses}
+
+
+def _aggregate(query, count=False, **sums):
+    """Runs count()/sum() aggregations on the server and returns {alias: value}."""
+    aggregation = query.count(alias='count') if count else None
+    for alias, field in sums.items(): aggregation = (aggregation or query).sum(field, alias=alias)
+    return {result.alias: result.value or 0 for result in aggregation.get()[0]}
+
+
+def rebuild(db, days=DASHBOARD_DAYS, now=None):
+    """Recomputes every rollup from the source collections with aggregation queries, for backfills and drift.
+
+    Per-creator revenue needs author_id/line_total on order items, which orders
+    written before the rollups existed do not have; those are counted in the daily
+    and platform totals only.
+    """
+    batch = db.batch()
+    users = db.collection('users')
+    counts = {role: _aggregate(users.where(filter=firestore.FieldFilter('role', '==', role)), count=True)['count'] for role in ROLES}
+    batch.set(db.collection(ANALYTICS).document('users'), {'total': _aggregate(users, count=True)['count'], **counts})
+    batch.set(db.collection(ANALYTICS).document('enrollments'), {'total': _aggregate(db.collection('enrollments'), count=True)['count']})
+    totals = _aggregate(db.collection('orders'), count=True, revenue='total_price')
+    batch.set(db.collection(ANALYTICS).document('orders'), {'orders': totals['count'], 'revenue': totals['revenue']})
+    batch.commit()
+    start = (now or datetime.datetime.now(tz=datetime.timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(days):
+        day_start = start - datetime.timedelta(days=offset)
+        in_day = db.collection('orders').where(filter=firestore.FieldFilter('created_at', '>=', day_start)).where(filter=firestore.FieldFilter('created_at', '<', day_start + datetime.timedelta(days=1)))
+        result = _aggregate(in_day, count=True, revenue='total_price')
+        db.collection(DAILY).document(day_key(day_start)).set({'day': day_key(day_start), 'orders': result['count'], 'revenue': result['revenue']})
+    for skill in db.collection('skills').select([]).stream():
+        skill.reference.update({'enrollment_count': _aggregate(db.collection('enrollments').where(filter=firestore.FieldFilter('skill_id', '==', skill.id)), count=True)['count']})
+    for creator in users.where(filter=firestore.FieldFilter('role', '==', 'creator')).select([]).stream():
+        sold = db.collection_group('items').where(filter=firestore.FieldFilter('author_id', '==', creator.id))
+        result = _aggregate(sold, revenue='line_total', units='quantity')
+        if result['revenue'] or result['units']: db.collection(CREATORS).document(creator.id).set({'creator_id': creator.id, 'revenue': result['revenue'], 'units': result['units']})
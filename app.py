@@ -1,34 +1,100 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, send_from_directory
 from functools import wraps
-import firebase_admin
-from firebase_admin import credentials, auth as admin_auth, firestore
+from firebase_admin import auth as admin_auth, firestore
 import os
 import traceback
+import threading
 import datetime
-import cloudinary
 import cloudinary.uploader
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
 import re
 from markupsafe import escape, Markup
 import math
 import json
+import hashlib
+import mimetypes
+from user_profiles import UserProfileLoader
+from course_detail import load_course_detail
+from search_index import SearchIndex
+from catalog_mirror import CatalogMirror, page_cursor, parse_page_cursor
+from fragment_cache import FragmentCache
+from shared_cache import SharedCache, TieredCache, cache_backend
+from orders import CartError, price_cart, write_order
+from image_uploads import CloudinaryUploader, ImageUploadQueue, LocalUploader
+from bulk_delete import BulkDeleter, delete_trees, find_orphans
+from enrollments import EnrollmentCache
+from config import load_config, private_directory
+from assets import IMMUTABLE_CACHE_CONTROL, AssetManifest
+from images import ImageUrls
+from conditional import PageValidators, file_fingerprint
+from clients import FirestoreClients
+from memory_firestore import MemoryFirestore
+from async_firestore import AsyncFirestore, creator_queries, fetch_sync, gather_queries, home_queries
+import rpc_profiler
+from rpc_profiler import EndpointMetrics, instrument_firestore, instrument_module
+import resilience
+from resilience import Backend, BackendUnavailable, guard_firestore, guard_module
+import analytics
+from analytics import CourseUnavailable, enroll_in_transaction, set_role_in_transaction
+from lessons import add_lesson_in_transaction, backfill_outline_in_transaction, delete_lesson_in_transaction, get_outline, swap_lesson_order_in_transaction, update_lesson_in_transaction
 
 load_dotenv()
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-app.secret_key = os.environ.get('FLASK_SECRET_KEY')
+load_config(app)
+if app.config['JINJA_BYTECODE_CACHE_DIR']:
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(private_directory(app.config['JINJA_BYTECODE_CACHE_DIR']))}
 cloudinary.config(cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'), api_key=os.environ.get('CLOUDINARY_API_KEY'), api_secret=os.environ.get('CLOUDINARY_API_SECRET'), secure=True)
-db = None
-try:
-    cred = credentials.Certificate(os.path.join(os.path.dirname(__file__), 'nissahub-firebase-service-account.json'))
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("Firebase Admin SDK and Firestore Client Initialized Successfully.")
-except Exception as e:
-    print(f"CRITICAL ERROR initializing Firebase Admin SDK: {e}")
+# Per-request Firestore/Cloudinary accounting for Server-Timing, the slow-request log and /admin/metrics; RPC_PROFILER=0 turns it off.
+RPC_PROFILER, SLOW_REQUEST_MS = os.environ.get('RPC_PROFILER', '1') == '1', float(os.environ.get('SLOW_REQUEST_MS', 500))
+endpoint_metrics = EndpointMetrics()
+if RPC_PROFILER: instrument_module(cloudinary.uploader, 'cloudinary', ('upload', 'destroy'))
+# Per-call deadlines, retried reads, in-flight caps and circuit breakers for Firestore and Cloudinary, within a
+# per-request budget of REQUEST_BUDGET seconds; RESILIENCE=0 turns them off.
+RESILIENCE, REQUEST_BUDGET = os.environ.get('RESILIENCE', '1') == '1', float(os.environ.get('REQUEST_BUDGET', 8))
+firestore_backend = Backend('firestore', timeout=float(os.environ.get('FIRESTORE_TIMEOUT', 5)), max_in_flight=int(os.environ.get('FIRESTORE_MAX_IN_FLIGHT', 32)), extra_kwargs={'retry': None})
+cloudinary_backend = Backend('cloudinary', timeout=float(os.environ.get('CLOUDINARY_TIMEOUT', 30)), max_in_flight=int(os.environ.get('CLOUDINARY_MAX_IN_FLIGHT', 4)))
+if RESILIENCE: guard_module(cloudinary.uploader, cloudinary_backend, ('upload', 'destroy'), idempotent=('destroy',))
+
+def prepare_client(client):
+    """Applied to every Firestore client built: RPC accounting innermost, so each attempt is recorded, then the resilience layer."""
+    if RPC_PROFILER: client = instrument_firestore(client)
+    return guard_firestore(client, firestore_backend) if RESILIENCE else client
+
+# Clients are built on first use in each worker process (see create_app), never at import.
+firebase_clients = FirestoreClients(os.environ.get('FIREBASE_CREDENTIALS', os.path.join(os.path.dirname(__file__), 'nissahub-firebase-service-account.json')), on_client=prepare_client)
+# DATA_BACKEND=memory runs on an empty in-process Firestore stand-in (benchmarks, offline work), MEMORY_FIRESTORE_LATENCY_MS per RPC.
+MEMORY_BACKEND = os.environ.get('DATA_BACKEND', 'firestore') == 'memory'
+if MEMORY_BACKEND:
+    db = MemoryFirestore(latency=float(os.environ.get('MEMORY_FIRESTORE_LATENCY_MS', 0)) / 1000, jitter=float(os.environ.get('MEMORY_FIRESTORE_JITTER', 0)),
+                         on_rpc=(lambda method, started, docs: rpc_profiler.record('firestore', method, started, docs)) if RPC_PROFILER else None)
+else: db = firebase_clients.lazy() if firebase_clients.configured else None
+if not db: print(f"CRITICAL ERROR initializing Firebase Admin SDK: credentials file {firebase_clients.credentials_path} not found.")
+
+# With SHARED_CACHE_PATH set, these caches read through one file shared by the host's workers, behind a per-process LRU.
+shared_cache = SharedCache(app.config['SHARED_CACHE_PATH'], max_entries=int(os.environ.get('SHARED_CACHE_ENTRIES', 100_000))) if app.config['SHARED_CACHE_PATH'] else None
+cache_tiers = {}
+def shared_backend(namespace, maxsize, ttl, local_ttl=None):
+    cache_tiers[namespace] = cache_backend(shared_cache, namespace, maxsize, ttl, local_ttl=int(os.environ.get('SHARED_CACHE_LOCAL_TTL', 5)) if local_ttl is None else local_ttl)
+    return cache_tiers[namespace]
+user_profiles = UserProfileLoader(db, cache=shared_backend('user_profiles', int(os.environ.get('USER_CACHE_SIZE', 2048)), int(os.environ.get('USER_CACHE_TTL', 300))))
+# Short-lived cache of the signed-in user's own document, read by login_required on every request; during an outage the last copy is used.
+user_context = UserProfileLoader(db, cache=shared_backend('user_context', int(os.environ.get('USER_CACHE_SIZE', 2048)), int(os.environ.get('USER_CONTEXT_TTL', 30))), stale_on=(BackendUnavailable,))
+enrollments = EnrollmentCache(db, cache=shared_backend('enrollments', int(os.environ.get('ENROLLMENT_CACHE_SIZE', 4096)), int(os.environ.get('ENROLLMENT_CACHE_TTL', 60))))
+# FIRESTORE_ASYNC=1 fans independent reads out concurrently on an AsyncClient (see fetch_reads).
+async_db = AsyncFirestore(firebase_clients.async_client) if db and not MEMORY_BACKEND and os.environ.get('FIRESTORE_ASYNC') == '1' else None
+fragment_cache = FragmentCache(cache=shared_backend('fragments', 512, int(os.environ.get('FRAGMENT_CACHE_TTL', 60))), stale_on=(BackendUnavailable,))
+search_index = SearchIndex()
+# CATALOG_MIRROR=1 serves published skills/products from snapshot listeners, falling back to queries while it lags.
+catalog_mirror = CatalogMirror(max_lag=int(os.environ.get('CATALOG_MIRROR_MAX_LAG', 5))) if db and os.environ.get('CATALOG_MIRROR') == '1' else None
+# Fingerprinted static files from `python assets.py`; without a built manifest url_for('static') is unchanged.
+assets = AssetManifest(app.static_folder) if app.config['USE_ASSET_MANIFEST'] else None
+# Conditional GET: ETags change with each deploy of templates/assets and at least every ETAG_MAX_AGE seconds.
+RELEASE = (os.environ.get('RELEASE') or file_fingerprint(os.path.join(app.root_path, app.template_folder), os.path.join(app.static_folder, 'dist'))) if app.config['CONDITIONAL_GET'] else ''
+ETAG_MAX_AGE = int(os.environ.get('ETAG_MAX_AGE', 300))
+image_urls = ImageUrls(lambda filename: url_for('static', filename=filename), maxsize=int(os.environ.get('IMAGE_URL_CACHE_SIZE', 4096)))
 
 SKILL_CATEGORIES = [ "Handicrafts", "Fashion & Design", "Culinary Arts", "Arts & Crafts", "Digital Arts", "Beauty", "Other" ]
 
@@ -37,23 +103,118 @@ PRODUCT_CATEGORIES = [
     "Beauty & Personal Care", "Craft Supplies", "Digital Products", "Other"
 ]
 
+PAGE_SIZE, MAX_PAGE_SIZE = 24, 60
+
 # --- HELPER FUNCTIONS ---
 
-def is_enrolled(user_id, skill_id):
-    """Checks if a user is enrolled in a specific skill."""
-    if not user_id or not skill_id:
-        return False
+def is_enrolled(user_id, skill_id, confirm=False):
+    """Checks if a user is enrolled in a specific skill. Pass confirm=True where a miss denies access."""
     try:
-        enrollment_doc_ref = db.collection('enrollments').document(f'{user_id}_{skill_id}')
-        enrollment_doc = enrollment_doc_ref.get()
-        return enrollment_doc.exists
+        return enrollments.is_enrolled(user_id, skill_id, confirm=confirm)
     except Exception:
         traceback.print_exc()
         return False
 
+def enrolled_in(user_id, skill_ids):
+    """Returns the subset of skill_ids the user is enrolled in, answered from the enrollment cache."""
+    try:
+        return enrollments.enrolled_in(user_id, skill_ids)
+    except Exception:
+        traceback.print_exc()
+        return frozenset()
+
+_worker = {'pid': None, 'lock': threading.Lock()}
+
+def warm_up():
+    """Opens the Firestore channel and builds the search index before the worker takes traffic."""
+    db.collection('skills').limit(1).get()
+    search_index.rebuild(db)
+
+def precompile_templates():
+    """Loads every template into Jinja's in-memory cache, compiling it or reading it from the bytecode cache."""
+    for name in app.jinja_env.list_templates(): app.jinja_env.get_template(name)
+
+def start_worker(warm=False):
+    """Per-process startup, run once in each worker after any fork: templates, Firebase app, client, spooled uploads, background refresh."""
+    with _worker['lock']:
+        if _worker['pid'] == os.getpid(): return
+        _worker['pid'] = os.getpid()
+        if app.config['PRECOMPILE_TEMPLATES']: precompile_templates()
+        if not db: return
+        if firebase_clients.configured: firebase_clients.app()
+        if catalog_mirror: catalog_mirror.start(db)
+        try: image_uploads.recover()
+        except Exception: traceback.print_exc()
+        refresh_interval = int(os.environ.get('SEARCH_INDEX_REFRESH', 300))
+        if warm:
+            try: warm_up()
+            except Exception: traceback.print_exc()
+        search_index.start_background_refresh(db, interval=refresh_interval, delay=refresh_interval if search_index.ready else 0,
+                                              full_interval=int(os.environ.get('SEARCH_INDEX_FULL_REFRESH', 86400)))
+
+def create_app(warm=None):
+    """Application factory for pre-forking servers, e.g. gunicorn 'app:create_app()'.
+
+    Importing this module builds no gRPC client, so calling this in each worker (the
+    default, without --preload) gives every process its own channels. WARM_UP=1 (or
+    warm=True) opens them and fills the search index before the first request.
+    """
+    start_worker(warm=os.environ.get('WARM_UP') == '1' if warm is None else warm)
+    return app
+
+@app.before_request
+def ensure_worker_started(): start_worker()
+
+@app.before_request
+def start_rpc_profile():
+    if RPC_PROFILER: rpc_profiler.start()
+
+@app.before_request
+def start_request_budget():
+    if RESILIENCE: resilience.start_budget(REQUEST_BUDGET)
+
+@app.teardown_request
+def end_request_budget(error=None): resilience.end_budget()
+
+@app.errorhandler(BackendUnavailable)
+def backend_unavailable(error):
+    """Reached only where a view has no fallback of its own: a 503 page the browser may retry, instead of a 500."""
+    app.logger.warning("Backend unavailable for %s %s: %s", request.method, request.path, error)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest': response = jsonify({'status': 'error', 'message': 'Service temporarily unavailable.'})
+    else: response = app.make_response(render_template('unavailable.html', page_title="Temporarily unavailable"))
+    response.status_code, response.headers['Retry-After'] = 503, str(firestore_backend.reset_after)
+    return response
+
+@app.after_request
+def finish_rpc_profile(response):
+    profile = rpc_profiler.finish() if RPC_PROFILER else None
+    if not profile or request.endpoint == 'static': return response
+    response.headers['Server-Timing'] = profile.server_timing()
+    endpoint_metrics.observe(request.endpoint or 'unmatched', profile)
+    if profile.elapsed_ms() >= SLOW_REQUEST_MS:
+        app.logger.warning("Slow request %s %s: %.0f ms, RPCs: %s", request.method, request.path, profile.elapsed_ms(), json.dumps(profile.breakdown()))
+    return response
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and assets and 'filename' in values:
+        values['filename'] = assets.lookup(values['filename']) or values['filename']
+
+def serve_static(filename):
+    """Fingerprinted files get a precompressed variant when accepted, and are cached for a year."""
+    if not assets or not assets.is_hashed(filename): return app.send_static_file(filename)
+    path, encoding = assets.variant(filename, request.accept_encodings)
+    response = send_from_directory(app.static_folder, path, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding: response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+app.view_functions['static'] = serve_static
+
 @app.context_processor
 def utility_processor():
-    return dict(floor=math.floor, ceil=math.ceil, is_enrolled=is_enrolled)
+    return dict(floor=math.floor, ceil=math.ceil, is_enrolled=is_enrolled, enrolled_in=enrolled_in, responsive_image=image_urls.img)
 
 @app.template_filter('format_datetime')
 def format_datetime(timestamp):
@@ -63,19 +224,8 @@ def format_datetime(timestamp):
 
 @app.template_filter('transform_cloudinary')
 def transform_cloudinary_url(url, type='card'):
-    if not url or 'res.cloudinary.com' not in url:
-        return url_for('static', filename='img/skill_placeholder_default.jpg')
-    
-    if type == 'card':
-        transformation = "w_400,h_300,c_fill,g_auto"
-    else:
-        return url
-
-    if '/upload/' in url:
-        parts = url.split('/upload/')
-        return f"{parts[0]}/upload/{transformation}/{parts[1]}"
-    
-    return url
+    """The plain src for an image preset (card, detail, avatar, thumb); see responsive_image for srcset."""
+    return image_urls.src(url, type)
 
 @app.context_processor
 def inject_user_data():
@@ -92,10 +242,9 @@ def login_required(f):
         
         if 'user' not in g:
             try:
-                user_doc = db.collection('users').document(session['user_id']).get()
-                if user_doc.exists:
-                    g.user = user_doc.to_dict()
-                    g.user['uid'] = session['user_id']
+                user_profile = user_context.get(session['user_id'], label=request.endpoint)
+                if user_profile:
+                    g.user = {**user_profile, 'uid': session['user_id']}
                 else:
                     # FIX: Create a more complete user object for users who have not yet selected a role.
                     # This ensures `current_user.email` exists in templates.
@@ -105,6 +254,10 @@ def login_required(f):
                         'role': None,
                         'displayName': None
                     }
+            except BackendUnavailable:
+                # user_context already fell back to the last copy it fetched; with none, the request gets the 503 page rather than
+                # running on the session alone, where a disabled account would not be noticed.
+                raise
             except Exception as e:
                 traceback.print_exc()
                 flash(f"Could not verify your account details: {e}", "error")
@@ -144,42 +297,216 @@ def guest_only(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def get_public_id_from_url(url):
-    try:
-        parts = url.split("/"); filename = parts[-1]; folder = parts[-2]
-        return f"{folder}/{filename.rsplit('.', 1)[0]}"
-    except: return None
-
-def generate_search_tokens(text):
-    if not text: return []
-    text_lower = text.lower(); words = set(re.findall(r'\b\w+\b', text_lower)); tokens = set()
-    for word in words:
-        for i in range(1, len(word) + 1):
-            tokens.add(word[:i])
-    return list(tokens)
+def invalidate_user(user_id):
+    """Drops a user from both the login context cache and the public profile cache."""
+    user_context.invalidate(user_id); user_profiles.invalidate(user_id)
+
+def revoke_user_context(user_id):
+    """For changes that must take effect at once (disabling an account, removing admin rights).
+
+    Clearing user_context bumps its shared namespace, so every worker on the host re-reads
+    the user within the tier's check interval rather than serving its local copy. Without
+    SHARED_CACHE_PATH other workers keep theirs for up to USER_CONTEXT_TTL seconds.
+    """
+    invalidate_user(user_id); user_context.clear()
+
+def catalog_changed(kind):
+    """Call after writing a skill or product: drops cached card grids and makes the mirror wait for the write."""
+    fragment_cache.bump()
+    if catalog_mirror: catalog_mirror.note_write(kind)
+
+def mirror_serving(*kinds):
+    return catalog_mirror is not None and catalog_mirror.serving(*kinds)
+
+def on_image_uploaded(job):
+    if job['collection'] == 'users': invalidate_user(job['doc_id']); fragment_cache.bump()
+    else: catalog_changed('skill' if job['collection'] == 'skills' else 'product')
+
+image_uploader = LocalUploader(os.path.join(app.static_folder, 'uploads')) if os.environ.get('IMAGE_UPLOADER') == 'local' else CloudinaryUploader()
+image_uploads = ImageUploadQueue(db, image_uploader, spool_dir=os.environ.get('UPLOAD_SPOOL_DIR'), workers=int(os.environ.get('UPLOAD_WORKERS', 2)), on_complete=on_image_uploaded,
+                               status_cache=shared_backend('upload_jobs', 10000, 3600, local_ttl=0) if shared_cache else None)
+bulk_deleter = BulkDeleter(db, workers=int(os.environ.get('BULK_DELETE_WORKERS', 2)), uploader=image_uploader,
+                           status_cache=shared_backend('bulk_delete_jobs', 10000, 3600, local_ttl=0) if shared_cache else None)
+
+def queue_image_upload(form_field, folder, transformation, collection, doc_id):
+    """Spools request.files[form_field] and queues it for upload onto collection/doc_id; returns the job id or None."""
+    image_file = request.files.get(form_field)
+    if not image_file or image_file.filename == '': return None
+    return image_uploads.enqueue(image_file, folder, transformation, collection, doc_id, 'avatar_url' if collection == 'users' else 'image_url', user_id=session.get('user_id'))
+
+def page_validators(*parts, last_modified=None):
+    """Validators for the current page as g.user sees it; None when conditional GET is off or flashes are pending."""
+    if not app.config['CONDITIONAL_GET'] or request.method != 'GET' or session.get('_flashes'): return None
+    return PageValidators([request.endpoint, request.full_path, g.get('user'), *parts], release=RELEASE, max_age=ETAG_MAX_AGE, last_modified=last_modified)
+
+def not_modified(validators):
+    """A 304 when the browser's If-None-Match already names this version of the page, else None."""
+    return validators.not_modified() if validators and validators.is_fresh(request) else None
+
+def with_validators(validators, body):
+    response = app.make_response(body)
+    return validators.apply(response) if validators else response
+
+def fragment_digest(html):
+    return hashlib.sha1(str(html).encode()).hexdigest()
+
+def touch_skill_community(skill_id):
+    """Moves the skill's update_time on discussion changes, so skill page ETags cover the community section."""
+    try: db.collection('skills').document(skill_id).update({'community_updated_at': firestore.SERVER_TIMESTAMP})
+    except Exception: traceback.print_exc()
+
+def get_page_size():
+    return min(max(request.args.get('page_size', PAGE_SIZE, type=int) or PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+def paginate_query(query, order_field, cursor=None, page_size=PAGE_SIZE):
+    """Runs one keyset page of `query`, newest first on `order_field`, starting after `cursor`.
+
+    Cursors carry the last document's order value and id (see catalog_mirror.page_cursor), so
+    a page resumes in place even once that document is deleted; one that does not parse
+    gives an empty page rather than starting over.
+    """
+    query = query.order_by(order_field, direction=firestore.Query.DESCENDING).order_by('__name__', direction=firestore.Query.DESCENDING)
+    if cursor:
+        if (position := parse_page_cursor(cursor)) is None: return [], None
+        query = query.start_after({order_field: position[0], '__name__': position[1]})
+    docs = list(query.limit(page_size + 1).stream())
+    if len(docs) <= page_size: return docs, None
+    return docs[:page_size], page_cursor(docs[page_size - 1].id, docs[page_size - 1].to_dict().get(order_field))
+
+def render_cards(template_name, **context):
+    return Markup(render_template(template_name, **context).strip())
+
+def cached_product_cards(cursor=None, page_size=PAGE_SIZE, search_query=''):
+    """Rendered marketplace card grid for one page slice, served from the fragment cache when possible."""
+    def render():
+        products_list, next_cursor = fetch_marketplace_page(cursor, page_size, search_query)
+        return render_cards('partials/_product_cards.html', products=products_list), next_cursor
+    return fragment_cache.get_or_render(('marketplace', search_query, search_index.ready, cursor, page_size), render)
+
+def cached_skill_cards(search_query='', selected_category='', cursor=None, page_size=PAGE_SIZE):
+    def render():
+        skills_list, next_cursor = fetch_skills_page(search_query, selected_category, cursor, page_size)
+        return render_cards('partials/_skill_cards.html', skills=skills_list), next_cursor
+    return fragment_cache.get_or_render(('skills', search_query, search_index.ready, selected_category, cursor, page_size), render)
+
+def paginate_ids(ids, cursor=None, page_size=PAGE_SIZE):
+    """Keyset page over an already-ranked list of ids; the cursor is the last id shown.
+
+    A cursor no longer in `ids` (its document dropped out of the results) gives an empty
+    page, since restarting would repeat what the client already shows.
+    """
+    if cursor and cursor not in ids: return [], None
+    start = ids.index(cursor) + 1 if cursor else 0
+    page_ids = ids[start:start + page_size]
+    return page_ids, (page_ids[-1] if start + page_size < len(ids) else None)
+
+def fetch_ranked_docs(collection, ids):
+    """Fetches search hits with one get_all, keeping rank order and dropping anything no longer published."""
+    kind = collection[:-1]
+    if mirror_serving(kind): return catalog_mirror.get_many(kind, ids)
+    refs = [db.collection(collection).document(doc_id) for doc_id in ids]
+    docs = {doc.id: doc for doc in db.get_all(refs)} if refs else {}
+    return [{'id': doc_id, **docs[doc_id].to_dict()} for doc_id in ids if doc_id in docs and docs[doc_id].exists and docs[doc_id].to_dict().get('isPublished')]
+
+def fetch_marketplace_page(cursor=None, page_size=PAGE_SIZE, search_query=''):
+    if search_query:
+        if not search_index.ready: return [], None
+        page_ids, next_cursor = paginate_ids(search_index.search(search_query, kind='product'), cursor, page_size)
+        products_list = fetch_ranked_docs('products', page_ids)
+    elif mirror_serving('product'):
+        products_list, next_cursor = catalog_mirror.page('product', cursor, page_size)
+    else:
+        products_query = db.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True))
+        docs, next_cursor = paginate_query(products_query, 'created_at', cursor, page_size)
+        products_list = [{'id': doc.id, **doc.to_dict()} for doc in docs]
+    authors = user_profiles.get_many(p.get('author_id') for p in products_list)
+    for product_data in products_list: product_data['author'] = authors.get(product_data.get('author_id'))
+    return products_list, next_cursor
+
+def fetch_skills_page(search_query='', selected_category='', cursor=None, page_size=PAGE_SIZE):
+    if search_query and search_index.ready:
+        page_ids, next_cursor = paginate_ids(search_index.search(search_query, kind='skill', category=selected_category), cursor, page_size)
+        return fetch_ranked_docs('skills', page_ids), next_cursor
+    if not search_query and mirror_serving('skill'): return catalog_mirror.page('skill', cursor, page_size, category=selected_category or None)
+    query = db.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True))
+    if selected_category: query = query.where(filter=firestore.FieldFilter('category', '==', selected_category))
+    # Legacy prefix tokens only serve searches while the in-memory index is still warming up.
+    if search_query: query = query.where(filter=firestore.FieldFilter('search_tokens', 'array_contains', search_query))
+    docs, next_cursor = paginate_query(query, 'created_at', cursor, page_size)
+    return [{'id': doc.id, **doc.to_dict()} for doc in docs], next_cursor
+
+def review_stats(skill_data, count_delta=0, rating_delta=0):
+    """Returns the skill's denormalized review fields after applying the given deltas."""
+    review_count = max(skill_data.get('review_count', 0) + count_delta, 0)
+    rating_sum = max(skill_data.get('rating_sum', 0) + rating_delta, 0) if review_count else 0
+    return {'review_count': review_count, 'rating_sum': rating_sum, 'rating_avg': round(rating_sum / review_count, 1) if review_count else 0}
+
+@firestore.transactional
+def add_review_in_transaction(transaction, skill_ref, review_ref, review_data):
+    skill_data = skill_ref.get(transaction=transaction).to_dict() or {}
+    transaction.set(review_ref, review_data)
+    transaction.update(skill_ref, review_stats(skill_data, 1, review_data.get('rating', 0)))
+
+@firestore.transactional
+def delete_review_in_transaction(transaction, skill_ref, review_ref):
+    skill_data = skill_ref.get(transaction=transaction).to_dict() or {}
+    review_doc = review_ref.get(transaction=transaction)
+    if not review_doc.exists: return
+    transaction.delete(review_ref)
+    transaction.update(skill_ref, review_stats(skill_data, -1, -review_doc.to_dict().get('rating', 0)))
+
+def fetch_reads(build, *args, names=None):
+    """Runs the reads `build(client, *args)` describes and returns name -> list of dicts (or a dict for document refs).
+
+    With the async client every read is issued at once, so `names` is ignored; the
+    sync client runs only the reads in `names` (all by default), one after another.
+    """
+    if async_db: return async_db.run(gather_queries, build, *args)
+    return {name: fetch_sync(target) for name, target in build(db, *args).items() if names is None or name in names}
 
 @app.route('/')
 @login_required
 def home():
-    featured_skills, recent_skills, recent_products = [], [], []
-    users_cache = {}
+    fetched = {}
+    def home_docs(name):
+        if name not in fetched and mirror_serving():
+            fetched.update(featured=catalog_mirror.page('skill', page_size=6, featured=True)[0], recent=catalog_mirror.page('skill', page_size=6, featured=False)[0],
+                           products=catalog_mirror.page('product', page_size=6)[0])
+        if name not in fetched: fetched.update(fetch_reads(home_queries, names=[name]))
+        return fetched[name]
+    def skills_section(title, name):
+        return render_cards('partials/_card_section.html', title=title, kind='skill', items=home_docs(name))
+    def products_section():
+        recent_products = home_docs('products')
+        authors = user_profiles.get_many(p.get('author_id') for p in recent_products)
+        for product_data in recent_products: product_data['author'] = authors.get(product_data.get('author_id'), {})
+        return render_cards('partials/_card_section.html', title="New in the Marketplace", kind='product', items=recent_products)
+    sections = {'featured_section': Markup(''), 'products_section': Markup(''), 'recent_section': Markup('')}
     try:
-        featured_query = db.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('isFeatured', '==', True)).order_by('created_at', direction=firestore.Query.DESCENDING).limit(6)
-        featured_skills = [{'id': doc.id, **doc.to_dict()} for doc in featured_query.stream()]
-        recent_query = db.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('isFeatured', '==', False)).order_by('created_at', direction=firestore.Query.DESCENDING).limit(6)
-        recent_skills = [{'id': doc.id, **doc.to_dict()} for doc in recent_query.stream()]
-        products_query = db.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True)).order_by('created_at', direction=firestore.Query.DESCENDING).limit(6)
-        for doc in products_query.stream():
-            product_data = {'id': doc.id, **doc.to_dict()}
-            author_id = product_data.get('author_id')
-            if author_id and author_id not in users_cache:
-                author_doc = db.collection('users').document(author_id).get()
-                users_cache[author_id] = author_doc.to_dict() if author_doc.exists else {}
-            product_data['author'] = users_cache.get(author_id, {})
-            recent_products.append(product_data)
+        sections['featured_section'] = fragment_cache.get_or_render('home:featured', lambda: skills_section("Featured Courses", 'featured'))
+        sections['products_section'] = fragment_cache.get_or_render('home:products', products_section)
+        if not sections['featured_section']: sections['recent_section'] = fragment_cache.get_or_render('home:recent', lambda: skills_section("Recently Added Courses", 'recent'))
     except Exception:
         flash("Could not load all homepage content. An admin may need to configure database indexes.", "error"); traceback.print_exc()
-    return render_template('index.html', featured_skills=featured_skills, recent_skills=recent_skills, recent_products=recent_products)
+    validators = page_validators({name: fragment_digest(html) for name, html in sections.items()})
+    if (response := not_modified(validators)): return response
+    return with_validators(validators, render_template('index.html', **sections))
+
+@app.route('/uploads')
+@login_required
+def upload_status_list(): return jsonify({'status': 'success', 'jobs': image_uploads.jobs_for_user(session['user_id'])})
+@app.route('/uploads/<string:job_id>')
+@login_required
+def upload_status(job_id):
+    job = image_uploads.status(job_id)
+    if not job or job.get('user_id') != session['user_id']: return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+    return jsonify({'status': 'success', 'job': job})
+@app.route('/bulk-deletes/<string:job_id>')
+@login_required
+def bulk_delete_status(job_id):
+    job = bulk_deleter.status(job_id)
+    if not job or job.get('user_id') != session['user_id']: return jsonify({'status': 'error', 'message': 'Delete job not found.'}), 404
+    return jsonify({'status': 'success', 'job': job})
 
 @app.route('/cart')
 @login_required
@@ -203,27 +530,13 @@ def submit_checkout():
         if not cart_items:
             flash("Your cart is empty.", "error"); return redirect(url_for('cart_page'))
         
-        total_price = sum(float(item['price']) * int(item['quantity']) for item in cart_items)
-        
-        order_ref = db.collection('orders').document()
-        order_data = {
-            'user_id': session['user_id'], 'created_at': firestore.SERVER_TIMESTAMP,
-            'total_price': total_price, 'status': 'completed'
-        }
-        order_ref.set(order_data)
-        
-        items_ref = order_ref.collection('items')
-        for item in cart_items:
-            item_data = {
-                'product_id': item['id'],
-                'name': item['name'],
-                'price': float(item['price']),
-                'quantity': int(item['quantity'])
-            }
-            items_ref.add(item_data)
-            
+        order_items, total_price = price_cart(db, cart_items)
+        order_ref = write_order(db, session['user_id'], order_items, total_price)
+
         flash("Thank you for your order! It has been successfully processed.", "success")
         return redirect(url_for('order_confirmation_page', order_id=order_ref.id))
+    except CartError as e:
+        flash(str(e), "error"); return redirect(url_for('cart_page'))
     except Exception as e:
         flash(f"An error occurred while placing your order: {e}", "error")
         traceback.print_exc()
@@ -259,21 +572,35 @@ def order_confirmation_page(order_id):
 
 @app.route('/admin/dashboard')
 @admin_required
-def admin_dashboard_page(): return render_template('admin/dashboard.html', page_title="Admin Dashboard")
+def admin_dashboard_page():
+    try: stats = analytics.dashboard(db); creator_names = user_profiles.get_many(c.get('creator_id') for c in stats['top_creators'])
+    except Exception: flash("Could not load analytics.", "error"); traceback.print_exc(); stats, creator_names = None, {}
+    return render_template('admin/dashboard.html', page_title="Admin Dashboard", stats=stats, creator_names=creator_names)
 @app.route('/admin/users')
 @admin_required
 def manage_users_page():
     try:
-        users_query = db.collection('users').order_by('createdAt', direction=firestore.Query.DESCENDING).stream()
-        return render_template('admin/manage_users.html', page_title="Manage Users", users=[{'uid': doc.id, **doc.to_dict()} for doc in users_query])
+        page_size, cursor = get_page_size(), request.args.get('cursor')
+        docs, next_cursor = paginate_query(db.collection('users'), 'createdAt', cursor, page_size)
+        return render_template('admin/manage_users.html', page_title="Manage Users", users=[{'uid': doc.id, **doc.to_dict()} for doc in docs], next_cursor=next_cursor, cursor=cursor, page_size=page_size)
     except Exception: flash("Failed to load users.", "error"); traceback.print_exc(); return render_template('admin/manage_users.html', page_title="Manage Users", users=[])
+@app.route('/admin/cache-stats')
+@admin_required
+def cache_stats_page():
+    tiers = {name: tier.stats() for name, tier in cache_tiers.items() if isinstance(tier, TieredCache)}
+    return jsonify({'user_context': user_context.stats(), 'user_profiles': user_profiles.stats(), 'catalog_mirror': catalog_mirror.stats() if catalog_mirror else None,
+                    'shared_cache': {**(shared_cache.stats() or {}), 'tiers': tiers} if shared_cache else None})
+@app.route('/admin/metrics')
+@admin_required
+def metrics_page(): return jsonify({'slow_request_ms': SLOW_REQUEST_MS, 'endpoints': endpoint_metrics.snapshot(),
+                                     'backends': {'firestore': firestore_backend.stats(), 'cloudinary': cloudinary_backend.stats()} if RESILIENCE else None})
 @app.route('/admin/user/<string:user_id>/toggle_admin', methods=['POST'])
 @admin_required
 def toggle_admin_status(user_id):
     if user_id == session['user_id']: flash("You cannot change your own admin status.", "error"); return redirect(url_for('manage_users_page'))
     try:
         user_ref = db.collection('users').document(user_id); user_doc = user_ref.get()
-        if user_doc.exists: user_ref.update({'isAdmin': not user_doc.to_dict().get('isAdmin', False)}); flash(f"Admin status updated.", "success")
+        if user_doc.exists: user_ref.update({'isAdmin': not user_doc.to_dict().get('isAdmin', False)}); revoke_user_context(user_id); flash(f"Admin status updated.", "success")
         else: flash("User not found.", "error")
     except Exception: flash("An error occurred.", "error"); traceback.print_exc()
     return redirect(url_for('manage_users_page'))
@@ -284,7 +611,7 @@ def toggle_disable_status(user_id):
     try:
         user_ref = db.collection('users').document(user_id); user_doc = user_ref.get()
         if user_doc.exists:
-            new_status = not user_doc.to_dict().get('isDisabled', False); user_ref.update({'isDisabled': new_status})
+            new_status = not user_doc.to_dict().get('isDisabled', False); user_ref.update({'isDisabled': new_status}); revoke_user_context(user_id)
             flash(f"Account has been {'disabled' if new_status else 'enabled'}.", "success")
         else: flash("User not found.", "error")
     except Exception: flash("An error occurred.", "error"); traceback.print_exc()
@@ -293,21 +620,18 @@ def toggle_disable_status(user_id):
 @admin_required
 def manage_courses_page():
     try:
-        courses_query = db.collection('skills').order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        courses_list = []; users_cache = {}
-        for course_doc in courses_query:
-            course_data = {'id': course_doc.id, **course_doc.to_dict()}
-            author_id = course_data.get('author_id')
-            if author_id not in users_cache:
-                author_doc = db.collection('users').document(author_id).get(); users_cache[author_id] = author_doc.to_dict() if author_doc.exists else {}
-            course_data['author_name'] = users_cache.get(author_id, {}).get('displayName', 'Unknown'); courses_list.append(course_data)
-        return render_template('admin/manage_courses.html', page_title="Manage Courses", courses=courses_list)
+        page_size, cursor = get_page_size(), request.args.get('cursor')
+        docs, next_cursor = paginate_query(db.collection('skills'), 'created_at', cursor, page_size)
+        courses_list = [{'id': course_doc.id, **course_doc.to_dict()} for course_doc in docs]
+        authors = user_profiles.get_many(c.get('author_id') for c in courses_list)
+        for course_data in courses_list: course_data['author_name'] = authors.get(course_data.get('author_id'), {}).get('displayName', 'Unknown')
+        return render_template('admin/manage_courses.html', page_title="Manage Courses", courses=courses_list, next_cursor=next_cursor, cursor=cursor, page_size=page_size)
     except Exception: flash("Failed to load courses.", "error"); traceback.print_exc(); return render_template('admin/manage_courses.html', page_title="Manage Courses", courses=[])
 def toggle_course_status(skill_id, field_name):
     try:
         skill_ref, skill_doc = db.collection('skills').document(skill_id), db.collection('skills').document(skill_id).get()
-        if skill_doc.exists:
-            new_status = not skill_doc.to_dict().get(field_name, False); skill_ref.update({field_name: new_status})
+        if skill_doc.exists and not skill_doc.to_dict().get('deleting'):
+            new_status = not skill_doc.to_dict().get(field_name, False); skill_ref.update({field_name: new_status, 'updated_at': firestore.SERVER_TIMESTAMP}); search_index.upsert('skill', skill_id, {**skill_doc.to_dict(), field_name: new_status}); catalog_changed('skill')
             action = "Featured" if new_status else "Unfeatured" if field_name == 'isFeatured' else "Published" if new_status else "Unpublished"
             flash(f"Course '{skill_doc.to_dict().get('name')}' has been {action}.", "success")
         else: flash("Course not found.", "error")
@@ -322,44 +646,63 @@ def toggle_publish_status(skill_id): return toggle_course_status(skill_id, 'isPu
 @app.route('/marketplace')
 @login_required
 def marketplace_page():
+    page_size, search_query = get_page_size(), request.args.get('query', '').strip().lower()
+    try:
+        cards_html, next_cursor = cached_product_cards(request.args.get('cursor'), page_size, search_query)
+        validators = page_validators(fragment_digest(cards_html), next_cursor)
+        if (response := not_modified(validators)): return response
+        return with_validators(validators, render_template('products/marketplace.html', cards_html=cards_html, next_cursor=next_cursor, page_size=page_size, search_query=search_query, page_title="Marketplace"))
+    except Exception: traceback.print_exc(); flash("Could not load the marketplace.", "error"); return render_template('products/marketplace.html', cards_html='', page_title="Marketplace")
+@app.route('/api/marketplace')
+@login_required
+def marketplace_api():
+    page_size, search_query = get_page_size(), request.args.get('query', '').strip().lower()
     try:
-        products_list, users_cache = [], {} 
-        products_query = db.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True)).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        for doc in products_query:
-            product_data = {'id': doc.id, **doc.to_dict()}; author_id = product_data.get('author_id')
-            if author_id and author_id not in users_cache:
-                author_doc = db.collection('users').document(author_id).get(); users_cache[author_id] = author_doc.to_dict() if author_doc.exists else {}
-            product_data['author'] = users_cache.get(author_id); products_list.append(product_data)
-        return render_template('products/marketplace.html', products=products_list, page_title="Marketplace")
-    except Exception: traceback.print_exc(); flash("Could not load the marketplace.", "error"); return render_template('products/marketplace.html', products=[], page_title="Marketplace")
+        cards_html, next_cursor = cached_product_cards(request.args.get('cursor'), page_size, search_query)
+        next_url = url_for('marketplace_api', cursor=next_cursor, page_size=page_size, query=search_query or None) if next_cursor else None
+        return jsonify({'status': 'success', 'html': cards_html, 'next_cursor': next_cursor, 'next_url': next_url})
+    except Exception: traceback.print_exc(); return jsonify({'status': 'error', 'message': 'Could not load products.'}), 500
 @app.route('/product/<string:product_id>')
 @login_required
 def product_detail_page(product_id):
     try:
-        product_doc = db.collection('products').document(product_id).get()
-        if not product_doc.exists: flash("Sorry, this product could not be found.", "error"); return redirect(url_for('marketplace_page'))
-        product_data = {'id': product_doc.id, **product_doc.to_dict()}
+        mirrored = catalog_mirror.get('product', product_id) if mirror_serving('product') else None
+        if mirrored: product_data, update_time = mirrored
+        else:
+            product_doc = db.collection('products').document(product_id).get()
+            if not product_doc.exists: flash("Sorry, this product could not be found.", "error"); return redirect(url_for('marketplace_page'))
+            product_data, update_time = {'id': product_doc.id, **product_doc.to_dict()}, product_doc.update_time
+        if product_data.get('deleting'): flash("Sorry, this product could not be found.", "error"); return redirect(url_for('marketplace_page'))
         current_user = g.user
         is_admin, is_author = current_user.get('isAdmin', False), product_data.get('author_id') == session.get('user_id')
         if not product_data.get('isPublished', False) and not (is_admin or is_author):
             flash("Sorry, this product is not currently available.", "error"); return redirect(url_for('marketplace_page'))
-        author_data = {};
-        if author_id := product_data.get('author_id'):
-            author_doc = db.collection('users').document(author_id).get();
-            if author_doc.exists: author_data = author_doc.to_dict()
-        return render_template('products/product_detail.html', product=product_data, author=author_data, page_title=product_data.get('name'))
+        author_data = user_profiles.get(product_data.get('author_id'))
+        validators = page_validators(update_time, author_data, last_modified=update_time)
+        if (response := not_modified(validators)): return response
+        return with_validators(validators, render_template('products/product_detail.html', product=product_data, author=author_data, page_title=product_data.get('name')))
     except Exception as e: flash(f"An error occurred while loading this page: {e}", "error"); traceback.print_exc(); return redirect(url_for('marketplace_page'))
 @app.route('/skills')
 @login_required
 def skills_page():
+    page_size = get_page_size()
+    try:
+        search_query, selected_category = request.args.get('query', '').strip().lower(), request.args.get('category', '').strip()
+        cards_html, next_cursor = cached_skill_cards(search_query, selected_category, request.args.get('cursor'), page_size)
+        validators = page_validators(fragment_digest(cards_html), next_cursor)
+        if (response := not_modified(validators)): return response
+        return with_validators(validators, render_template('skills/skills.html', cards_html=cards_html, next_cursor=next_cursor, page_size=page_size, page_title="Explore Courses", search_query=search_query, categories=SKILL_CATEGORIES, selected_category=selected_category))
+    except Exception: flash("An error occurred while loading courses.", "error"); traceback.print_exc(); return render_template('skills/skills.html', cards_html='', page_title="Explore Courses", search_query="", categories=SKILL_CATEGORIES, selected_category="")
+@app.route('/api/skills')
+@login_required
+def skills_api():
+    page_size = get_page_size()
     try:
         search_query, selected_category = request.args.get('query', '').strip().lower(), request.args.get('category', '').strip()
-        query = db.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True))
-        if selected_category: query = query.where(filter=firestore.FieldFilter('category', '==', selected_category))
-        if search_query: query = query.where(filter=firestore.FieldFilter('search_tokens', 'array_contains', search_query))
-        docs = query.order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        return render_template('skills/skills.html', skills=[{'id': doc.id, **doc.to_dict()} for doc in docs], page_title="Explore Courses", search_query=search_query, categories=SKILL_CATEGORIES, selected_category=selected_category)
-    except Exception: flash("An error occurred while loading courses.", "error"); traceback.print_exc(); return render_template('skills/skills.html', skills=[], page_title="Explore Courses", search_query="", categories=SKILL_CATEGORIES, selected_category="")
+        cards_html, next_cursor = cached_skill_cards(search_query, selected_category, request.args.get('cursor'), page_size)
+        next_url = url_for('skills_api', cursor=next_cursor, page_size=page_size, query=search_query or None, category=selected_category or None) if next_cursor else None
+        return jsonify({'status': 'success', 'html': cards_html, 'next_cursor': next_cursor, 'next_url': next_url})
+    except Exception: traceback.print_exc(); return jsonify({'status': 'error', 'message': 'Could not load courses.'}), 500
 
 @app.route('/skill/<string:skill_id>', methods=['GET'])
 @login_required
@@ -367,7 +710,7 @@ def skill_detail_page(skill_id):
     try:
         skill_ref = db.collection('skills').document(skill_id)
         skill_doc = skill_ref.get()
-        if not skill_doc.exists:
+        if not skill_doc.exists or skill_doc.to_dict().get('deleting'):
             flash("Course could not be found.", "error")
             return redirect(url_for('skills_page'))
 
@@ -381,60 +724,22 @@ def skill_detail_page(skill_id):
             flash("Sorry, this course is not available.", "error")
             return redirect(url_for('skills_page'))
 
-        author_data = db.collection('users').document(skill_data.get('author_id')).get().to_dict() or {}
-        lessons_list = sorted([{'id': doc.id, **doc.to_dict()} for doc in skill_ref.collection('lessons').stream()], key=lambda l: l.get('order', 0))
-        
-        reviews_list, discussions_list, review_summary = [], [], {"count": 0, "average": 0}
-        
-        if user_is_enrolled:
-            temp_reviews_list, total_rating, user_cache = [], 0, {}
-            for doc in skill_ref.collection('reviews').stream():
-                review_data = {'id': doc.id, **doc.to_dict()}
-                total_rating += review_data.get('rating', 0)
-                user_id = review_data.get('user_id')
-                if user_id and user_id not in user_cache:
-                    user_doc = db.collection('users').document(user_id).get()
-                    user_cache[user_id] = user_doc.to_dict() if user_doc.exists else {}
-                review_data['user_profile'] = user_cache.get(user_id)
-                temp_reviews_list.append(review_data)
-            
-            reviews_list = sorted(temp_reviews_list, key=lambda r: r.get('created_at'), reverse=True)
-            review_summary = {"count": len(reviews_list), "average": round(total_rating / len(reviews_list), 1) if reviews_list else 0}
-
-            temp_discussions_list = []
-            for post_doc in skill_ref.collection('discussions').stream():
-                post_data = {'id': post_doc.id, **post_doc.to_dict()}
-                user_id = post_data.get('user_id')
-                if user_id and user_id not in user_cache:
-                    user_doc = db.collection('users').document(user_id).get()
-                    user_cache[user_id] = user_doc.to_dict() if user_doc.exists else {}
-                post_data['user_profile'] = user_cache.get(user_id)
-                
-                temp_replies = []
-                for reply_doc in post_doc.reference.collection('replies').stream():
-                    reply_data = {'id': reply_doc.id, **reply_doc.to_dict()}
-                    reply_user_id = reply_data.get('user_id')
-                    if reply_user_id and reply_user_id not in user_cache:
-                        reply_user_doc = db.collection('users').document(reply_user_id).get()
-                        user_cache[reply_user_id] = reply_user_doc.to_dict() if reply_user_doc.exists else {}
-                    reply_data['user_profile'] = user_cache.get(reply_user_id)
-                    temp_replies.append(reply_data)
-                
-                post_data['replies'] = sorted(temp_replies, key=lambda r: r.get('created_at'))
-                temp_discussions_list.append(post_data)
-
-            discussions_list = sorted(temp_discussions_list, key=lambda p: p.get('created_at'))
-
-        return render_template('skills/skill_detail.html', 
+        # Checked before the lesson/review/discussion reads; discussion writes touch the skill document.
+        validators = page_validators(skill_doc.update_time, bool(user_is_enrolled), is_author, user_profiles.get(skill_data.get('author_id')), last_modified=skill_doc.update_time)
+        if (response := not_modified(validators)): return response
+        detail = load_course_detail(db, skill_ref, user_profiles, author_id=skill_data.get('author_id'), include_community=user_is_enrolled, lessons=get_outline(skill_ref, skill_data))
+        review_summary = {"count": skill_data.get('review_count', 0), "average": skill_data.get('rating_avg', 0)} if user_is_enrolled else {"count": 0, "average": 0}
+
+        return with_validators(validators, render_template('skills/skill_detail.html',
                                 skill=skill_data, 
-                                lessons=lessons_list, 
-                                author=author_data, 
-                                reviews=reviews_list, 
+                                lessons=detail['lessons'], 
+                                author=detail['author'], 
+                                reviews=detail['reviews'], 
                                 review_summary=review_summary, 
-                                discussions=discussions_list,
+                                discussions=detail['discussions'],
                                 page_title=skill_data.get('name'), 
                                 skill_id=skill_id,
-                                is_enrolled=user_is_enrolled)
+                                is_enrolled=user_is_enrolled))
     except Exception as e:
         traceback.print_exc()
         flash(f"An error occurred loading the course details: {e}", "error")
@@ -445,19 +750,21 @@ def skill_detail_page(skill_id):
 def enroll_in_skill(skill_id):
     try:
         user_id = g.user.get('uid')
-        if is_enrolled(user_id, skill_id):
+        if is_enrolled(user_id, skill_id, confirm=True):
             flash("You are already enrolled in this course.", "info")
             return redirect(url_for('skill_detail_page', skill_id=skill_id))
         
         enrollment_id = f'{user_id}_{skill_id}'
         enrollment_ref = db.collection('enrollments').document(enrollment_id)
-        enrollment_ref.set({
+        enroll_in_transaction(db.transaction(), db, enrollment_ref, db.collection('skills').document(skill_id), {
             'user_id': user_id,
             'skill_id': skill_id,
             'enrolled_at': firestore.SERVER_TIMESTAMP
         })
+        enrollments.add(user_id, skill_id)
         flash("You have successfully enrolled in the course!", "success")
         return redirect(url_for('skill_detail_page', skill_id=skill_id))
+    except CourseUnavailable as e: flash(str(e), "error"); return redirect(url_for('skills_page'))
     except Exception as e:
         traceback.print_exc()
         flash(f"An error occurred during enrollment: {e}", "error")
@@ -466,7 +773,7 @@ def enroll_in_skill(skill_id):
 @app.route('/skill/<string:skill_id>/review', methods=['POST'])
 @login_required
 def submit_review(skill_id):
-    if not is_enrolled(g.user.get('uid'), skill_id):
+    if not is_enrolled(g.user.get('uid'), skill_id, confirm=True):
         flash("You must be enrolled in a course to leave a review.", "error")
         return redirect(url_for('skill_detail_page', skill_id=skill_id))
     try:
@@ -474,7 +781,8 @@ def submit_review(skill_id):
         if not rating or not review_text: flash("Rating and review text are required.", "error")
         else:
             review_data = {'user_id': session['user_id'], 'rating': int(rating), 'text': review_text, 'created_at': firestore.SERVER_TIMESTAMP, 'skill_id': skill_id}
-            db.collection('skills').document(skill_id).collection('reviews').add(review_data)
+            skill_ref = db.collection('skills').document(skill_id)
+            add_review_in_transaction(db.transaction(), skill_ref, skill_ref.collection('reviews').document(), review_data)
             flash("Review submitted. Thank you!", "success")
     except Exception: flash("An error submitting your review.", "error"); traceback.print_exc()
     return redirect(url_for('skill_detail_page', skill_id=skill_id))
@@ -488,64 +796,69 @@ def delete_review(skill_id, review_id):
         if not skill_doc.exists: return jsonify({'status': 'error', 'message': 'Skill not found.'}), 404
         review_data = review_doc.to_dict(); skill_data = skill_doc.to_dict()
         if current_user_id == review_data.get('user_id') or current_user_id == skill_data.get('author_id'):
-            review_ref.delete(); return jsonify({'status': 'success', 'message': 'Review deleted successfully.'}), 200
+            delete_review_in_transaction(db.transaction(), skill_doc.reference, review_ref); return jsonify({'status': 'success', 'message': 'Review deleted successfully.'}), 200
         else: return jsonify({'status': 'error', 'message': 'You do not have permission to delete this review.'}), 403
     except Exception as e: traceback.print_exc(); return jsonify({'status': 'error', 'message': 'An internal error occurred.'}), 500
 @app.route('/skill/<string:skill_id>/discussion', methods=['POST'])
 @login_required
 def create_discussion_post(skill_id):
-    if not is_enrolled(g.user.get('uid'), skill_id):
+    if not is_enrolled(g.user.get('uid'), skill_id, confirm=True):
         return jsonify({'status': 'error', 'message': 'You must be enrolled to post a discussion.'}), 403
     try:
         content = request.form.get('content', '').strip()
         if not content: return jsonify({'status': 'error', 'message': 'Content cannot be empty.'}), 400
         user_id = session['user_id']; post_data = {'content': content, 'user_id': user_id, 'skill_id': skill_id, 'created_at': firestore.SERVER_TIMESTAMP}
-        update_time, post_ref = db.collection('skills').document(skill_id).collection('discussions').add(post_data)
+        update_time, post_ref = db.collection('skills').document(skill_id).collection('discussions').add(post_data); touch_skill_community(skill_id)
         new_post_for_js = {'id': post_ref.id, 'content': content, 'user_id': user_id, 'created_at': datetime.datetime.now(tz=datetime.timezone.utc).isoformat()}
-        user_profile = db.collection('users').document(user_id).get().to_dict() or {}
+        user_profile = user_profiles.get(user_id)
         return jsonify({'status': 'success', 'post': new_post_for_js, 'user_profile': user_profile})
     except Exception: traceback.print_exc(); return jsonify({'status': 'error', 'message': 'Internal error.'}), 500
 @app.route('/skill/<string:skill_id>/discussion/<string:post_id>/reply', methods=['POST'])
 @login_required
 def create_discussion_reply(skill_id, post_id):
-    if not is_enrolled(g.user.get('uid'), skill_id):
+    if not is_enrolled(g.user.get('uid'), skill_id, confirm=True):
         return jsonify({'status': 'error', 'message': 'You must be enrolled to reply.'}), 403
     try:
         content = request.form.get('content', '').strip()
         if not content: return jsonify({'status': 'error', 'message': 'Reply cannot be empty.'}), 400
-        user_id = session['user_id']; reply_data = {'content': content, 'user_id': user_id, 'post_id': post_id, 'created_at': firestore.SERVER_TIMESTAMP}
-        update_time, reply_ref = db.collection('skills').document(skill_id).collection('discussions').document(post_id).collection('replies').add(reply_data)
+        user_id = session['user_id']; reply_data = {'content': content, 'user_id': user_id, 'post_id': post_id, 'skill_id': skill_id, 'created_at': firestore.SERVER_TIMESTAMP}
+        update_time, reply_ref = db.collection('skills').document(skill_id).collection('discussions').document(post_id).collection('replies').add(reply_data); touch_skill_community(skill_id)
         new_reply_for_js = {'id': reply_ref.id, 'content': content, 'user_id': user_id, 'created_at': datetime.datetime.now(tz=datetime.timezone.utc).isoformat()}
-        user_profile = db.collection('users').document(user_id).get().to_dict() or {}
+        user_profile = user_profiles.get(user_id)
         return jsonify({'status': 'success', 'reply': new_reply_for_js, 'user_profile': user_profile})
     except Exception: traceback.print_exc(); return jsonify({'status': 'error', 'message': 'Internal error.'}), 500
 @app.route('/skill/<string:skill_id>/discussion/<string:post_id>', methods=['DELETE'])
 @login_required
 def delete_discussion_post(skill_id, post_id):
     try:
-        post_ref = db.collection('skills').document(skill_id).collection('discussions').document(post_id); replies = post_ref.collection('replies').stream()
-        for reply in replies: reply.reference.delete()
-        post_ref.delete(); return jsonify({'status': 'success', 'message': 'Post and replies deleted.'})
+        post_ref = db.collection('skills').document(skill_id).collection('discussions').document(post_id); post_doc = post_ref.get()
+        if not post_doc.exists: return jsonify({'status': 'error', 'message': 'Post not found.'}), 404
+        if post_doc.to_dict().get('user_id') != session['user_id'] and not g.user.get('isAdmin'): return jsonify({'status': 'error', 'message': 'You can only delete your own posts.'}), 403
+        # The post is hidden now and deleted after its replies, so a failed job leaves it for `flask sweep-orphans`.
+        post_ref.update({'deleting': True}); touch_skill_community(skill_id)
+        job_id = bulk_deleter.submit([post_ref], 'discussion', user_id=session['user_id'])
+        return jsonify({'status': 'success', 'message': 'Post deleted; replies are being removed.', 'job_id': job_id})
     except Exception: return jsonify({'status': 'error', 'message': 'Failed to delete post.'}), 500
 @app.route('/skill/<string:skill_id>/discussion/<string:post_id>/reply/<string:reply_id>', methods=['DELETE'])
 @login_required
 def delete_discussion_reply(skill_id, post_id, reply_id):
     try:
-        db.collection('skills').document(skill_id).collection('discussions').document(post_id).collection('replies').document(reply_id).delete()
+        db.collection('skills').document(skill_id).collection('discussions').document(post_id).collection('replies').document(reply_id).delete(); touch_skill_community(skill_id)
         return jsonify({'status': 'success', 'message': 'Reply deleted.'})
     except Exception: return jsonify({'status': 'error', 'message': 'Failed to delete reply.'}), 500
 @app.route('/creator/<string:creator_id>')
 @login_required
 def creator_profile_page(creator_id):
     try:
-        user_doc = db.collection('users').document(creator_id).get()
-        if not user_doc.exists or user_doc.to_dict().get('role') != 'creator': flash("Creator profile not found.", "error"); return redirect(url_for('skills_page'))
-        creator = user_doc.to_dict()
-        skills_query = db.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('author_id', '==', creator_id)).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        skills_list = [{'id': doc.id, **doc.to_dict()} for doc in skills_query]
-        products_query = db.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('author_id', '==', creator_id)).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        products_list = [{'id': doc.id, **doc.to_dict()} for doc in products_query]
-        return render_template('creators/profile_page.html', creator=creator, skills=skills_list, products=products_list, page_title=f"Storefront for {creator.get('displayName', creator.get('email'))}")
+        reads = fetch_reads(creator_queries, creator_id, names=['creator'])
+        creator = reads['creator']
+        if not creator or creator.get('role') != 'creator': flash("Creator profile not found.", "error"); return redirect(url_for('skills_page'))
+        if 'skills' not in reads and mirror_serving(): reads.update(skills=catalog_mirror.by_author('skill', creator_id), products=catalog_mirror.by_author('product', creator_id))
+        if 'skills' not in reads: reads.update(fetch_reads(creator_queries, creator_id, names=['skills', 'products']))
+        skills_list, products_list = reads['skills'], reads['products']
+        validators = page_validators(reads)
+        if (response := not_modified(validators)): return response
+        return with_validators(validators, render_template('creators/profile_page.html', creator=creator, skills=skills_list, products=products_list, page_title=f"Storefront for {creator.get('displayName', creator.get('email'))}"))
     except Exception: flash("Error loading creator profile.", "error"); traceback.print_exc(); return redirect(url_for('skills_page'))
 @app.route('/profile/<string:user_id>')
 @login_required
@@ -579,27 +892,20 @@ def customer_profile_page(user_id):
 @app.route('/course/<string:skill_id>/lesson/<string:lesson_id>')
 @login_required
 def course_player_page(skill_id, lesson_id):
-    user_is_author = False
     try:
-        skill_doc_check = db.collection('skills').document(skill_id).get()
-        if skill_doc_check.exists and skill_doc_check.to_dict().get('author_id') == g.user.get('uid'):
-            user_is_author = True
-    except Exception: pass
-
-    if not user_is_author and not g.user.get('isAdmin') and not is_enrolled(g.user.get('uid'), skill_id):
-        flash("You are not enrolled in this course.", "error")
-        return redirect(url_for('skill_detail_page', skill_id=skill_id))
-        
-    try:
-        skill_ref, skill_doc = db.collection('skills').document(skill_id), db.collection('skills').document(skill_id).get()
-        if not skill_doc.exists: flash("Course not found.", "error"); return redirect(url_for('skills_page'))
-        all_lessons_list = sorted([{'id': doc.id, **doc.to_dict()} for doc in skill_ref.collection('lessons').order_by('order').stream()], key=lambda l: l.get('order', 0))
-        active_lesson_data, active_lesson_index = None, -1
-        for i, lesson_data in enumerate(all_lessons_list):
-            if lesson_data['id'] == lesson_id: active_lesson_data, active_lesson_index = lesson_data, i; break
-        if not active_lesson_data: flash("Lesson not found in this course.", "error"); return redirect(url_for('skill_detail_page', skill_id=skill_id))
+        skill_ref = db.collection('skills').document(skill_id); skill_doc = skill_ref.get()
+        if not skill_doc.exists or skill_doc.to_dict().get('deleting'): flash("Course not found.", "error"); return redirect(url_for('skills_page'))
+        skill_data = skill_doc.to_dict()
+        if skill_data.get('author_id') != g.user.get('uid') and not g.user.get('isAdmin') and not is_enrolled(g.user.get('uid'), skill_id, confirm=True):
+            flash("You are not enrolled in this course.", "error"); return redirect(url_for('skill_detail_page', skill_id=skill_id))
+        # The sidebar and prev/next links come from the outline on the skill document; only the active lesson's body is read.
+        all_lessons_list = get_outline(skill_ref, skill_data)
+        active_lesson_index = next((i for i, lesson in enumerate(all_lessons_list) if lesson['id'] == lesson_id), -1)
+        lesson_doc = skill_ref.collection('lessons').document(lesson_id).get() if active_lesson_index >= 0 else None
+        if not lesson_doc or not lesson_doc.exists: flash("Lesson not found in this course.", "error"); return redirect(url_for('skill_detail_page', skill_id=skill_id))
+        active_lesson_data = {'id': lesson_id, **lesson_doc.to_dict()}
         previous_lesson, next_lesson = (all_lessons_list[active_lesson_index - 1] if active_lesson_index > 0 else None), (all_lessons_list[active_lesson_index + 1] if active_lesson_index < len(all_lessons_list) - 1 else None)
-        return render_template('skills/course_player.html', skill=skill_doc.to_dict(), skill_id=skill_id, all_lessons=all_lessons_list, active_lesson=active_lesson_data, previous_lesson=previous_lesson, next_lesson=next_lesson)
+        return render_template('skills/course_player.html', skill=skill_data, skill_id=skill_id, all_lessons=all_lessons_list, active_lesson=active_lesson_data, previous_lesson=previous_lesson, next_lesson=next_lesson)
     except Exception: traceback.print_exc(); flash("Error loading the course.", "error"); return redirect(url_for('skills_page'))
 @app.route('/dashboard')
 @login_required
@@ -610,26 +916,21 @@ def edit_profile_page():
     user_ref = db.collection('users').document(session['user_id'])
     if request.method == 'POST':
         updated_data = {'displayName': request.form.get('display_name'), 'bio': request.form.get('bio'), 'updatedAt': datetime.datetime.now(tz=datetime.timezone.utc)}
-        if 'profile_image' in request.files and request.files['profile_image'].filename != '':
-            image_file = request.files.get('profile_image')
-            try:
-                if old_url := user_ref.get().to_dict().get('avatar_url'):
-                    if 'cloudinary' in old_url and (public_id := get_public_id_from_url(old_url)): cloudinary.uploader.destroy(public_id)
-                upload_result = cloudinary.uploader.upload(image_file, folder="nissahub_avatars", transformation=[{'width': 400, 'height': 400, 'crop': 'fill', 'gravity': 'face'}])
-                updated_data['avatar_url'] = upload_result.get('secure_url')
-            except Exception: flash("Profile image upload failed.", "error"); return redirect(url_for('edit_profile_page'))
-        user_ref.update(updated_data)
+        user_ref.update(updated_data); invalidate_user(session['user_id']); fragment_cache.bump()
+        try:
+            if queue_image_upload('profile_image', "nissahub_avatars", [{'width': 400, 'height': 400, 'crop': 'fill', 'gravity': 'face'}], 'users', session['user_id']): flash("Your new profile photo is processing and will appear shortly.", "info")
+        except Exception: traceback.print_exc(); flash("Profile image upload failed.", "error"); return redirect(url_for('edit_profile_page'))
         flash("Your profile updated successfully!", "success"); return redirect(url_for('dashboard_page'))
     return render_template('auth/edit_profile.html', page_title="Edit Your Profile", user=user_ref.get().to_dict() or {})
 def check_skill_ownership(skill_id, user_id):
     skill_ref, skill_doc = db.collection('skills').document(skill_id), db.collection('skills').document(skill_id).get()
-    if not skill_doc.exists: flash("Course not found.", "error"); return None, None, redirect(url_for('my_skills_page'))
+    if not skill_doc.exists or skill_doc.to_dict().get('deleting'): flash("Course not found.", "error"); return None, None, redirect(url_for('my_skills_page'))
     skill_data = skill_doc.to_dict()
     if skill_data.get('author_id') != user_id: flash("You can only manage your own courses.", "error"); return None, None, redirect(url_for('my_skills_page'))
     return skill_ref, skill_data, None
 def check_product_ownership(product_id, user_id):
     product_ref, product_doc = db.collection('products').document(product_id), db.collection('products').document(product_id).get()
-    if not product_doc.exists: flash("Product not found.", "error"); return None, None, redirect(url_for('my_products_page'))
+    if not product_doc.exists or product_doc.to_dict().get('deleting'): flash("Product not found.", "error"); return None, None, redirect(url_for('my_products_page'))
     product_data, product_data['id'] = product_doc.to_dict(), product_id 
     if product_data.get('author_id') != user_id: flash("You can only manage your own products.", "error"); return None, None, redirect(url_for('my_products_page'))
     return product_ref, product_data, None
@@ -639,9 +940,7 @@ def my_skills_page():
     if session.get('role') != 'creator': flash("Permission denied.", "error"); return redirect(url_for('dashboard_page'))
     try:
         skills_query = db.collection('skills').where(filter=firestore.FieldFilter('author_id', '==', session['user_id'])).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        skills_list = []
-        for doc in skills_query:
-            skill_data = {'id': doc.id, **doc.to_dict()}; skill_data['lesson_count'] = len(list(doc.reference.collection('lessons').stream())); skill_data['review_count'] = len(list(doc.reference.collection('reviews').stream())); skills_list.append(skill_data)
+        skills_list = [{'id': doc.id, 'lesson_count': 0, 'review_count': 0, **doc.to_dict()} for doc in skills_query if not doc.to_dict().get('deleting')]
         return render_template('skills/my_skills.html', skills=skills_list, page_title="Manage My Courses")
     except Exception: flash("Could not load your courses.", "error"); traceback.print_exc(); return render_template('skills/my_skills.html', skills=[], page_title="Manage My Courses")
 @app.route('/skills/create', methods=['GET', 'POST'])
@@ -652,14 +951,14 @@ def create_skill_page():
         is_published, name, desc, cat = request.form.get('is_published') == 'true', request.form.get('skill_name'), request.form.get('skill_description'), request.form.get('skill_category')
         if not all([name, desc, cat]): flash('All fields are required.', 'error'); return render_template('skills/skill_form.html', page_title="Create New Course", skill={}, categories=SKILL_CATEGORIES)
         image_url = 'img/skill_placeholder_default.jpg';
-        if 'skill_image' in request.files and request.files['skill_image'].filename != '':
-            image_file = request.files.get('skill_image');
-            try: res = cloudinary.uploader.upload(image_file, folder="nissahub_skills", transformation=[{'width': 1000, 'height': 750, 'crop': 'limit'}]); image_url = res.get('secure_url')
-            except Exception: flash("Image upload failed.", "error"); return render_template('skills/skill_form.html', page_title="Create New Course", skill={}, categories=SKILL_CATEGORIES)
         try:
-            skill_data = { 'name': name, 'description': desc, 'category': cat, 'author_id': session['user_id'], 'author_email': session.get('email'), 'created_at': firestore.SERVER_TIMESTAMP, 'image_url': image_url, 'search_tokens': generate_search_tokens(f"{name} {desc}"), 'isPublished': is_published, 'isFeatured': False }
-            db.collection('skills').add(skill_data); flash(f'Course "{name}" created successfully!', 'success'); return redirect(url_for('my_skills_page'))
+            skill_data = { 'name': name, 'description': desc, 'category': cat, 'author_id': session['user_id'], 'author_email': session.get('email'), 'created_at': firestore.SERVER_TIMESTAMP, 'updated_at': firestore.SERVER_TIMESTAMP, 'image_url': image_url, 'isPublished': is_published, 'isFeatured': False, 'lesson_count': 0, **review_stats({}) }
+            _, skill_ref = db.collection('skills').add(skill_data); search_index.upsert('skill', skill_ref.id, skill_data); catalog_changed('skill'); flash(f'Course "{name}" created successfully!', 'success')
         except Exception: flash('Error saving course.', 'error'); return render_template('skills/skill_form.html', page_title="Create New Course", skill={}, categories=SKILL_CATEGORIES)
+        try:
+            if queue_image_upload('skill_image', "nissahub_skills", [{'width': 1000, 'height': 750, 'crop': 'limit'}], 'skills', skill_ref.id): flash("Your course image is processing and will appear shortly.", "info")
+        except Exception: traceback.print_exc(); flash("Image upload failed.", "error")
+        return redirect(url_for('my_skills_page'))
     return render_template('skills/skill_form.html', page_title="Create New Course", skill={}, categories=SKILL_CATEGORIES)
 @app.route('/skills/edit/<string:skill_id>', methods=['GET', 'POST'])
 @login_required
@@ -668,15 +967,11 @@ def edit_skill_page(skill_id):
     skill_ref, skill_data, error = check_skill_ownership(skill_id, session['user_id'])
     if error: return error
     if request.method == 'POST':
-        updated_data = { 'name': request.form.get('skill_name'),'description': request.form.get('skill_description'), 'category': request.form.get('skill_category'), 'updated_at': firestore.SERVER_TIMESTAMP, 'search_tokens': generate_search_tokens(f"{request.form.get('skill_name')} {request.form.get('skill_description')}"), 'isPublished': request.form.get('is_published') == 'true' }
-        if 'skill_image' in request.files and request.files['skill_image'].filename != '':
-            image_file = request.files.get('skill_image')
-            try:
-                if old_url := skill_data.get('image_url'):
-                    if 'cloudinary' in old_url and (pid := get_public_id_from_url(old_url)): cloudinary.uploader.destroy(pid)
-                res = cloudinary.uploader.upload(image_file, folder="nissahub_skills", transformation=[{'width': 1000, 'height': 750, 'crop': 'limit'}]); updated_data['image_url'] = res.get('secure_url')
-            except Exception: flash("Image upload failed.", "error"); return redirect(url_for('edit_skill_page', skill_id=skill_id))
-        skill_ref.update(updated_data)
+        updated_data = { 'name': request.form.get('skill_name'),'description': request.form.get('skill_description'), 'category': request.form.get('skill_category'), 'updated_at': firestore.SERVER_TIMESTAMP, 'search_tokens': firestore.DELETE_FIELD, 'isPublished': request.form.get('is_published') == 'true' }
+        skill_ref.update(updated_data); search_index.upsert('skill', skill_id, {**skill_data, **updated_data}); catalog_changed('skill')
+        try:
+            if queue_image_upload('skill_image', "nissahub_skills", [{'width': 1000, 'height': 750, 'crop': 'limit'}], 'skills', skill_id): flash("Your course image is processing and will appear shortly.", "info")
+        except Exception: traceback.print_exc(); flash("Image upload failed.", "error"); return redirect(url_for('edit_skill_page', skill_id=skill_id))
         flash(f'Skill "{updated_data["name"]}" updated successfully!', 'success'); return redirect(url_for('my_skills_page'))
     return render_template('skills/skill_form.html', page_title="Edit Course", skill=skill_data, skill_id=skill_id, categories=SKILL_CATEGORIES)
 @app.route('/skills/delete/<string:skill_id>', methods=['POST'])
@@ -685,8 +980,11 @@ def delete_skill(skill_id):
     if session.get('role') != 'creator': flash("Permission denied.", 'error'); return redirect(url_for('dashboard_page'))
     skill_ref, skill_data, error = check_skill_ownership(skill_id, session['user_id'])
     if error: return error
-    if 'cloudinary' in (img := skill_data.get('image_url', '')) and (pid := get_public_id_from_url(img)): cloudinary.uploader.destroy(pid)
-    skill_ref.delete(); flash(f"Skill '{skill_data.get('name')}' deleted.", 'success')
+    skill_ref.update({'isPublished': False, 'deleting': True, 'updated_at': firestore.SERVER_TIMESTAMP}); search_index.remove('skill', skill_id); catalog_changed('skill')
+    # Lessons, reviews, discussions (with their replies), enrollments, the hidden skill itself and then its image are removed in the background.
+    bulk_deleter.submit([skill_ref], 'skill', user_id=session['user_id'], queries=[db.collection('enrollments').where(filter=firestore.FieldFilter('skill_id', '==', skill_id))],
+                        image_urls=[skill_data.get('image_url')])
+    flash(f"Skill '{skill_data.get('name')}' deleted.", 'success')
     return redirect(url_for('my_skills_page'))
 @app.route('/my-products')
 @login_required
@@ -694,7 +992,7 @@ def my_products_page():
     if session.get('role') != 'creator': flash("Permission denied.", "error"); return redirect(url_for('dashboard_page'))
     try:
         products_query = db.collection('products').where(filter=firestore.FieldFilter('author_id', '==', session['user_id'])).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-        products_list = [{'id': doc.id, **doc.to_dict()} for doc in products_query]
+        products_list = [{'id': doc.id, **doc.to_dict()} for doc in products_query if not doc.to_dict().get('deleting')]
         return render_template('products/my_products.html', products=products_list, page_title="Manage My Products")
     except Exception: traceback.print_exc(); flash("Could not load your products.", "error"); return render_template('products/my_products.html', products=[], page_title="Manage My Products")
 @app.route('/products/create', methods=['GET', 'POST'])
@@ -706,14 +1004,14 @@ def create_product_page():
         if not all([form_data['name'], form_data['description'], form_data['price'], form_data['category']]):
             flash('All fields except image are required.', 'error'); return render_template('products/product_form.html', page_title="Add New Product", product=form_data, categories=PRODUCT_CATEGORIES, form_action=url_for('create_product_page'))
         image_url = 'img/skill_placeholder_default.jpg' 
-        if 'product_image' in request.files and request.files['product_image'].filename != '':
-            image_file = request.files['product_image'];
-            try: upload_result = cloudinary.uploader.upload(image_file, folder="nissahub_products", transformation=[{'width': 1000, 'height': 1000, 'crop': 'limit'}]); image_url = upload_result.get('secure_url')
-            except Exception: traceback.print_exc(); flash("Image upload failed.", "error"); return render_template('products/product_form.html', page_title="Add New Product", product=form_data, categories=PRODUCT_CATEGORIES, form_action=url_for('create_product_page'))
         try:
-            new_product_data = {'name': form_data['name'], 'description': form_data['description'], 'price': float(form_data['price']), 'category': form_data['category'], 'isPublished': form_data['isPublished'], 'image_url': image_url, 'author_id': session['user_id'], 'author_email': session.get('email'), 'created_at': firestore.SERVER_TIMESTAMP, 'isFeatured': False }
-            db.collection('products').add(new_product_data); flash(f'Product "{form_data["name"]}" added successfully!', 'success'); return redirect(url_for('my_products_page'))
+            new_product_data = {'name': form_data['name'], 'description': form_data['description'], 'price': float(form_data['price']), 'category': form_data['category'], 'isPublished': form_data['isPublished'], 'image_url': image_url, 'author_id': session['user_id'], 'author_email': session.get('email'), 'created_at': firestore.SERVER_TIMESTAMP, 'updated_at': firestore.SERVER_TIMESTAMP, 'isFeatured': False }
+            _, product_ref = db.collection('products').add(new_product_data); search_index.upsert('product', product_ref.id, new_product_data); catalog_changed('product'); flash(f'Product "{form_data["name"]}" added successfully!', 'success')
         except Exception: traceback.print_exc(); flash('An unexpected error occurred.', 'error'); return render_template('products/product_form.html', page_title="Add New Product", product=form_data, categories=PRODUCT_CATEGORIES, form_action=url_for('create_product_page'))
+        try:
+            if queue_image_upload('product_image', "nissahub_products", [{'width': 1000, 'height': 1000, 'crop': 'limit'}], 'products', product_ref.id): flash("Your product image is processing and will appear shortly.", "info")
+        except Exception: traceback.print_exc(); flash("Image upload failed.", "error")
+        return redirect(url_for('my_products_page'))
     return render_template('products/product_form.html', page_title="Add New Product", product={}, categories=PRODUCT_CATEGORIES, form_action=url_for('create_product_page'))
 @app.route('/products/edit/<string:product_id>', methods=['GET', 'POST'])
 @login_required
@@ -723,14 +1021,10 @@ def edit_product_page(product_id):
     if error_response: return error_response
     if request.method == 'POST':
         updated_data = { 'name': request.form.get('product_name'), 'description': request.form.get('product_description'), 'price': float(request.form.get('product_price')), 'category': request.form.get('product_category'), 'isPublished': request.form.get('is_published') == 'true', 'updated_at': firestore.SERVER_TIMESTAMP }
-        if 'product_image' in request.files and request.files['product_image'].filename != '':
-            image_file = request.files['product_image']
-            try:
-                if old_url := product_data.get('image_url'):
-                    if 'cloudinary' in old_url and (pid := get_public_id_from_url(old_url)): cloudinary.uploader.destroy(pid)
-                upload_result = cloudinary.uploader.upload(image_file, folder="nissahub_products", transformation=[{'width': 1000, 'height': 1000, 'crop': 'limit'}]); updated_data['image_url'] = upload_result.get('secure_url')
-            except Exception: flash("Image upload failed.", "error"); return redirect(url_for('edit_product_page', product_id=product_id))
-        product_ref.update(updated_data)
+        product_ref.update(updated_data); search_index.upsert('product', product_id, {**product_data, **updated_data}); catalog_changed('product')
+        try:
+            if queue_image_upload('product_image', "nissahub_products", [{'width': 1000, 'height': 1000, 'crop': 'limit'}], 'products', product_id): flash("Your product image is processing and will appear shortly.", "info")
+        except Exception: traceback.print_exc(); flash("Image upload failed.", "error"); return redirect(url_for('edit_product_page', product_id=product_id))
         flash(f'Product "{updated_data["name"]}" updated successfully!', 'success'); return redirect(url_for('my_products_page'))
     return render_template('products/product_form.html', page_title="Edit Product", product=product_data, categories=PRODUCT_CATEGORIES, form_action=url_for('edit_product_page', product_id=product_id))
 @app.route('/products/delete/<string:product_id>', methods=['POST'])
@@ -740,8 +1034,8 @@ def delete_product(product_id):
     product_ref, product_data, error = check_product_ownership(product_id, session['user_id'])
     if error: return error
     try:
-        if 'cloudinary' in (img_url := product_data.get('image_url', '')) and (public_id := get_public_id_from_url(img_url)): cloudinary.uploader.destroy(public_id)
-        product_ref.delete()
+        product_ref.update({'isPublished': False, 'deleting': True, 'updated_at': firestore.SERVER_TIMESTAMP}); search_index.remove('product', product_id); catalog_changed('product')
+        bulk_deleter.submit([product_ref], 'product', user_id=session['user_id'], image_urls=[product_data.get('image_url')])
         flash(f"Product '{product_data.get('name')}' has been deleted successfully.", 'success')
     except Exception as e: traceback.print_exc(); flash("An error occurred while trying to delete the product.", 'error')
     return redirect(url_for('my_products_page'))
@@ -754,12 +1048,11 @@ def manage_lessons_page(skill_id):
     if request.method == 'POST':
         title, l_type = request.form.get('lesson_title'), request.form.get('lesson_type')
         if not title or not l_type: flash("Title and type required.", "error"); return redirect(url_for('manage_lessons_page', skill_id=skill_id))
-        last_lesson = next(lessons_ref.order_by('order', direction=firestore.Query.DESCENDING).limit(1).stream(), None)
-        next_order = last_lesson.to_dict().get('order', 0) + 1 if last_lesson else 1
+        next_order = max((lesson.get('order') or 0 for lesson in get_outline(skill_ref, skill_data)), default=0) + 1
         content = request.form.get('content_text', '') if l_type == "Text" else request.form.get('content_video', '')
-        lessons_ref.add({'title': title, 'lesson_type': l_type, 'content': content, 'created_at': firestore.SERVER_TIMESTAMP, 'order': next_order})
+        add_lesson_in_transaction(db.transaction(), skill_ref, lessons_ref.document(), {'title': title, 'lesson_type': l_type, 'content': content, 'created_at': firestore.SERVER_TIMESTAMP, 'order': next_order})
         flash(f"Successfully added lesson: '{title}'", "success"); return redirect(url_for('manage_lessons_page', skill_id=skill_id))
-    return render_template('skills/manage_lessons.html', skill=skill_data, skill_id=skill_id, lessons=sorted([{'id': doc.id, **doc.to_dict()} for doc in lessons_ref.stream()], key=lambda l: l.get('order', 0)))
+    return render_template('skills/manage_lessons.html', skill=skill_data, skill_id=skill_id, lessons=get_outline(skill_ref, skill_data))
 @app.route('/skills/<string:skill_id>/lessons/<string:lesson_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_lesson_page(skill_id, lesson_id):
@@ -770,7 +1063,7 @@ def edit_lesson_page(skill_id, lesson_id):
     if request.method == 'POST':
         title, l_type = request.form.get('lesson_title'), request.form.get('lesson_type')
         content = request.form.get('content_text', '') if l_type == "Text" else request.form.get('content_video', '')
-        lesson_ref.update({'title': title, 'lesson_type': l_type, 'content': content, 'updated_at': firestore.SERVER_TIMESTAMP})
+        update_lesson_in_transaction(db.transaction(), skill_ref, lesson_ref, {'title': title, 'lesson_type': l_type, 'content': content, 'updated_at': firestore.SERVER_TIMESTAMP})
         flash("Lesson updated!", "success"); return redirect(url_for('manage_lessons_page', skill_id=skill_id))
     return render_template('skills/edit_lesson.html', skill_id=skill_id, lesson_id=lesson_id, lesson=lesson_doc.to_dict())
 @app.route('/skills/<string:skill_id>/lessons/<string:lesson_id>/delete', methods=['POST'])
@@ -778,7 +1071,7 @@ def edit_lesson_page(skill_id, lesson_id):
 def delete_lesson(skill_id, lesson_id):
     skill_ref, _, error = check_skill_ownership(skill_id, session['user_id']);
     if error: return error
-    skill_ref.collection('lessons').document(lesson_id).delete(); flash("Lesson deleted.", "success")
+    delete_lesson_in_transaction(db.transaction(), skill_ref, skill_ref.collection('lessons').document(lesson_id)); flash("Lesson deleted.", "success")
     return redirect(url_for('manage_lessons_page', skill_id=skill_id))
 @app.route('/skills/<string:skill_id>/lessons/<string:lesson_id>/reorder/<direction>')
 @login_required
@@ -791,7 +1084,7 @@ def reorder_lesson(skill_id, lesson_id, direction):
     op, order_dir = ('<', firestore.Query.DESCENDING) if direction == 'up' else ('>', firestore.Query.ASCENDING)
     swap_doc = next(lessons_ref.where('order', op, current_order).order_by('order', direction=order_dir).limit(1).stream(), None)
     if not swap_doc: flash("Cannot move further.", "info"); return redirect(url_for('manage_lessons_page', skill_id=skill_id))
-    swap_order = swap_doc.to_dict().get('order'); batch = db.batch(); batch.update(current_lesson_ref, {'order': swap_order}); batch.update(swap_doc.reference, {'order': current_order}); batch.commit()
+    swap_lesson_order_in_transaction(db.transaction(), skill_ref, current_lesson_ref, swap_doc.reference, current_order, swap_doc.to_dict().get('order'))
     return redirect(url_for('manage_lessons_page', skill_id=skill_id))
 @app.route('/login')
 @guest_only
@@ -811,7 +1104,7 @@ def select_role_page():
         try:
             user_id, email = session.get('user_id'), session.get('email')
             user_data = {'uid': user_id, 'email': email, 'role': role, 'createdAt': firestore.SERVER_TIMESTAMP, 'displayName': f"user_{user_id[:6]}"}
-            db.collection('users').document(user_id).set(user_data)
+            set_role_in_transaction(db.transaction(), db, db.collection('users').document(user_id), user_data); invalidate_user(user_id)
             session['role'] = role
             return redirect(url_for('dashboard_page'))
         except Exception: flash("An error occurred.", "error"); return redirect(request.url)
@@ -823,6 +1116,7 @@ def session_login():
         decoded_token = admin_auth.verify_id_token(id_token)
         session.clear()
         session['user_id'], session['email'] = decoded_token['uid'], decoded_token.get('email')
+        invalidate_user(session['user_id'])
         user_doc = db.collection('users').document(session['user_id']).get()
         if user_doc.exists:
             user_data = user_doc.to_dict()
@@ -836,5 +1130,53 @@ def session_login():
 @app.route('/auth/session_logout', methods=['POST'])
 def session_logout():
     session.clear(); return jsonify({"status": "success"}), 200
+@app.cli.command('backfill-reply-skill-ids')
+def backfill_reply_skill_ids():
+    """Stamps skill_id on legacy discussion replies so the course page's collection-group query finds them."""
+    batch, pending, updated = db.batch(), 0, 0
+    for skill_ref in db.collection('skills').list_documents():
+        for post_ref in skill_ref.collection('discussions').list_documents():
+            for reply_doc in post_ref.collection('replies').stream():
+                if reply_doc.to_dict().get('skill_id') == skill_ref.id: continue
+                batch.update(reply_doc.reference, {'skill_id': skill_ref.id}); pending += 1; updated += 1
+                if pending == 500: batch.commit(); batch, pending = db.batch(), 0
+    if pending: batch.commit()
+    print(f"Backfilled skill_id on {updated} replies.")
+@app.cli.command('drop-search-tokens')
+def drop_search_tokens():
+    """Removes the legacy prefix search_tokens arrays now that search is served by the in-memory index."""
+    batch, pending, updated = db.batch(), 0, 0
+    for skill_doc in db.collection('skills').stream():
+        if 'search_tokens' not in skill_doc.to_dict(): continue
+        batch.update(skill_doc.reference, {'search_tokens': firestore.DELETE_FIELD}); pending += 1; updated += 1
+        if pending == 500: batch.commit(); batch, pending = db.batch(), 0
+    if pending: batch.commit()
+    print(f"Dropped search_tokens from {updated} skills.")
+@app.cli.command('backfill-skill-counters')
+def backfill_skill_counters():
+    """Recomputes lesson_count, review_count, rating_sum and rating_avg on every skill with aggregation queries."""
+    updated = 0
+    for skill_ref in db.collection('skills').list_documents():
+        lesson_count = skill_ref.collection('lessons').count(alias='lesson_count').get()[0][0].value
+        review_aggregates = {result.alias: result.value for result in skill_ref.collection('reviews').count(alias='review_count').sum('rating', alias='rating_sum').get()[0]}
+        skill_ref.update({'lesson_count': lesson_count, **review_stats({}, review_aggregates.get('review_count') or 0, review_aggregates.get('rating_sum') or 0)}); updated += 1
+    print(f"Recomputed counters on {updated} skills.")
+@app.cli.command('backfill-lesson-outlines')
+def backfill_lesson_outlines():
+    """Stores lesson_outline on skills written before it existed, so their pages stop reading every lesson."""
+    updated = sum(1 for skill_ref in db.collection('skills').list_documents() if backfill_outline_in_transaction(db.transaction(), skill_ref))
+    print(f"Backfilled lesson outlines on {updated} skills.")
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics():
+    """Recomputes the admin dashboard rollups (users by role, enrollments, daily and per-creator revenue) with aggregation queries."""
+    analytics.rebuild(db)
+    print("Rebuilt analytics rollups.")
+@app.cli.command('sweep-orphans')
+def sweep_orphans():
+    """Deletes subtrees left behind by deleted skills, products and discussion posts (or by their failed delete jobs), and enrollments for deleted skills."""
+    orphans = find_orphans(db)
+    print(f"Found {len(orphans)} orphaned documents or subtrees.")
+    deleted = delete_trees(db, orphans, on_progress=lambda count: print(f"Deleted {count} documents..."))
+    print(f"Deleted {deleted} documents.")
 if __name__ == '__main__':
-    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
+    create_app().run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,183 @@
+# assets.py
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+
+try: import brotli
+except ImportError: brotli = None
+
+DIST_DIR, MANIFEST_FILE = 'dist', 'manifest.json'
+# Deploy builds of generated files (compile_scss.py --build), mirroring static/; they replace the tracked copies.
+COMPILED_DIR = 'compiled'
+SKIP_DIRS = {DIST_DIR, 'scss', 'uploads'}
+ASSET_EXTENSIONS = ('.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg')
+# Precompressed variants in order of preference, with the suffix they are stored under.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+CSS_TOKEN_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*[\s\S]*?\*/''')
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+JS_IMPORT_RE = re.compile(r'''((?:\bfrom|\bimport)\s*\(?\s*)(['"])(\.{1,2}/[^'"]+)\2''')
+# After these characters a '/' starts a regular expression literal rather than a division.
+JS_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+
+def minify_css(source):
+    """Drops comments and collapses whitespace outside string literals."""
+    def squeeze(code):
+        code = re.sub(r'\s+', ' ', code)
+        return re.sub(r'\s*([{};,])\s*', r'\1', code).replace(';}', '}')
+    out, position = [], 0
+    for match in CSS_TOKEN_RE.finditer(source):
+        out.append(squeeze(source[position:match.start()]))
+        if match.group(1): out.append(match.group(1))
+        position = match.end()
+    out.append(squeeze(source[position:]))
+    return ''.join(out).strip()
+
+
+def minify_js(source):
+    """Conservative JS minifier: drops comments, indentation and blank lines, keeping every line break.
+
+    Strings, template literals and regex literals are copied verbatim. Line breaks are
+    kept so automatic semicolon insertion behaves exactly as in the source.
+    """
+    out, i, n, last = [], 0, len(source), ''
+    while i < n:
+        char, pair = source[i], source[i:i + 2]
+        if pair == '//':
+            i = source.find('\n', i); i = n if i == -1 else i
+        elif pair == '/*':
+            end = source.find('*/', i + 2); i = n if end == -1 else end + 2
+            out.append(' ')
+        elif char in '\'"`' or (char == '/' and last in JS_REGEX_PREFIX):
+            start, closing, in_class = i, char, False
+            i += 1
+            while i < n:
+                if source[i] == '\\': i += 2; continue
+                if closing == '/' and source[i] in '[]': in_class = source[i] == '['
+                elif source[i] == closing and not in_class: break
+                elif source[i] == '\n' and closing != '`': break
+                i += 1
+            i += 1
+            out.append(source[start:i]); last = closing
+            continue
+        else:
+            out.append(char); i += 1
+            if not char.isspace(): last = char
+            continue
+    lines = (line.strip() for line in ''.join(out).split('\n'))
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def _hashed_name(relative_path, content):
+    root, ext = posixpath.splitext(relative_path)
+    return f"{DIST_DIR}/{root}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def _resolve(from_path, reference):
+    return posixpath.normpath(posixpath.join(posixpath.dirname(from_path), reference))
+
+
+def _rewrite(pattern, text, from_path, manifest, group):
+    """Points relative references (CSS url(), JS imports) at their fingerprinted files."""
+    def replace(match):
+        reference = match.group(group)
+        target = _resolve(from_path, reference.split('?')[0].split('#')[0])
+        if target not in manifest: return match.group(0)
+        # dist/ mirrors the source tree, so the fingerprinted file sits in dist/<source dir>.
+        relative = posixpath.relpath(manifest[target], posixpath.dirname(f'{DIST_DIR}/{from_path}'))
+        return match.group(0).replace(reference, relative if relative.startswith('.') else f'./{relative}')
+    return pattern.sub(replace, text)
+
+
+def _write(static_dir, hashed_path, content):
+    path = os.path.join(static_dir, *hashed_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f: f.write(content)
+    if not hashed_path.endswith(COMPRESSIBLE_EXTENSIONS): return
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli: variants['.br'] = brotli.compress(content, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as f: f.write(compressed)
+
+
+def _collect(root, skip_dirs=()):
+    sources = {}
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = [d for d in subdirs if os.path.relpath(os.path.join(directory, d), root).split(os.sep)[0] not in skip_dirs]
+        for name in files:
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(directory, name)
+                sources[os.path.relpath(path, root).replace(os.sep, '/')] = path
+    return sources
+
+
+def build(static_dir):
+    """Minifies, fingerprints and precompresses every asset under static_dir into static_dir/dist.
+
+    Images are hashed first so CSS url()s can point at them, then CSS, then JS (whose
+    relative imports are rewritten, dependencies before dependents). Older builds are
+    left in place so pages rendered by workers still on the previous manifest keep
+    working. Files under static_dir/dist/compiled are used in place of the same path
+    under static_dir. Returns the manifest of original path -> fingerprinted path.
+    """
+    sources = {**_collect(static_dir, SKIP_DIRS), **_collect(os.path.join(static_dir, DIST_DIR, COMPILED_DIR))}
+    manifest = {}
+    def add(relative_path, content):
+        manifest[relative_path] = _hashed_name(relative_path, content)
+        _write(static_dir, manifest[relative_path], content)
+    def read(relative_path, mode='rb'):
+        with open(sources[relative_path], mode, **({} if mode == 'rb' else {'encoding': 'utf-8'})) as f: return f.read()
+    for relative_path in sorted(p for p in sources if not p.endswith(('.css', '.js'))): add(relative_path, read(relative_path))
+    for relative_path in sorted(p for p in sources if p.endswith('.css')):
+        add(relative_path, _rewrite(CSS_URL_RE, minify_css(read(relative_path, 'r')), relative_path, manifest, 2).encode())
+    def add_js(relative_path, visiting):
+        if relative_path in manifest or relative_path in visiting: return
+        visiting.add(relative_path)
+        source = read(relative_path, 'r')
+        for _, _, reference in JS_IMPORT_RE.findall(source):
+            if _resolve(relative_path, reference) in sources: add_js(_resolve(relative_path, reference), visiting)
+        add(relative_path, _rewrite(JS_IMPORT_RE, minify_js(source), relative_path, manifest, 3).encode())
+    for relative_path in sorted(p for p in sources if p.endswith('.js')): add_js(relative_path, set())
+    with open(os.path.join(static_dir, DIST_DIR, MANIFEST_FILE), 'w') as f: json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class AssetManifest:
+    """Maps static filenames to their fingerprinted build output, and picks precompressed variants."""
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        path = os.path.join(static_dir, DIST_DIR, MANIFEST_FILE)
+        try:
+            with open(path) as f: self.files = json.load(f)
+        except FileNotFoundError: self.files = {}
+        self.hashed = set(self.files.values())
+
+    def __bool__(self):
+        return bool(self.files)
+
+    def lookup(self, filename):
+        return self.files.get(filename)
+
+    def is_hashed(self, filename):
+        return filename in self.hashed
+
+    def variant(self, filename, accept_encodings):
+        """Returns (filename to send, Content-Encoding or None) for a fingerprinted file."""
+        for encoding, suffix in ENCODINGS:
+            if accept_encodings[encoding] and os.path.isfile(os.path.join(self.static_dir, *(filename + suffix).split('/'))): return filename + suffix, encoding
+        return filename, None
+
+
+if __name__ == '__main__':
+    static_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = build(static_dir)
+    print(f"✅ Built {len(manifest)} fingerprinted assets into {os.path.join(static_dir, DIST_DIR)}{'' if brotli else ' (gzip only: install brotli for .br variants)'}.")
@@ -0,0 +1,77 @@
+# async_firestore.py
+import asyncio
+import contextvars
+import os
+import threading
+from firebase_admin import firestore
+
+
+def home_queries(client):
+    """The homepage's independent queries; works with both the sync and the async client."""
+    def skills(is_featured):
+        return client.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('isFeatured', '==', is_featured)).order_by('created_at', direction=firestore.Query.DESCENDING).limit(6)
+    products = client.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True)).order_by('created_at', direction=firestore.Query.DESCENDING).limit(6)
+    return {'featured': skills(True), 'products': products, 'recent': skills(False)}
+
+
+def creator_queries(client, creator_id):
+    """The creator storefront's reads: the creator's user document and their published skills and products."""
+    def published(collection):
+        return client.collection(collection).where(filter=firestore.FieldFilter('isPublished', '==', True)).where(filter=firestore.FieldFilter('author_id', '==', creator_id)).order_by('created_at', direction=firestore.Query.DESCENDING)
+    return {'creator': client.collection('users').document(creator_id), 'skills': published('skills'), 'products': published('products')}
+
+
+def fetch_sync(target):
+    """Streams a query into a list of dicts, or reads a document ref into a dict (None if missing)."""
+    if hasattr(target, 'stream'): return [{'id': doc.id, **doc.to_dict()} for doc in target.stream()]
+    doc = target.get()
+    return doc.to_dict() if doc.exists else None
+
+
+async def fetch_async(target):
+    if hasattr(target, 'stream'): return [{'id': doc.id, **doc.to_dict()} async for doc in target.stream()]
+    doc = await target.get()
+    return doc.to_dict() if doc.exists else None
+
+
+async def gather_queries(client, build, *args):
+    """Runs every query/document read `build(client, *args)` returns concurrently; returns name -> result."""
+    targets = build(client, *args)
+    results = await asyncio.gather(*(fetch_async(target) for target in targets.values()))
+    return dict(zip(targets, results))
+
+
+class AsyncFirestore:
+    """Runs coroutines against a Firestore AsyncClient on a dedicated event-loop thread.
+
+    Views stay ordinary Flask views and call `run` with an async function, which fans
+    independent reads out with asyncio.gather and blocks only for the slowest one.
+    Every request in the process shares the loop and the client's gRPC channel, so
+    this works under any WSGI server, threaded or not. The loop and client are created
+    on first use, in the process that serves requests.
+    """
+
+    def __init__(self, client_factory, timeout=30):
+        self.client_factory, self.timeout = client_factory, timeout
+        self.client, self._loop, self._pid, self._lock = None, None, None, threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            # A loop inherited through fork() has no thread behind it in the child, so it is rebuilt there.
+            if self._loop is not None and self._pid == os.getpid(): return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='firestore-async', daemon=True).start()
+            # The AsyncClient's channel binds to the loop it is created on, so it is built there.
+            async def make_client(): return self.client_factory()
+            self.client = asyncio.run_coroutine_threadsafe(make_client(), loop).result(self.timeout)
+            self._loop, self._pid = loop, os.getpid()
+
+    def run(self, fn, *args):
+        """Runs `fn(client, *args)` on the loop and returns its result to the calling thread."""
+        self._ensure_loop()
+        context = contextvars.copy_context()
+        async def in_caller_context():
+            # Tasks on the loop thread start from its context; carry the caller's (e.g. the RPC profile) over.
+            for var, value in context.items(): var.set(value)
+            return await fn(self.client, *args)
+        return asyncio.run_coroutine_threadsafe(in_caller_context(), self._loop).result(self.timeout)
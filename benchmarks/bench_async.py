@@ -0,0 +1,83 @@
+# benchmarks/bench_async.py
+"""Sync reads versus the FIRESTORE_ASYNC fan-out for the homepage and creator storefront.
+
+Both stub clients wait RPC_LATENCY per round trip (time.sleep vs asyncio.sleep).
+CONCURRENCY request threads, as in a threaded WSGI worker, each make REQUESTS
+calls through app.fetch_reads' two code paths. Reports p50/p99 latency and
+requests per second.
+Run from the project root: python benchmarks/bench_async.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from async_firestore import AsyncFirestore, creator_queries, fetch_sync, gather_queries, home_queries
+
+RPC_LATENCY = float(os.environ.get('RPC_LATENCY', 0.02))
+CONCURRENCY, REQUESTS = int(os.environ.get('CONCURRENCY', 16)), 50
+DOC = {'name': 'Skill', 'role': 'creator', 'isPublished': True, 'created_at': 0}
+
+
+class StubDoc:
+    exists = True
+    def __init__(self, doc_id): self.id = doc_id
+    def to_dict(self): return dict(DOC)
+
+
+class StubQuery:
+    def __init__(self, asynchronous): self.asynchronous = asynchronous
+    def where(self, filter=None): return self
+    def order_by(self, field, direction=None): return self
+    def limit(self, n): return self
+    def document(self, doc_id): return StubDocRef(self.asynchronous)
+
+    def stream(self):
+        if self.asynchronous: return self._astream()
+        time.sleep(RPC_LATENCY)
+        return iter([StubDoc(str(i)) for i in range(6)])
+
+    async def _astream(self):
+        await asyncio.sleep(RPC_LATENCY)
+        for i in range(6): yield StubDoc(str(i))
+
+
+class StubDocRef:
+    def __init__(self, asynchronous): self.asynchronous = asynchronous
+
+    def get(self):
+        if self.asynchronous: return self._aget()
+        time.sleep(RPC_LATENCY); return StubDoc('creator')
+
+    async def _aget(self):
+        await asyncio.sleep(RPC_LATENCY); return StubDoc('creator')
+
+
+class StubClient:
+    def __init__(self, asynchronous=False): self.asynchronous = asynchronous
+    def collection(self, name): return StubQuery(self.asynchronous)
+
+
+def measure(call):
+    latencies = []
+    def one_request(_):
+        start = time.perf_counter(); call(); latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool: list(pool.map(one_request, range(CONCURRENCY * REQUESTS)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000, len(latencies) / elapsed
+
+
+if __name__ == '__main__':
+    sync_db, async_db = StubClient(), AsyncFirestore(lambda: StubClient(asynchronous=True))
+    print(f"{RPC_LATENCY * 1000:.0f} ms/RPC, {CONCURRENCY} request threads")
+    print(f"{'view':<10} {'mode':<6} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for view, build, args in (('home', home_queries, ()), ('creator', creator_queries, ('u1',))):
+        for mode, call in (('sync', lambda: {name: fetch_sync(target) for name, target in build(sync_db, *args).items()}),
+                           ('async', lambda: async_db.run(gather_queries, build, *args))):
+            p50, p99, rps = measure(call)
+            print(f"{view:<10} {mode:<6} {p50:>8.1f} {p99:>8.1f} {rps:>8.1f}")
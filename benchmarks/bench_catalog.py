@@ -0,0 +1,94 @@
+# benchmarks/bench_catalog.py
+"""Memory footprint and read latency of the CATALOG_MIRROR at ITEMS skills plus ITEMS products.
+
+Documents are synthetic (200-character descriptions, an 8-lesson outline on each,
+7 categories, 2,000 authors, 10% featured, 90% published) and fed through the
+listener callback as one initial snapshot, so no Firestore is involved. Like a
+real snapshot, to_dict() decodes fresh objects on every call. Memory is what stays
+allocated once the snapshot is dropped, next to caching every published
+document's to_dict() as a plain dict.
+Latencies are the mean of REPEATS calls of each read a view makes.
+Run from the project root: python benchmarks/bench_catalog.py
+"""
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from catalog_mirror import CatalogMirror, MIRRORED_COLLECTIONS
+from google.cloud.firestore_v1.watch import ChangeType
+
+ITEMS, REPEATS = int(os.environ.get('ITEMS', 50_000)), int(os.environ.get('REPEATS', 2_000))
+CATEGORIES = ["Handicrafts", "Fashion & Design", "Culinary Arts", "Arts & Crafts", "Digital Arts", "Beauty", "Other"]
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def fields(kind, i):
+    rng = random.Random(f'{kind}{i}')
+    data = {'name': f'{kind} {i}', 'description': rng.getrandbits(800).to_bytes(100, 'little').hex(), 'category': rng.choice(CATEGORIES),
+            'image_url': f'https://res.cloudinary.com/demo/image/upload/v1/{kind}/{i}.jpg', 'author_id': f'u{rng.randrange(2000)}',
+            'created_at': EPOCH + datetime.timedelta(seconds=rng.randrange(10**8)), 'isFeatured': rng.random() < 0.1, 'isPublished': rng.random() < 0.9,
+            'lesson_outline': [{'id': f'l{j}', 'title': f'Lesson {j}', 'order': j} for j in range(8)]}
+    if kind == 'product': data['price'] = round(rng.uniform(5, 500), 2)
+    return data
+
+
+def document(kind, i):
+    return SimpleNamespace(id=f'{kind[0]}{i}', update_time=EPOCH, to_dict=lambda: fields(kind, i))
+
+
+def retained(build):
+    """Bytes still allocated by build()'s result after the snapshots it was built from are gone."""
+    tracemalloc.start()
+    result = build({kind: [document(kind, i) for i in range(ITEMS)] for kind in MIRRORED_COLLECTIONS})
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def measure(fn):
+    start = time.perf_counter()
+    for _ in range(REPEATS): fn()
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+if __name__ == '__main__':
+    def plain_dicts(snapshots):
+        return {kind: {doc.id: data for doc in docs if (data := doc.to_dict())['isPublished']} for kind, docs in snapshots.items()}
+    def loaded_mirror(snapshots):
+        mirror = CatalogMirror()
+        mirror._db, mirror._watches = object(), {kind: SimpleNamespace(is_active=True) for kind in MIRRORED_COLLECTIONS}
+        for kind, docs in snapshots.items(): mirror._on_snapshot(kind, docs, [], EPOCH)
+        return mirror
+
+    plain_bytes = retained(plain_dicts)[1]
+    start = time.perf_counter()
+    loaded_mirror({kind: [document(kind, i) for i in range(ITEMS)] for kind in MIRRORED_COLLECTIONS})
+    load_s = time.perf_counter() - start
+    mirror, mirror_bytes = retained(loaded_mirror)
+
+    published = sum(stats['documents'] for stats in mirror.stats().values())
+    print(f"{ITEMS:,} skills + {ITEMS:,} products, {published:,} published; initial snapshot applied in {load_s:.2f} s (including decoding)")
+    print(f"{'plain dicts (full documents)':<34} {plain_bytes / 2**20:>8.1f} MiB")
+    print(f"{'catalog mirror (records + indexes)':<34} {mirror_bytes / 2**20:>8.1f} MiB  ({mirror_bytes / published:.0f} B per document)")
+
+    product_id = next(iter(mirror._collections['product'].records))
+    deep_cursor = mirror.page('skill', page_size=ITEMS // 2)[1]
+    ids = list(mirror._collections['product'].records)[:24]
+    change = SimpleNamespace(type=ChangeType.MODIFIED, document=document('skill', 1))
+    reads = {
+        'home (3 pages of 6)': lambda: (mirror.page('skill', page_size=6, featured=True), mirror.page('skill', page_size=6, featured=False), mirror.page('product', page_size=6)),
+        'marketplace page of 24': lambda: mirror.page('product'),
+        'skills page, one category': lambda: mirror.page('skill', category='Beauty'),
+        'skills page, deep cursor': lambda: mirror.page('skill', cursor=deep_cursor),
+        'creator storefront': lambda: (mirror.by_author('skill', 'u42'), mirror.by_author('product', 'u42')),
+        'product detail': lambda: mirror.get('product', product_id),
+        'search hits (get_many 24)': lambda: mirror.get_many('product', ids),
+        'listener: one modified doc': lambda: mirror._on_snapshot('skill', [], [change], EPOCH),
+    }
+    print(f"\n{'read':<34} {'µs/call':>8}")
+    for label, fn in reads.items(): print(f"{label:<34} {measure(fn):>8.1f}")
@@ -0,0 +1,77 @@
+# benchmarks/bench_checkout.py
+"""Checkout write throughput: the old set + one add() per cart line versus orders.write_order.
+
+A stub client sleeps RPC_LATENCY per round trip (plus WRITE_COST per document inside
+a batch commit), so the numbers reflect round trips rather than local CPU.
+Run from the project root: python benchmarks/bench_checkout.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from orders import price_cart, write_order
+
+RPC_LATENCY = float(os.environ.get('RPC_LATENCY', 0.01))
+WRITE_COST = 0.00005
+CART_SIZES = (1, 10, 30, 100, 1000)
+
+
+class StubDoc:
+    def __init__(self, doc_id, data): self.id, self._data, self.exists = doc_id, data, True
+    def to_dict(self): return dict(self._data)
+
+
+class StubRef:
+    def __init__(self, path): self.path, self.id = path, path.rsplit('/', 1)[-1]
+    def collection(self, name): return StubCollection(f'{self.path}/{name}')
+    def set(self, data): time.sleep(RPC_LATENCY)
+
+
+class StubCollection:
+    _next_id = 0
+    def __init__(self, path): self.path = path
+    def document(self, doc_id=None):
+        StubCollection._next_id += 1
+        return StubRef(f'{self.path}/{doc_id or StubCollection._next_id}')
+    def add(self, data): time.sleep(RPC_LATENCY); return None, self.document()
+
+
+class StubBatch:
+    def __init__(self): self.writes = 0
+    def set(self, ref, data): self.writes += 1
+    def update(self, ref, data): self.writes += 1
+    def commit(self):
+        assert self.writes <= 500, "batch over Firestore's write limit"
+        time.sleep(RPC_LATENCY + self.writes * WRITE_COST)
+
+
+class StubClient:
+    def collection(self, name): return StubCollection(name)
+    def batch(self): return StubBatch()
+    def get_all(self, refs):
+        time.sleep(RPC_LATENCY)
+        return [StubDoc(ref.id, {'name': f'Product {ref.id}', 'price': 25.0, 'isPublished': True}) for ref in refs]
+
+
+def sequential_checkout(db, cart_items):
+    """The pre-batching submit_checkout write pattern."""
+    order_ref = db.collection('orders').document()
+    order_ref.set({'status': 'completed'})
+    for item in cart_items: order_ref.collection('items').add({'product_id': item['id'], 'quantity': item['quantity']})
+
+
+def batched_checkout(db, cart_items):
+    order_items, total_price = price_cart(db, cart_items)
+    write_order(db, 'bench-user', order_items, total_price)
+
+
+if __name__ == '__main__':
+    db = StubClient()
+    print(f"{RPC_LATENCY * 1000:.0f} ms/RPC; orders per second per worker thread")
+    print(f"{'cart lines':>10} {'sequential':>12} {'batched':>10} {'speedup':>8}")
+    for size in CART_SIZES:
+        cart = [{'id': f'p{i}', 'name': 'client name', 'price': '0.01', 'quantity': 1} for i in range(size)]
+        start = time.perf_counter(); sequential_checkout(db, cart); sequential = time.perf_counter() - start
+        start = time.perf_counter(); batched_checkout(db, cart); batched = time.perf_counter() - start
+        print(f"{size:>10} {1 / sequential:>12.1f} {1 / batched:>10.1f} {sequential / batched:>7.1f}x")
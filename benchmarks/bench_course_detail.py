@@ -0,0 +1,100 @@
+# benchmarks/bench_course_detail.py
+"""Compares the old serial skill_detail fan-out with course_detail.load_course_detail.
+
+Uses a stub Firestore client that sleeps RPC_LATENCY per round trip, seeded with a
+course of 500 reviews and 200 discussion threads (2 replies each, 150 distinct users).
+Run from the project root: python benchmarks/bench_course_detail.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from course_detail import load_course_detail
+from user_profiles import UserProfileLoader
+
+RPC_LATENCY = float(os.environ.get('RPC_LATENCY', 0.02))
+REVIEWS, THREADS, REPLIES_PER_THREAD, USERS = 500, 200, 2, 150
+
+
+class StubDoc:
+    def __init__(self, path, data):
+        self.id, self._data, self.exists = path.rsplit('/', 1)[-1], data, data is not None
+        self.reference = StubRef(path)
+
+    def to_dict(self): return dict(self._data) if self._data is not None else None
+
+
+class StubRef:
+    def __init__(self, path):
+        self.path, self.id = path, path.rsplit('/', 1)[-1]
+        parent_path = path.rsplit('/', 1)[0]
+        self.parent = SimpleNamespace(parent=SimpleNamespace(id=parent_path.rsplit('/', 2)[-2]) if '/' in parent_path else None)
+
+    def collection(self, name): return StubQuery(f'{self.path}/{name}')
+    def document(self, doc_id): return StubRef(f'{self.path}/{doc_id}')
+    def get(self): time.sleep(RPC_LATENCY); return StubDoc(self.path, DOCS.get(self.path))
+
+
+class StubQuery:
+    def __init__(self, prefix, group=None, skill_id=None):
+        self.prefix, self.group, self.skill_id = prefix, group, skill_id
+
+    def where(self, filter=None): return StubQuery(self.prefix, self.group, filter.value)
+    def document(self, doc_id): return StubRef(f'{self.prefix}/{doc_id}')
+
+    def stream(self):
+        time.sleep(RPC_LATENCY)
+        for path, data in DOCS.items():
+            parent = path.rsplit('/', 1)[0]
+            if self.group and parent.rsplit('/', 1)[-1] == self.group and data.get('skill_id') == self.skill_id: yield StubDoc(path, data)
+            elif not self.group and parent == self.prefix: yield StubDoc(path, data)
+
+
+class StubClient:
+    def collection(self, name): return StubQuery(name)
+    def collection_group(self, name): return StubQuery(None, group=name)
+    def get_all(self, refs):
+        time.sleep(RPC_LATENCY)
+        return [StubDoc(ref.path, DOCS.get(ref.path)) for ref in refs]
+
+
+DOCS = {f'users/u{i}': {'displayName': f'User {i}'} for i in range(USERS)}
+DOCS['skills/s1'] = {'name': 'Benchmark course', 'author_id': 'u0'}
+for i in range(REVIEWS): DOCS[f'skills/s1/reviews/r{i}'] = {'user_id': f'u{i % USERS}', 'rating': 1 + i % 5, 'created_at': i}
+for i in range(THREADS):
+    DOCS[f'skills/s1/discussions/d{i}'] = {'user_id': f'u{i % USERS}', 'created_at': i}
+    for j in range(REPLIES_PER_THREAD): DOCS[f'skills/s1/discussions/d{i}/replies/x{i}_{j}'] = {'user_id': f'u{(i + j) % USERS}', 'skill_id': 's1', 'post_id': f'd{i}', 'created_at': j}
+
+
+def serial_fan_out(db, skill_ref):
+    """The pre-pipeline skill_detail_page access pattern."""
+    user_cache = {}
+    def profile(uid):
+        if uid and uid not in user_cache:
+            user_doc = db.collection('users').document(uid).get(); user_cache[uid] = user_doc.to_dict() if user_doc.exists else {}
+        return user_cache.get(uid)
+    profile('u0')
+    list(skill_ref.collection('lessons').stream())
+    reviews = [{**doc.to_dict(), 'user_profile': profile(doc.to_dict().get('user_id'))} for doc in skill_ref.collection('reviews').stream()]
+    for post_doc in skill_ref.collection('discussions').stream():
+        profile(post_doc.to_dict().get('user_id'))
+        for reply_doc in post_doc.reference.collection('replies').stream(): profile(reply_doc.to_dict().get('user_id'))
+    return reviews
+
+
+def timed(fn, runs=3):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter(); fn(); best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    db = StubClient(); skill_ref = StubRef('skills/s1')
+    serial = timed(lambda: serial_fan_out(db, skill_ref))
+    pipeline = timed(lambda: load_course_detail(db, skill_ref, UserProfileLoader(db), author_id='u0', include_community=True))
+    print(f"{REVIEWS} reviews, {THREADS} threads, {RPC_LATENCY * 1000:.0f} ms/RPC")
+    print(f"serial fan-out : {serial * 1000:8.1f} ms")
+    print(f"pipeline (cold): {pipeline * 1000:8.1f} ms  ({serial / pipeline:.1f}x)")
@@ -0,0 +1,70 @@
+# benchmarks/bench_render.py
+"""Template rendering in the development and production config profiles.
+
+Each mode runs in a fresh interpreter: "cold" is create_app (which precompiles every
+template in production) plus the first render of the three templates below, and
+"warm" is the mean of RENDERS further renders. Production runs twice, first against
+an empty bytecode cache directory and then against the one that run filled.
+Run from the project root: python benchmarks/bench_render.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+TEMPLATES = ('index.html', 'skills/skill_detail.html', 'products/marketplace.html')
+RENDERS = int(os.environ.get('RENDERS', 500))
+
+
+def contexts():
+    from markupsafe import Markup
+    skill = {'id': 's1', 'name': 'Zellige Tile Cutting', 'description': 'Learn the craft.\nStep by step.', 'category': 'Handicrafts', 'author_id': 'u1',
+             'image_url': 'img/skill_placeholder_default.jpg', 'isPublished': True}
+    people = {'displayName': 'Amal', 'avatar_url': None}
+    reviews = [{'id': f'r{i}', 'user_id': 'u2', 'rating': 4, 'text': 'Great course ' * 10, 'user_profile': people} for i in range(20)]
+    discussions = [{'id': f'd{i}', 'user_id': 'u2', 'content': 'Question?', 'user_profile': people,
+                    'replies': [{'id': f'x{i}', 'user_id': 'u1', 'content': 'Answer.', 'user_profile': people}]} for i in range(20)]
+    cards = Markup('<div class="card">Card</div>' * 24)
+    return {
+        'index.html': {'featured_section': cards, 'products_section': cards, 'recent_section': Markup('')},
+        'skills/skill_detail.html': {'skill': skill, 'lessons': [{'id': f'l{i}', 'title': f'Lesson {i}', 'order': i} for i in range(30)], 'author': people,
+                                     'reviews': reviews, 'review_summary': {'count': 20, 'average': 4.0}, 'discussions': discussions,
+                                     'page_title': skill['name'], 'skill_id': 's1', 'is_enrolled': True},
+        'products/marketplace.html': {'cards_html': cards, 'next_cursor': 'p24', 'page_size': 24, 'search_query': '', 'page_title': 'Marketplace'},
+    }
+
+
+def probe():
+    """Runs inside the child interpreter and prints its timings as JSON."""
+    from flask import g, render_template
+    import app as appmod
+    start = time.perf_counter()
+    app = appmod.create_app(warm=False)
+    results, template_contexts = {}, contexts()
+    with app.test_request_context('/'):
+        g.user = {'uid': 'u1', 'email': 'amal@example.com', 'displayName': 'Amal', 'role': 'creator'}
+        for name in TEMPLATES: render_template(name, **template_contexts[name])
+        results['cold_ms'] = (time.perf_counter() - start) * 1000
+        for name in TEMPLATES:
+            start = time.perf_counter()
+            for _ in range(RENDERS): render_template(name, **template_contexts[name])
+            results[name] = (time.perf_counter() - start) / RENDERS * 1e6
+    print(json.dumps(results))
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['--probe']:
+    probe()
+elif __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as cache_dir:
+        runs = (('development', 'development', {}), ('production, empty cache', 'production', {'JINJA_CACHE_DIR': cache_dir}),
+                ('production, warm cache', 'production', {'JINJA_CACHE_DIR': cache_dir}))
+        print(f"{'mode':<24} {'cold ms':>8} " + ' '.join(f"{name.rsplit('/', 1)[-1]:>18}" for name in TEMPLATES) + '   (warm µs/render)')
+        for label, env_name, extra in runs:
+            env = {**os.environ, 'APP_ENV': env_name, 'SEARCH_INDEX_REFRESH': '3600', 'RPC_PROFILER': '0', **extra}
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe'], cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{label:<24} {result['cold_ms']:>8.1f} " + ' '.join(f"{result[name]:>18.1f}" for name in TEMPLATES))
@@ -0,0 +1,105 @@
+# benchmarks/bench_resilience.py
+"""Request latency against a fault-injecting Firestore, with and without the resilience layer.
+
+A real google.cloud.firestore Client is pointed at FaultyApi, a stand-in for its GAPIC
+layer that answers run_query and batch_get_documents after LATENCY seconds, raises
+ServiceUnavailable or hangs for HANG seconds at the given rates, and honours the
+`timeout` argument the way a gRPC deadline does. THREADS threads send "requests" that
+each run one query and one document read. The resilience side uses the app's defaults
+scaled down: 0.5 s per call, a 1.5 s request budget and half as many calls in flight
+as threads, so in the healthy run half of them queue briefly for a slot. The table
+gives the share of requests that succeeded and latency percentiles. In the outage
+scenario every call hangs, which the breaker turns into immediate refusals.
+Run from the project root: python benchmarks/bench_resilience.py
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.types import BatchGetDocumentsResponse, Document, RunQueryResponse
+from google.protobuf import timestamp_pb2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import resilience
+from resilience import Backend, guard_firestore
+
+THREADS, REQUESTS = int(os.environ.get('THREADS', 16)), int(os.environ.get('REQUESTS', 25))
+LATENCY, HANG = 0.005, 3.0
+# label: (error rate, hang rate, requests per thread); the outage runs fewer, as unguarded each takes 2 x HANG.
+SCENARIOS = {'healthy': (0, 0, REQUESTS), 'flaky (10% errors, 3% hangs)': (0.10, 0.03, REQUESTS), 'outage (every call hangs)': (0, 1, 4)}
+
+
+class FaultyApi:
+    """Stand-in for a Firestore client's GAPIC layer with injected errors and hangs."""
+
+    def __init__(self, error_rate=0.0, hang_rate=0.0, seed=7):
+        self.error_rate, self.hang_rate = error_rate, hang_rate
+        self._rng, self._lock = random.Random(seed), threading.Lock()
+        self.timestamp = timestamp_pb2.Timestamp(); self.timestamp.FromDatetime(datetime.datetime(2025, 1, 1))
+
+    def _respond(self, timeout):
+        with self._lock: roll = self._rng.random()
+        delay = HANG if roll < self.hang_rate else LATENCY
+        if isinstance(timeout, (int, float)) and delay > timeout: time.sleep(timeout); raise google_exceptions.DeadlineExceeded('injected: deadline exceeded')
+        time.sleep(delay)
+        if roll < self.hang_rate + self.error_rate and roll >= self.hang_rate: raise google_exceptions.ServiceUnavailable('injected: unavailable')
+
+    def _document(self, name):
+        return Document(name=name, fields={'name': {'string_value': 'Weaving'}}, create_time=self.timestamp, update_time=self.timestamp)
+
+    def run_query(self, request=None, metadata=None, timeout=None, **kwargs):
+        self._respond(timeout)
+        return iter([RunQueryResponse(document=self._document(f"{request['parent']}/skills/s{i}"), read_time=self.timestamp) for i in range(6)])
+
+    def batch_get_documents(self, request=None, metadata=None, timeout=None, **kwargs):
+        self._respond(timeout)
+        return iter([BatchGetDocumentsResponse(found=self._document(name), read_time=self.timestamp) for name in request['documents']])
+
+
+def client_for(api, backend=None):
+    client = firestore.Client(project='bench', credentials=AnonymousCredentials())
+    client._firestore_api_internal = api
+    return guard_firestore(client, backend) if backend else client
+
+
+def one_request(client, budget):
+    if budget: resilience.start_budget(budget)
+    started = time.perf_counter()
+    try:
+        list(client.collection('skills').where(filter=firestore.FieldFilter('isPublished', '==', True)).limit(6).stream())
+        client.collection('users').document('u1').get()
+        ok = True
+    except Exception: ok = False
+    finally: resilience.end_budget()
+    return ok, time.perf_counter() - started
+
+
+def run(client, requests, budget=None):
+    results, lock = [], threading.Lock()
+    def worker():
+        for _ in range(requests):
+            outcome = one_request(client, budget)
+            with lock: results.append(outcome)
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    latencies = sorted(elapsed * 1000 for _, elapsed in results)
+    return sum(ok for ok, _ in results) / len(results), latencies
+
+
+if __name__ == '__main__':
+    one_request(client_for(FaultyApi()), None)  # first-use costs (proto classes, client setup) are not part of any scenario
+    print(f"{THREADS} threads, each request one query + one document read\n")
+    print(f"{'scenario':<30} {'layer':<10} {'ok':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  backend stats")
+    for label, (error_rate, hang_rate, requests) in SCENARIOS.items():
+        backend = Backend('firestore', timeout=0.5, max_in_flight=THREADS // 2, queue_wait=0.25, extra_kwargs={'retry': None})
+        for layer, client, budget in (('none', client_for(FaultyApi(error_rate, hang_rate)), None), ('guarded', client_for(FaultyApi(error_rate, hang_rate), backend), 1.5)):
+            ok, latencies = run(client, requests, budget)
+            stats = {key: value for key, value in backend.stats().items() if value and key != 'calls'} if layer == 'guarded' else ''
+            print(f"{label:<30} {layer:<10} {ok:>6.1%} {statistics.median(latencies):>8.1f} {latencies[int(len(latencies) * 0.99) - 1]:>8.1f} {latencies[-1]:>8.1f}  {stats}")
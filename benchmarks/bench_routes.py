@@ -0,0 +1,235 @@
+# benchmarks/bench_routes.py
+"""End-to-end latency and Firestore RPCs of every route, on the in-memory backend, against a stored baseline.
+
+The app is imported with DATA_BACKEND=memory, so Firestore is a memory_firestore.MemoryFirestore
+that sleeps LATENCY_MS around each RPC, and with APP_ENV=production and a fresh shared cache file.
+It is seeded through the client API at SCALE times the default volumes below (orders through
+orders.write_order, the analytics rollups through analytics.rebuild). Every GET rule in
+app.url_map is requested through the Flask test client, plus a few query-string variants and
+the main POST flows: first once with every cache cleared ("cold"), then REPEATS times ("warm").
+Creator pages run as an admin creator, cart/order/lesson pages as an enrolled customer, and the
+sign-in pages anonymously; GET rules that write (lesson reorder) or need a job id are skipped.
+A request fails on a 5xx, an error flash or an error JSON status.
+
+The table gives cold RPCs and ms, warm p50/p95 ms and RPCs and documents read per warm request.
+Against the baseline file a route regresses when it makes more RPCs, cold or warm, or its warm
+p50 exceeds the baseline's by more than TOLERANCE (50%) + SLACK_MS (5 ms), a margin for timer and
+scheduler noise; the exit status is then 1. Record the baseline on the machine that compares
+against it: --save-baseline writes the file instead. --load runs THREADS threads of a read-heavy mix for DURATION seconds
+and reports throughput and latency percentiles.
+Run from the project root: python benchmarks/bench_routes.py [--save-baseline | --load]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+SCALE, REPEATS, LATENCY_MS = float(os.environ.get('SCALE', 1)), int(os.environ.get('REPEATS', 15)), float(os.environ.get('LATENCY_MS', 2))
+THREADS, DURATION = int(os.environ.get('THREADS', 8)), float(os.environ.get('DURATION', 10))
+# A warm p50 this much above the baseline's counts as a regression; RPC counts must not grow at all.
+TOLERANCE, SLACK_MS = float(os.environ.get('TOLERANCE', 0.5)), float(os.environ.get('SLACK_MS', 5))
+os.environ.update({'DATA_BACKEND': 'memory', 'MEMORY_FIRESTORE_LATENCY_MS': str(LATENCY_MS), 'IMAGE_UPLOADER': 'local', 'APP_ENV': 'production',
+                   'SHARED_CACHE_PATH': os.path.join(tempfile.mkdtemp(), 'bench_routes.sqlite3'), 'FLASK_SECRET_KEY': 'bench', 'SLOW_REQUEST_MS': '1e9'})
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import analytics
+import app as nissahub
+from firebase_admin import firestore
+from orders import price_cart, write_order
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'routes.json')
+VOLUMES = {name: max(1, int(count * SCALE)) for name, count in {'creators': 40, 'customers': 600, 'skills': 300, 'products': 400, 'orders': 300}.items()}
+LESSONS, REVIEWS, DISCUSSIONS, REPLIES, ENROLLMENTS = 8, 6, 3, 2, 5
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+IMAGE = 'https://res.cloudinary.com/demo/image/upload/v1/nissahub_skills/{}.jpg'
+# The signed-in user a route runs as; anything not listed runs as the admin creator c0.
+CUSTOMER_ROUTES, ANONYMOUS_ROUTES = {'cart_page', 'checkout_page', 'order_confirmation_page', 'customer_profile_page', 'course_player_page'}, {'login_page', 'register_page', 'forgot_password_page'}
+SKIPPED_ROUTES = {'static', 'upload_status', 'bulk_delete_status', 'reorder_lesson'}
+LOAD_MIX = ('/', '/skills', '/skills?query=weav', '/marketplace', '/skill/<string:skill_id>', '/product/<string:product_id>', '/creator/<string:creator_id>',
+            '/course/<string:skill_id>/lesson/<string:lesson_id>', '/cart', '/dashboard')
+
+
+def write_all(db, writes):
+    """Commits (ref, data) pairs in batches of orders.MAX_BATCH_WRITES."""
+    for start in range(0, len(writes), 500):
+        batch = db.batch()
+        for ref, data in writes[start:start + 500]: batch.set(ref, data)
+        batch.commit()
+
+
+def seed(db, rng):
+    """Writes users, skills with lessons/reviews/discussions, products, enrollments and orders; returns the ids routes need."""
+    users, skills, products = db.collection('users'), db.collection('skills'), db.collection('products')
+    creators, customers = [f'c{i}' for i in range(VOLUMES['creators'])], [f'u{i}' for i in range(VOLUMES['customers'])]
+    writes = [(users.document(uid), {'uid': uid, 'email': f'{uid}@example.com', 'role': 'creator' if uid[0] == 'c' else 'customer', 'displayName': f'User {uid}', 'isAdmin': uid == 'c0',
+                                     'bio': 'Artisan from Fes. ' * 6, 'profile_picture_url': IMAGE.format(uid), 'createdAt': EPOCH + datetime.timedelta(hours=i)})
+              for i, uid in enumerate(creators + customers)]
+    skill_ids = [f's{i}' for i in range(VOLUMES['skills'])]
+    for i, skill_id in enumerate(skill_ids):
+        author, skill_ref = rng.choice(creators) if i else 'c0', skills.document(skill_id)
+        lessons = [{'title': f'Lesson {j + 1}', 'lesson_type': 'Video' if j % 3 == 0 else 'Text', 'content': 'Warp the loom, then weave. ' * 40, 'order': j + 1, 'created_at': EPOCH} for j in range(LESSONS)]
+        ratings = [rng.randint(3, 5) for _ in range(rng.randint(0, REVIEWS))]
+        writes.append((skill_ref, {'name': f'Skill {i}: hand weaving', 'description': 'Learn to weave a rug on a frame loom, from warp to finishing. ' * 3, 'category': rng.choice(nissahub.SKILL_CATEGORIES),
+                                   'author_id': author, 'author_email': f'{author}@example.com', 'created_at': EPOCH + datetime.timedelta(hours=i), 'image_url': IMAGE.format(skill_id),
+                                   'isPublished': i == 0 or rng.random() < 0.9, 'isFeatured': i % 10 == 0, 'lesson_count': LESSONS, 'enrollment_count': 0,
+                                   'lesson_outline': [{'id': f'l{j}', 'title': lesson['title'], 'lesson_type': lesson['lesson_type'], 'order': lesson['order']} for j, lesson in enumerate(lessons)],
+                                   **nissahub.review_stats({}, len(ratings), sum(ratings))}))
+        writes.extend((skill_ref.collection('lessons').document(f'l{j}'), lesson) for j, lesson in enumerate(lessons))
+        writes.extend((skill_ref.collection('reviews').document(f'r{j}'), {'user_id': rng.choice(customers), 'rating': rating, 'text': 'Clear and patient teaching.', 'created_at': EPOCH, 'skill_id': skill_id})
+                      for j, rating in enumerate(ratings))
+        for j in range(DISCUSSIONS):
+            post_ref = skill_ref.collection('discussions').document(f'd{j}')
+            writes.append((post_ref, {'content': 'How tight should the warp be?', 'user_id': rng.choice(customers), 'skill_id': skill_id, 'created_at': EPOCH + datetime.timedelta(minutes=j)}))
+            writes.extend((post_ref.collection('replies').document(f'x{k}'), {'content': 'Firm, like a drum.', 'user_id': author, 'post_id': f'd{j}', 'skill_id': skill_id, 'created_at': EPOCH}) for k in range(REPLIES))
+    for i in range(VOLUMES['products']):
+        author = rng.choice(creators) if i else 'c0'
+        writes.append((products.document(f'p{i}'), {'name': f'Rug {i}', 'description': 'Hand-knotted wool rug. ' * 4, 'price': round(rng.uniform(5, 500), 2), 'category': rng.choice(nissahub.PRODUCT_CATEGORIES),
+                                                    'isPublished': i == 0 or rng.random() < 0.9, 'isFeatured': i % 10 == 0, 'image_url': IMAGE.format(f'p{i}'), 'author_id': author,
+                                                    'author_email': f'{author}@example.com', 'created_at': EPOCH + datetime.timedelta(hours=i)}))
+    for uid in customers[:len(customers) // 2]:
+        for skill_id in {'s0'} | set(rng.sample(skill_ids, min(ENROLLMENTS, len(skill_ids)))) if uid == 'u0' else rng.sample(skill_ids, min(ENROLLMENTS, len(skill_ids))):
+            writes.append((db.collection('enrollments').document(f'{uid}_{skill_id}'), {'user_id': uid, 'skill_id': skill_id, 'enrolled_at': EPOCH}))
+    write_all(db, writes)
+    published = [doc.id for doc in products.where(filter=firestore.FieldFilter('isPublished', '==', True)).select([]).stream()]
+    order_ids = [write_order(db, rng.choice(customers) if i else 'u0', *price_cart(db, [{'id': product_id, 'quantity': rng.randint(1, 3)} for product_id in rng.sample(published, rng.randint(1, 4))])).id
+                 for i in range(VOLUMES['orders'])]
+    analytics.rebuild(db)
+    return {'skill_id': 's0', 'product_id': 'p0', 'creator_id': 'c0', 'user_id': 'u0', 'lesson_id': 'l1', 'order_id': order_ids[0]}
+
+
+def client(uid=None):
+    test_client = nissahub.app.test_client()
+    if uid:
+        with test_client.session_transaction() as session: session['user_id'], session['role'], session['email'] = uid, 'creator' if uid[0] == 'c' else 'customer', f'{uid}@example.com'
+    return test_client
+
+
+def get_routes(ids):
+    """(label, signed-in user, method, url, form) for every GET rule, with arguments filled from the seeded ids, plus query variants."""
+    routes = []
+    with nissahub.app.test_request_context():
+        for rule in sorted(nissahub.app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if 'GET' not in rule.methods or rule.endpoint in SKIPPED_ROUTES: continue
+            user = None if rule.endpoint in ANONYMOUS_ROUTES else 'u0' if rule.endpoint in CUSTOMER_ROUTES else 'c0'
+            routes.append((rule.rule, user, 'GET', nissahub.url_for(rule.endpoint, **{name: ids[name] for name in rule.arguments}), None))
+    return routes + [('/skills?category=Beauty', 'c0', 'GET', '/skills?category=Beauty', None), ('/skills?query=weav', 'c0', 'GET', '/skills?query=weav', None),
+                     ('/marketplace?query=rug', 'c0', 'GET', '/marketplace?query=rug', None)]
+
+
+def post_flows(ids, products):
+    """POST flows as functions of the repetition, each run by a customer not used before, so every run does the same work."""
+    def customer(i): return f'u{VOLUMES["customers"] - 1 - i}'
+    skill, post = ids['skill_id'], 'd0'
+    return {
+        'POST enroll': lambda i: (customer(i), 'POST', f'/skill/{skill}/enroll', {}),
+        'POST review': lambda i: (customer(i), 'POST', f'/skill/{skill}/review', {'rating': '5', 'review_text': 'Loved it.'}),
+        'POST discussion': lambda i: (customer(i), 'POST', f'/skill/{skill}/discussion', {'content': 'Which wool do you use?'}),
+        'POST reply': lambda i: (customer(i), 'POST', f'/skill/{skill}/discussion/{post}/reply', {'content': 'Merino works well.'}),
+        'POST checkout': lambda i: (customer(i), 'POST', '/checkout/submit', {'cart_data': json.dumps([{'id': product, 'quantity': 1} for product in products[i % len(products)]])}),
+        'POST edit profile': lambda i: (customer(i), 'POST', '/profile/edit', {'display_name': f'Customer {i}', 'bio': 'Weaving beginner.'}),
+        'POST add lesson': lambda i: ('c0', 'POST', f'/skills/{skill}/manage', {'lesson_title': f'Extra {i}', 'lesson_type': 'Text', 'content_text': 'More weaving.'}),
+        'POST toggle feature': lambda i: ('c0', 'POST', f'/admin/course/{skill}/toggle_feature', {}),
+    }
+
+
+def clear_caches():
+    for cache in nissahub.cache_tiers.values(): cache.clear()
+
+
+def call(test_client, method, url, form):
+    """Runs one request; returns (ms, rpcs, documents read, error or None)."""
+    db = nissahub.db
+    before, started = db.stats(), time.perf_counter()
+    response = test_client.open(url, method=method, data=form)
+    elapsed, after = (time.perf_counter() - started) * 1000, db.stats()
+    with test_client.session_transaction() as session: errors = [message for category, message in session.pop('_flashes', []) if category == 'error']
+    if response.is_json and (response.get_json(silent=True) or {}).get('status') == 'error': errors.append(response.get_json()['message'])
+    if response.status_code >= 500: errors.append(f'HTTP {response.status_code}')
+    return elapsed, after['calls'] - before['calls'], after['documents_read'] - before['documents_read'], '; '.join(errors) or None
+
+
+def measure(label, requests):
+    """Cold request with cleared caches, then REPEATS warm ones; `requests(i)` gives (user, method, url, form)."""
+    clients = {}
+    def run(i):
+        user, method, url, form = requests(i)
+        if user not in clients: clients[user] = client(user)
+        return call(clients[user], method, url, form)
+    clear_caches()
+    cold_ms, cold_rpcs, _, error = run(0)
+    warm = [run(i + 1) for i in range(REPEATS)]
+    error = error or next((result[3] for result in warm if result[3]), None)
+    latencies = sorted(result[0] for result in warm)
+    return {'cold_ms': round(cold_ms, 1), 'cold_rpcs': cold_rpcs, 'p50_ms': round(statistics.median(latencies), 1), 'p95_ms': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 1),
+            'rpcs': round(sum(result[1] for result in warm) / REPEATS, 1), 'docs': round(sum(result[2] for result in warm) / REPEATS, 1), 'error': error}
+
+
+def regressions(label, result, baseline):
+    if not baseline: return []
+    found = [f'{key} {baseline[key]} -> {result[key]}' for key in ('cold_rpcs', 'rpcs') if result[key] > baseline[key]]
+    if result['p50_ms'] > baseline['p50_ms'] * (1 + TOLERANCE) + SLACK_MS: found.append(f"p50 {baseline['p50_ms']} -> {result['p50_ms']} ms")
+    return found
+
+
+def load_test(routes):
+    """THREADS threads, each with its own signed-in client, request a read-heavy mix of routes for DURATION seconds."""
+    mix = [route for route in routes if route[0] in LOAD_MIX]
+    results, lock, deadline = [], threading.Lock(), time.perf_counter() + DURATION
+    def worker(seed):
+        rng, clients = random.Random(seed), {}
+        while time.perf_counter() < deadline:
+            label, user, method, url, form = rng.choice(mix)
+            if user not in clients: clients[user] = client(user)
+            started = time.perf_counter()
+            response = clients[user].open(url, method=method, data=form)
+            with lock: results.append(((time.perf_counter() - started) * 1000, response.status_code < 500))
+    nissahub.db.reset_counters()
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    latencies, stats = sorted(ms for ms, _ in results), nissahub.db.stats()
+    print(f"{THREADS} threads x {DURATION:.0f} s over {len(mix)} routes: {len(results) / DURATION:.1f} req/s, p50 {statistics.median(latencies):.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms, {sum(not ok for _, ok in results)} failed, {stats['calls'] / len(results):.2f} RPCs and {stats['documents_read'] / len(results):.1f} docs per request")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save-baseline', action='store_true', help=f'write the results to {os.path.relpath(BASELINE)}')
+    parser.add_argument('--load', action='store_true', help='run the concurrent load test instead of the per-route table')
+    args = parser.parse_args()
+
+    started, rng = time.perf_counter(), random.Random(25)
+    ids = seed(nissahub.db, rng)
+    nissahub.start_worker(warm=True)
+    gc.collect(); gc.freeze()  # the seeded store is long-lived: keep its collection pauses out of the first routes' timings
+    print(f"Seeded {nissahub.db.stats()['documents']:,} documents in {time.perf_counter() - started:.1f} s; {LATENCY_MS:g} ms per RPC, {REPEATS} warm requests per route\n")
+    routes = get_routes(ids)
+    if args.load: load_test(routes); sys.exit(0)
+
+    settings = {'scale': SCALE, 'latency_ms': LATENCY_MS, 'repeats': REPEATS}
+    baseline = json.load(open(BASELINE)) if os.path.exists(BASELINE) and not args.save_baseline else None
+    if baseline and baseline.get('settings') != settings: print(f"Baseline was recorded with {baseline.get('settings')}; not comparing.\n"); baseline = None
+    published = [doc.id for doc in nissahub.db.collection('products').where(filter=firestore.FieldFilter('isPublished', '==', True)).select([]).stream()]
+    requests = {label: (lambda i, route=(user, method, url, form): route) for label, user, method, url, form in routes}
+    requests.update(post_flows(ids, [published[i:i + 2] for i in range(0, 2 * (REPEATS + 1), 2)]))
+
+    results, failures, regressed = {}, 0, 0
+    print(f"{'route':<52} {'cold ms':>8} {'RPCs':>5} {'p50 ms':>7} {'p95 ms':>7} {'RPCs':>5} {'docs':>6}  notes")
+    for label, request in requests.items():
+        result = results[label] = measure(label, request)
+        notes = regressions(label, result, (baseline or {}).get('routes', {}).get(label))
+        failures += bool(result['error']); regressed += bool(notes)
+        print(f"{label:<52} {result['cold_ms']:>8.1f} {result['cold_rpcs']:>5} {result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} {result['rpcs']:>5} {result['docs']:>6}  "
+              + '; '.join(([f"FAILED: {result['error']}"] if result['error'] else []) + (['REGRESSED: ' + ', '.join(notes)] if notes else [])))
+    print(f"\n{len(results)} routes, {failures} failed, {regressed} regressed against {'the baseline' if baseline else 'no baseline'}.")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, 'w') as f: json.dump({'settings': settings, 'routes': {label: {key: value for key, value in result.items() if key != 'error'} for label, result in results.items()}}, f, indent=1, sort_keys=True)
+        print(f"Baseline written to {os.path.relpath(BASELINE)}.")
+    sys.exit(1 if failures or regressed else 0)
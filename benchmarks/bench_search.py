@@ -0,0 +1,68 @@
+# benchmarks/bench_search.py
+"""Compares the legacy per-document prefix tokens with search_index.SearchIndex at 100k documents.
+
+The legacy side reproduces generate_search_tokens and measures what it stored on
+every skill document (array entries and bytes), plus a token -> ids map standing in
+for Firestore's array_contains index. The new side measures index build time, size
+and query latency for single-term, prefix and multi-term AND queries.
+Run from the project root: python benchmarks/bench_search.py [doc_count]
+"""
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from search_index import SearchIndex
+
+DOCS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+CATEGORIES = ["Handicrafts", "Fashion & Design", "Culinary Arts", "Arts & Crafts", "Digital Arts", "Beauty", "Other"]
+random.seed(7)
+VOCABULARY = [''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(random.randint(4, 11))) for _ in range(20_000)]
+
+
+def legacy_search_tokens(text):
+    words = set(re.findall(r'\b\w+\b', text.lower())); tokens = set()
+    for word in words:
+        for i in range(1, len(word) + 1): tokens.add(word[:i])
+    return list(tokens)
+
+
+def make_doc():
+    return {'name': ' '.join(random.choices(VOCABULARY, k=4)), 'description': ' '.join(random.choices(VOCABULARY, k=60)),
+            'category': random.choice(CATEGORIES), 'isPublished': True}
+
+
+def latency_us(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter(); fn(query); samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), sorted(samples)[int(len(samples) * 0.99) - 1]
+
+
+if __name__ == '__main__':
+    docs = {f'd{i}': make_doc() for i in range(DOCS)}
+
+    start = time.perf_counter(); legacy_postings = {}; stored_entries = stored_bytes = 0
+    for doc_id, data in docs.items():
+        tokens = legacy_search_tokens(f"{data['name']} {data['description']}")
+        stored_entries += len(tokens); stored_bytes += sum(len(t) for t in tokens)
+        for token in tokens: legacy_postings.setdefault(token, set()).add(doc_id)
+    legacy_build = time.perf_counter() - start
+
+    index = SearchIndex(); start = time.perf_counter()
+    for doc_id, data in docs.items(): index.upsert('skill', doc_id, data)
+    index_build = time.perf_counter() - start
+    index.search('warmup')
+
+    words = random.choices(VOCABULARY, k=500)
+    print(f"{DOCS:,} documents")
+    print(f"legacy tokens : {stored_entries / DOCS:,.0f} array entries/doc, {stored_bytes / DOCS / 1024:,.1f} KiB/doc stored, build {legacy_build:.1f}s")
+    print(f"search index  : {len(index._postings):,} terms, {sum(len(p) for p in index._postings.values()) / DOCS:,.0f} postings/doc in memory, build {index_build:.1f}s")
+    print("query latency (p50 / p99 µs):")
+    print("  legacy exact token lookup   %8.1f / %8.1f" % latency_us(lambda q: legacy_postings.get(q, ()), words))
+    print("  index single term           %8.1f / %8.1f" % latency_us(lambda q: index.search(q), words))
+    print("  index 4-char prefix         %8.1f / %8.1f" % latency_us(lambda q: index.search(q[:4]), words))
+    print("  index 2-term AND + category %8.1f / %8.1f" % latency_us(lambda q: index.search(f"{q} {random.choice(VOCABULARY)[:3]}", category='Beauty'), words))
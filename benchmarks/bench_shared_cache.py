@@ -0,0 +1,66 @@
+# benchmarks/bench_shared_cache.py
+"""Hit latency of shared_cache.TieredCache next to a plain dict and a per-process cachetools TTLCache.
+
+Three value shapes are cached: a user profile document, a user's enrolled skill ids
+(a frozenset) and a rendered 24-card grid with its next-page cursor. For each shape
+the table gives a local-tier hit, a shared-tier hit (local_ttl=0, so every read goes
+to SQLite and msgpack), the same shared hit from a second, forked worker that never
+wrote the entry, a miss, and a write. Each figure is the mean of REPEATS calls.
+Run from the project root: python benchmarks/bench_shared_cache.py
+"""
+import datetime
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from cachetools import TTLCache
+from markupsafe import Markup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from shared_cache import SharedCache, TieredCache, pack
+
+REPEATS = int(os.environ.get('REPEATS', 20_000))
+CARD = ('<article class="card"><a href="/skill/s{i}"><img src="https://res.cloudinary.com/demo/image/upload/w_400,h_300,c_fill,g_auto,f_auto,q_auto/v1/s{i}.jpg" '
+        'alt="Skill {i}" loading="lazy"></a><div class="card-body"><h3>Skill {i}: hand weaving</h3><p>Learn to weave a rug on a frame loom, from warp to finishing.</p>'
+        '<span class="category-tag">Handicrafts</span></div></article>')
+VALUES = {
+    'user profile': {'uid': 'u42', 'displayName': 'Amal Idrissi', 'email': 'amal@example.com', 'role': 'creator', 'isAdmin': False, 'bio': 'Weaver from Fes. ' * 8,
+                     'profile_picture_url': 'https://res.cloudinary.com/demo/image/upload/v1/avatars/u42.jpg', 'createdAt': datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)},
+    'enrolled skill ids (20)': frozenset(f's{i}' for i in range(20)),
+    'card grid (24 cards)': (Markup(''.join(CARD.format(i=i) for i in range(24))), 's23'),
+}
+
+
+def measure(fn):
+    start = time.perf_counter()
+    for _ in range(REPEATS): fn()
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+def tiered(shared, local_ttl):
+    return TieredCache(shared, 'bench', maxsize=1024, ttl=300, local_ttl=local_ttl, check_interval=1)
+
+
+def other_worker(path, key, results):
+    # A fresh connection and an empty local tier, as in another gunicorn worker.
+    cache = tiered(SharedCache(path), local_ttl=0)
+    assert cache.get(key) is not None
+    results.put(measure(lambda: cache.get(key)))
+
+
+if __name__ == '__main__':
+    path = os.path.join(tempfile.mkdtemp(), 'bench_shared_cache.sqlite3')
+    shared = SharedCache(path)
+    print(f"{'value':<24} {'bytes':>6} {'dict':>7} {'TTLCache':>9} {'local':>7} {'shared':>7} {'2nd proc':>9} {'miss':>7} {'write':>7}   (µs/call)")
+    for label, value in VALUES.items():
+        key = ('bench', label)
+        plain, ttl_cache, local, remote = {key: value}, TTLCache(maxsize=1024, ttl=300), tiered(shared, local_ttl=300), tiered(shared, local_ttl=0)
+        ttl_cache[key] = value; local[key] = value
+        results = multiprocessing.get_context('fork').Queue()
+        worker = multiprocessing.get_context('fork').Process(target=other_worker, args=(path, key, results)); worker.start()
+        second_process = results.get(); worker.join()
+        timings = [measure(lambda: plain.get(key)), measure(lambda: ttl_cache.get(key)), measure(lambda: local.get(key)), measure(lambda: remote.get(key)),
+                   second_process, measure(lambda: remote.get(('missing', label))), measure(lambda: remote.__setitem__(key, value))]
+        print(f"{label:<24} {len(pack(value)):>6} " + ' '.join(f"{t:>{w}.2f}" for t, w in zip(timings, (7, 9, 7, 7, 9, 7, 7))))
+    print(f"\nshared file: {shared.stats()}")
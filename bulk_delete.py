@@ -0,0 +1,126 @@
+# bulk_delete.py
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from firebase_admin import firestore
+
+BATCH_SIZE = 500
+
+
+def _descendants(doc_ref):
+    """Yields every document below doc_ref's subcollections, children before their parents.
+
+    list_documents also returns "missing" documents that only exist as parents of
+    subcollections, so orphaned subtrees are reached as well.
+    """
+    for collection_ref in doc_ref.collections():
+        for child_ref in collection_ref.list_documents(page_size=BATCH_SIZE):
+            yield from _descendants(child_ref)
+            yield child_ref
+
+
+def delete_trees(db, refs, on_progress=None):
+    """Deletes each document in `refs` with all of its subcollections, in batched writes.
+
+    Descendants are deleted before the document itself, so a failure part-way leaves
+    the parent in place and the delete can simply be retried. Returns the number of
+    documents deleted.
+    """
+    batch, pending, deleted = db.batch(), 0, 0
+    for ref in refs:
+        for target in (*_descendants(ref), ref):
+            batch.delete(target); pending += 1
+            if pending == BATCH_SIZE:
+                batch.commit(); deleted += pending
+                batch, pending = db.batch(), 0
+                if on_progress: on_progress(deleted)
+    if pending:
+        batch.commit(); deleted += pending
+        if on_progress: on_progress(deleted)
+    return deleted
+
+
+def find_orphans(db):
+    """Finds subtrees whose parent document no longer exists, or is still marked `deleting`.
+
+    Covers skill/product documents that only survive as parents of subcollections,
+    discussion posts whose replies outlived them, documents hidden by a delete job that
+    failed part-way, and enrollments for deleted skills.
+    """
+    orphans = []
+    def missing(refs):
+        for start in range(0, len(refs), BATCH_SIZE):
+            chunk = refs[start:start + BATCH_SIZE]
+            existing = {doc.reference.path for doc in db.get_all(chunk) if doc.exists}
+            yield from (ref for ref in chunk if ref.path not in existing)
+    for collection in ('skills', 'products'):
+        orphans.extend(missing(list(db.collection(collection).list_documents(page_size=BATCH_SIZE))))
+        orphans.extend(doc.reference for doc in db.collection(collection).where(filter=firestore.FieldFilter('deleting', '==', True)).select(['__name__']).stream())
+    orphans.extend(doc.reference for doc in db.collection_group('discussions').where(filter=firestore.FieldFilter('deleting', '==', True)).select(['__name__']).stream())
+    post_refs = {reply.reference.parent.parent.path: reply.reference.parent.parent for reply in db.collection_group('replies').select(['__name__']).stream()}
+    orphans.extend(missing(list(post_refs.values())))
+    enrollments = list(db.collection('enrollments').stream())
+    skill_refs = {doc.to_dict().get('skill_id') for doc in enrollments} - {None}
+    missing_skills = {ref.id for ref in missing([db.collection('skills').document(skill_id) for skill_id in skill_refs])}
+    orphans.extend(doc.reference for doc in enrollments if doc.to_dict().get('skill_id') in missing_skills)
+    return orphans
+
+
+class BulkDeleter:
+    """Runs recursive deletes as background jobs and keeps their progress for an hour.
+
+    Images named in a job are destroyed with `uploader` once its documents are gone; one
+    that cannot be destroyed is printed and left behind rather than failing the job.
+    Each status change is also written to `status_cache` (e.g. a shared_cache.TieredCache),
+    so any worker on the host can report a job; without one, only the worker running it can.
+    """
+
+    def __init__(self, db, workers=2, uploader=None, status_cache=None):
+        self.db, self.workers, self.uploader = db, workers, uploader
+        self._jobs, self._lock, self._executor = TTLCache(maxsize=10000, ttl=3600), threading.Lock(), None
+        self._status = status_cache
+
+    def submit(self, refs, label, user_id=None, queries=(), image_urls=(), on_complete=None):
+        """Schedules deletion of `refs` (and every document matched by `queries`) with their subtrees, then of `image_urls`; returns the job id."""
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'label': label, 'status': 'queued', 'deleted': 0, 'error': None, 'user_id': user_id}
+        with self._lock:
+            self._jobs[job_id] = job
+            # The pool is created on first use so it belongs to the process serving requests.
+            if self._executor is None: self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-delete')
+        self._publish(job)
+        self._executor.submit(self._run, job, list(refs), list(queries), [url for url in image_urls if url], on_complete)
+        return job_id
+
+    def _publish(self, job):
+        if self._status is not None:
+            with self._lock: public = dict(job)
+            self._status[job['id']] = public
+
+    def _run(self, job, refs, queries, image_urls, on_complete):
+        def progress(deleted):
+            with self._lock: job['deleted'] = deleted
+            self._publish(job)
+        with self._lock: job['status'] = 'running'
+        self._publish(job)
+        try:
+            for query in queries: refs.extend(doc.reference for doc in query.stream())
+            delete_trees(self.db, refs, on_progress=progress)
+            for url in image_urls:
+                try: self.uploader.destroy(url)
+                except Exception: traceback.print_exc()
+            with self._lock: job['status'] = 'done'
+            self._publish(job)
+            if on_complete: on_complete(job)
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock: job['status'], job['error'] = 'failed', str(e)
+            self._publish(job)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job: return dict(job)
+        return self._status.get(job_id) if self._status is not None else None
@@ -0,0 +1,194 @@
+# catalog_mirror.py
+import bisect
+import datetime
+import threading
+import time
+import traceback
+from google.cloud.firestore_v1.watch import ChangeType
+
+MIRRORED_COLLECTIONS = {'skill': 'skills', 'product': 'products'}
+# Only what cards, listings and the product page render is kept, as a tuple in this order.
+FIELDS = {
+    'skill': ('name', 'description', 'category', 'image_url', 'author_id', 'created_at', 'isFeatured'),
+    'product': ('name', 'description', 'category', 'image_url', 'author_id', 'created_at', 'isFeatured', 'price'),
+}
+ALL = ('all',)
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _sort_key(doc_id, created_at):
+    # Newest first, ties broken by id, matching order_by('created_at', DESCENDING) closely enough for paging.
+    return (-created_at.timestamp() if isinstance(created_at, datetime.datetime) else 0.0, doc_id)
+
+
+def page_cursor(doc_id, created_at):
+    """Encodes the last document of a page as its order value and id, so the next page never needs to read it back."""
+    micros = round(created_at.timestamp() * 1_000_000) if isinstance(created_at, datetime.datetime) else 0
+    return f'{micros}~{doc_id}'
+
+
+def parse_page_cursor(cursor):
+    """Returns (created_at, doc_id) from a page_cursor() string, or None if it is not one."""
+    micros, _, doc_id = (cursor or '').partition('~')
+    if not doc_id: return None
+    try: return EPOCH + datetime.timedelta(microseconds=int(micros)), doc_id
+    except (ValueError, OverflowError): return None
+
+
+class _Collection:
+    """Published documents of one collection plus created_at-ordered id lists per index key."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.records, self.orders = {}, {ALL: []}
+
+    def _index_keys(self, record):
+        values = dict(zip(self.fields, record[0]))
+        # Like Firestore's isFeatured == True/False filters, a document without a boolean flag matches neither.
+        featured = values.get('isFeatured') if isinstance(values.get('isFeatured'), bool) else None
+        return (ALL, ('author', values.get('author_id')), ('category', values.get('category')), ('featured', featured))
+
+    def _record(self, doc_id, data, update_time):
+        return (tuple(data.get(field) for field in self.fields), _sort_key(doc_id, data.get('created_at')), update_time)
+
+    def load(self, docs):
+        """Bulk-builds from a full snapshot, sorting each index once instead of inserting one by one."""
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('isPublished'): self.records[doc.id] = self._record(doc.id, data, doc.update_time)
+        for record in self.records.values():
+            for key in self._index_keys(record): self.orders.setdefault(key, []).append(record[1])
+        for order in self.orders.values(): order.sort()
+
+    def upsert(self, doc_id, data, update_time):
+        self.remove(doc_id)
+        if not data.get('isPublished'): return
+        record = self.records[doc_id] = self._record(doc_id, data, update_time)
+        for key in self._index_keys(record): bisect.insort(self.orders.setdefault(key, []), record[1])
+
+    def remove(self, doc_id):
+        record = self.records.pop(doc_id, None)
+        if not record: return
+        for key in self._index_keys(record):
+            order = self.orders[key]
+            del order[bisect.bisect_left(order, record[1])]
+            if not order and key != ALL: del self.orders[key]
+
+    def as_dict(self, doc_id):
+        return {'id': doc_id, 'isPublished': True, **dict(zip(self.fields, self.records[doc_id][0]))}
+
+    def page(self, key, after=None, limit=24):
+        """Ids of up to `limit` documents under `key` that sort after the sort key `after`, with their sort keys."""
+        order = self.orders.get(key, [])
+        start = bisect.bisect_right(order, after) if after is not None else 0
+        return order[start:start + limit]
+
+
+class CatalogMirror:
+    """Live in-memory copy of published skills and products, fed by Firestore snapshot listeners.
+
+    Each collection is watched in full (so every write produces an event) and only
+    published documents are kept, as compact tuples indexed by id, author, category
+    and featured flag, each index ordered by created_at. A listener callback applies
+    its whole change set under the lock, and every read runs under it too, so a read
+    sees each collection as of one snapshot.
+
+    serving() says whether reads may come from memory. It is false until the initial
+    snapshots arrive and while a listener is down or failed (it is then restarted).
+    After this process writes to a collection it is also false until that listener
+    delivers its next snapshot, so a worker sees its own writes, or for at most
+    `max_lag` seconds, since a write that changed nothing produces no snapshot.
+    Callers fall back to Firestore meanwhile.
+    """
+
+    def __init__(self, max_lag=5):
+        self.max_lag = max_lag
+        self._lock = threading.RLock()
+        self._collections = {kind: _Collection(FIELDS[kind]) for kind in MIRRORED_COLLECTIONS}
+        self._watches, self._read_times, self._pending_writes, self._failed = {}, {}, {}, set()
+        self._db = None
+
+    def start(self, db):
+        """Subscribes both listeners; call once per worker process, after any fork."""
+        self._db = db
+        for kind in MIRRORED_COLLECTIONS: self._subscribe(kind)
+
+    def _subscribe(self, kind):
+        with self._lock:
+            self._read_times.pop(kind, None); self._pending_writes.pop(kind, None); self._failed.discard(kind)
+            if self._watches.get(kind):
+                try: self._watches[kind].unsubscribe()
+                except Exception: traceback.print_exc()
+            self._watches[kind] = self._db.collection(MIRRORED_COLLECTIONS[kind]).on_snapshot(lambda docs, changes, read_time: self._on_snapshot(kind, docs, changes, read_time))
+
+    def _on_snapshot(self, kind, docs, changes, read_time):
+        try:
+            with self._lock:
+                collection = self._collections[kind]
+                if kind not in self._read_times:
+                    # First snapshot after (re)subscribing carries every document: rebuild rather than patch.
+                    collection = self._collections[kind] = _Collection(FIELDS[kind])
+                    collection.load(docs)
+                else:
+                    for change in changes:
+                        if change.type == ChangeType.REMOVED: collection.remove(change.document.id)
+                        else: collection.upsert(change.document.id, change.document.to_dict(), change.document.update_time)
+                self._read_times[kind] = read_time
+                self._pending_writes.pop(kind, None)
+        except Exception:
+            # Restarted from serving(): closing a watch from its own callback thread would deadlock.
+            traceback.print_exc()
+            with self._lock: self._failed.add(kind)
+
+    def note_write(self, kind):
+        """Records that this process just wrote to `kind`'s collection; reads fall back until the listener reports it."""
+        with self._lock: self._pending_writes.setdefault(kind, time.monotonic())
+
+    def serving(self, *kinds):
+        kinds = kinds or tuple(MIRRORED_COLLECTIONS)
+        with self._lock:
+            if not self._db: return False
+            for kind in kinds:
+                watch, pending = self._watches.get(kind), self._pending_writes.get(kind)
+                if kind in self._failed or (watch is not None and not watch.is_active):
+                    try: self._subscribe(kind)
+                    except Exception: traceback.print_exc()
+                    return False
+                if pending is not None and time.monotonic() - pending > self.max_lag: del self._pending_writes[kind]; pending = None
+                if kind not in self._read_times or pending is not None: return False
+        return True
+
+    def get(self, kind, doc_id):
+        """Returns (data, update_time) for a published document, or None."""
+        with self._lock:
+            collection = self._collections[kind]
+            return (collection.as_dict(doc_id), collection.records[doc_id][2]) if doc_id in collection.records else None
+
+    def get_many(self, kind, ids):
+        with self._lock:
+            collection = self._collections[kind]
+            return [collection.as_dict(doc_id) for doc_id in ids if doc_id in collection.records]
+
+    def by_author(self, kind, author_id):
+        """Every published document by author_id, newest first (the storefront lists them unpaged)."""
+        with self._lock:
+            collection = self._collections[kind]
+            return [collection.as_dict(doc_id) for _, doc_id in collection.orders.get(('author', author_id), [])]
+
+    def page(self, kind, cursor=None, page_size=24, category=None, author_id=None, featured=None):
+        """One created_at-descending page filtered on at most one index; returns (docs, next_cursor) like paginate_query."""
+        key = ('category', category) if category else ('author', author_id) if author_id else ('featured', featured) if featured is not None else ALL
+        position = parse_page_cursor(cursor) if cursor else None
+        if cursor and position is None: return [], None
+        with self._lock:
+            collection = self._collections[kind]
+            keys = collection.page(key, _sort_key(position[1], position[0]) if position else None, page_size + 1)
+            docs = [collection.as_dict(doc_id) for _, doc_id in keys[:page_size]]
+        if len(keys) <= page_size: return docs, None
+        last = keys[page_size - 1]
+        return docs, page_cursor(last[1], EPOCH + datetime.timedelta(microseconds=round(-last[0] * 1_000_000)))
+
+    def stats(self):
+        with self._lock:
+            return {kind: {'documents': len(collection.records), 'read_time': str(self._read_times.get(kind)), 'pending_write_age': round(time.monotonic() - self._pending_writes[kind], 1) if kind in self._pending_writes else None}
+                    for kind, collection in self._collections.items()}
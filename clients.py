@@ -0,0 +1,65 @@
+# clients.py
+import os
+import threading
+import firebase_admin
+from firebase_admin import credentials
+from google.cloud import firestore as google_firestore
+
+
+class FirestoreClients:
+    """Builds the Firebase app and Firestore clients lazily, once per process.
+
+    Importing the app builds nothing; the first `client()` call in a process does.
+    gRPC channels do not survive fork(), so a forked child drops anything the parent
+    built and makes its own on first use. `on_client` is applied to every new
+    client (sync and async), e.g. to instrument it.
+    """
+
+    def __init__(self, credentials_path, on_client=None):
+        self.credentials_path, self.on_client = credentials_path, on_client
+        self._reset()
+        if hasattr(os, 'register_at_fork'): os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # The lock is replaced too: another thread may have held it at the moment of the fork.
+        self._lock, self._pid, self._credentials, self._client = threading.Lock(), os.getpid(), None, None
+
+    @property
+    def configured(self):
+        return os.path.exists(self.credentials_path)
+
+    def _ensure_credentials(self):
+        if self._credentials is None:
+            self._credentials = credentials.Certificate(self.credentials_path)
+            if not firebase_admin._apps: firebase_admin.initialize_app(self._credentials)
+        return self._credentials
+
+    def app(self):
+        """Initializes the default Firebase app (used by firebase_admin.auth) if this process has not yet."""
+        with self._lock: self._ensure_credentials()
+
+    def _build(self, client_class):
+        cred = self._ensure_credentials()
+        client = client_class(project=cred.project_id, credentials=cred.get_credential())
+        return self.on_client(client) if self.on_client else client
+
+    def client(self):
+        """Returns this process's Firestore client, building it on first use."""
+        with self._lock:
+            if self._client is None: self._client = self._build(google_firestore.Client)
+            return self._client
+
+    def async_client(self):
+        """Builds a new AsyncClient; call it on the event loop that will use it."""
+        with self._lock: return self._build(google_firestore.AsyncClient)
+
+    def lazy(self):
+        return LazyClient(self)
+
+
+class LazyClient:
+    """Stands in for the Firestore client in module globals and resolves to the current process's client on use."""
+
+    def __init__(self, clients): self._clients = clients
+    def __getattr__(self, name): return getattr(self._clients.client(), name)
+    def __bool__(self): return self._clients.configured
@@ -1,5 +1,9 @@
 # compile_scss.py
+import argparse
+import hashlib
+import re
 import subprocess
+import threading
 import time
 import os
 import sys
@@ -10,37 +14,134 @@ SCSS_DIR = os.path.join(os.path.dirname(__file__), 'static', 'scss')
 CSS_DIR = os.path.join(os.path.dirname(__file__), 'static', 'css')
 MAIN_SCSS_FILE = os.path.join(SCSS_DIR, 'main.scss')
 OUTPUT_CSS_FILE = os.path.join(CSS_DIR, 'main.css')
+# Deploy builds go under the git-ignored static/dist, where `python assets.py` picks them up.
+DEPLOY_CSS_FILE = os.path.join(os.path.dirname(__file__), 'static', 'dist', 'compiled', 'css', 'main.css')
+# An editor save fires several events; wait this long after the last one before building.
+DEBOUNCE_SECONDS = 0.2
+IMPORT_RE = re.compile(r'''@(?:use|forward|import)\s+['"]([^'"]+)['"]''')
 
 os.makedirs(CSS_DIR, exist_ok=True)
 
-def compile_scss_with_cli(event_path=None):
+def resolve_import(from_file, target):
+    """Resolves an @use/@forward/@import target to a file under SCSS_DIR, or None for built-ins and CSS imports."""
+    if target.startswith('sass:') or target.endswith('.css') or '://' in target: return None
+    base = os.path.join(os.path.dirname(from_file), os.path.dirname(target))
+    name = os.path.basename(target)
+    for candidate in (f'_{name}.scss', f'{name}.scss', os.path.join(name, '_index.scss'), os.path.join(name, 'index.scss')):
+        path = os.path.normpath(os.path.join(base, candidate))
+        if os.path.isfile(path): return path
+    return None
+
+def dependency_graph(entry=MAIN_SCSS_FILE):
+    """Returns {file: set of files it loads} for every file reachable from `entry`."""
+    graph, pending = {}, [os.path.normpath(entry)]
+    while pending:
+        path = pending.pop()
+        if path in graph: continue
+        try:
+            with open(path, encoding='utf-8') as f: source = f.read()
+        except OSError: graph[path] = set(); continue
+        graph[path] = {dep for target in IMPORT_RE.findall(source) if (dep := resolve_import(path, target))}
+        pending.extend(graph[path])
+    return graph
+
+def source_hash(files):
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(path.encode())
+        try:
+            with open(path, 'rb') as f: digest.update(f.read())
+        except OSError: digest.update(b'<missing>')
+    return digest.hexdigest()
+
+def compile_scss_with_cli(event_path=None, style='expanded', source_map=True, output=OUTPUT_CSS_FILE):
     if event_path:
         print(f"Change detected in '{os.path.basename(event_path)}'. Recompiling...")
     else:
         print("Initial SCSS compilation...")
-    command = [ "sass", f"{MAIN_SCSS_FILE}:{OUTPUT_CSS_FILE}", "--style=expanded", "--source-map" ]
+    command = [ "sass", f"{MAIN_SCSS_FILE}:{output}", f"--style={style}", "--source-map" if source_map else "--no-source-map" ]
     try:
         is_windows = sys.platform.startswith('win')
         result = subprocess.run(command, capture_output=True, text=True, check=True, shell=is_windows)
         if result.stderr:
             print(f"Compilation warning:\n{result.stderr}")
-        print(f"✅ Success! SCSS compiled with sourcemap.")
+        print(f"✅ Success! SCSS compiled{' with sourcemap' if source_map else f' ({style})'}.")
+        return True
     except FileNotFoundError:
         print("❌ Error: 'sass' command not found. Have you run 'pip install -r requirements.txt' and activated your venv?")
     except subprocess.CalledProcessError as e:
         print("\n" + "="*50 + "\n❌ SCSS Compilation Failed!\n" + f"   Error: {e.stderr}" + "\n" + "="*50 + "\n")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    return False
+
+class IncrementalBuilder:
+    """Turns bursts of file events into at most one compile, and only when the output could change.
+
+    Events are debounced; once they settle, the @use/@import graph from main.scss is
+    re-read, events for files outside it are ignored, and the compile is skipped when
+    the content hash of every reachable file matches the last successful build.
+    Builds run one at a time, so changes made during a compile produce one follow-up.
+    """
+
+    def __init__(self, debounce=DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._lock, self._build_lock = threading.Lock(), threading.Lock()
+        self._timer, self._changed, self._last_hash, self._last_graph = None, set(), None, {}
+
+    def notify(self, path):
+        with self._lock:
+            self._changed.add(os.path.normpath(path))
+            if self._timer: self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._build_lock:
+            with self._lock: changed, self._changed = self._changed, set()
+            graph = dependency_graph()
+            # Files that just left the graph (deleted or no longer imported) still change the output.
+            relevant = sorted(changed & (graph.keys() | self._last_graph.keys()))
+            if not relevant: return
+            self.build(relevant[0], graph)
+
+    def build(self, event_path=None, graph=None):
+        graph = graph or dependency_graph()
+        digest = source_hash(graph)
+        if digest == self._last_hash:
+            print(f"'{os.path.basename(event_path or MAIN_SCSS_FILE)}' saved without changing the compiled sources; skipping.")
+            return
+        self._last_graph = graph
+        if compile_scss_with_cli(event_path): self._last_hash = digest
 
 class ScssChangeHandler(FileSystemEventHandler):
-    def on_modified(self, event):
-        if not event.is_directory and event.src_path.endswith('.scss'):
-            compile_scss_with_cli(event.src_path)
+    def __init__(self, builder):
+        self.builder = builder
+
+    def on_any_event(self, event):
+        # Reads (opened/closed_no_write) are ignored: the builder's own hashing would retrigger it.
+        if event.is_directory or event.event_type not in ('created', 'modified', 'moved', 'deleted'): return
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path and path.endswith('.scss'): self.builder.notify(path)
+
+def build_for_deploy():
+    """One-shot compressed build without a source map; returns a process exit code.
+
+    The output goes to DEPLOY_CSS_FILE, so the tracked main.css and main.css.map the
+    watcher writes are left alone and a deploy keeps the checkout clean.
+    """
+    os.makedirs(os.path.dirname(DEPLOY_CSS_FILE), exist_ok=True)
+    return 0 if compile_scss_with_cli(style='compressed', source_map=False, output=DEPLOY_CSS_FILE) else 1
 
 if __name__ == "__main__":
-    compile_scss_with_cli()
+    parser = argparse.ArgumentParser(description="Compile static/scss/main.scss to static/css/main.css.")
+    parser.add_argument('--build', action='store_true', help="compile once, compressed and without a source map, into static/dist/compiled for assets.py, then exit (for deploys)")
+    if parser.parse_args().build: sys.exit(build_for_deploy())
+    builder = IncrementalBuilder()
+    builder.build()
     print(f"Watching for SCSS changes in: {SCSS_DIR}")
-    event_handler = ScssChangeHandler()
+    event_handler = ScssChangeHandler(builder)
     observer = Observer()
     observer.schedule(event_handler, SCSS_DIR, recursive=True)
     observer.start()
@@ -50,4 +151,4 @@ if __name__ == "__main__":
         print("\nWatcher stopped.")
     finally:
         observer.stop()
-        observer.join()
\ No newline at end of file
+        observer.join()
@@ -0,0 +1,50 @@
+# conditional.py
+import hashlib
+import json
+import os
+import time
+from werkzeug.wrappers import Response
+
+
+def file_fingerprint(*paths):
+    """Digest of the names and mtimes of every file under `paths`, identifying one deploy of templates and assets."""
+    digest = hashlib.sha1()
+    for root in paths:
+        for directory, subdirs, files in sorted(os.walk(root)):
+            subdirs.sort()
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                try: digest.update(f"{os.path.relpath(path, root)}:{os.stat(path).st_mtime_ns}".encode())
+                except OSError: pass
+    return digest.hexdigest()[:12]
+
+
+class PageValidators:
+    """A weak ETag (plus Last-Modified where known) for one page as one viewer sees it.
+
+    The tag hashes everything the page is rendered from: the Firestore update_time of
+    the documents shown (or the rendered fragments, for listings), the viewer's user
+    document and per-user flags such as enrollment, the release, and a time bucket.
+    The bucket bounds how long anything not hashed (e.g. a reviewer renaming
+    themselves) can stay cached. Only If-None-Match is honoured: a date cannot capture
+    per-user state, so Last-Modified is informational.
+    """
+
+    def __init__(self, parts, release='', max_age=300, last_modified=None):
+        payload = json.dumps([release, int(time.time() // max_age) if max_age else 0, parts], default=str, sort_keys=True)
+        self.etag = hashlib.sha1(payload.encode()).hexdigest()[:27]
+        self.last_modified = last_modified
+
+    def is_fresh(self, request):
+        return bool(request.if_none_match) and request.if_none_match.contains_weak(self.etag)
+
+    def apply(self, response):
+        response.set_etag(self.etag, weak=True)
+        if self.last_modified: response.last_modified = self.last_modified
+        # Browsers may keep the page but must revalidate it, and shared caches must not store it.
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+
+    def not_modified(self):
+        return self.apply(Response(status=304))
@@ -0,0 +1,62 @@
+# config.py
+import os
+import stat
+
+
+class Config:
+    TEMPLATES_AUTO_RELOAD = False
+    # Directory for Jinja's on-disk bytecode cache (relative paths are under the app's instance folder); None disables it.
+    JINJA_BYTECODE_CACHE_DIR = None
+    # Load every template once at worker start-up instead of on its first request.
+    PRECOMPILE_TEMPLATES = False
+    # Serve fingerprinted, precompressed files from static/dist (built by assets.py) when its manifest exists.
+    USE_ASSET_MANIFEST = False
+    # Answer If-None-Match with 304 on detail and listing pages (off in development, where templates change under it).
+    CONDITIONAL_GET = False
+    # SQLite file the user, enrollment and card-grid caches share across worker processes (relative paths are under the
+    # instance folder); None keeps them per process.
+    SHARED_CACHE_PATH = None
+
+
+class DevelopmentConfig(Config):
+    """Templates are re-read from disk whenever they change."""
+    TEMPLATES_AUTO_RELOAD = True
+
+
+class ProductionConfig(Config):
+    """Templates are compiled once per worker, from a bytecode cache shared by every worker on the host."""
+    JINJA_BYTECODE_CACHE_DIR = 'jinja_cache'
+    PRECOMPILE_TEMPLATES = True
+    USE_ASSET_MANIFEST = True
+    CONDITIONAL_GET = True
+    SHARED_CACHE_PATH = 'shared_cache.sqlite3'
+
+
+CONFIGS = {'development': DevelopmentConfig, 'production': ProductionConfig}
+
+
+def load_config(app, env=None):
+    """Applies the APP_ENV profile ('development' by default) to app.config, then environment overrides."""
+    env = env or os.environ.get('APP_ENV', 'development')
+    if env not in CONFIGS: raise ValueError(f"Unknown APP_ENV {env!r}; expected one of {', '.join(CONFIGS)}.")
+    app.config.from_object(CONFIGS[env])
+    app.config['APP_ENV'] = env
+    app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY')
+    if 'JINJA_CACHE_DIR' in os.environ: app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ['JINJA_CACHE_DIR'] or None
+    if 'SHARED_CACHE_PATH' in os.environ: app.config['SHARED_CACHE_PATH'] = os.environ['SHARED_CACHE_PATH'] or None
+    for key in ('JINJA_BYTECODE_CACHE_DIR', 'SHARED_CACHE_PATH'):
+        if app.config[key]: app.config[key] = os.path.join(app.instance_path, app.config[key])
+    return app.config
+
+
+def private_directory(path):
+    """Creates `path` with mode 0700, or checks that an existing one is a directory of ours that only we can use; returns it.
+
+    For directories whose files the app loads and trusts (e.g. compiled template bytecode):
+    one another local user could create first, or write into, would let them run code in the app.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or (hasattr(os, 'geteuid') and info.st_uid != os.geteuid()) or info.st_mode & 0o077:
+        raise PermissionError(f"Refusing to use {path}: it must be a directory owned by this user with mode 0700.")
+    return path
@@ -0,0 +1,57 @@
+# course_detail.py
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='course-detail')
+
+
+def _submit(fn, *args):
+    # Each task runs in a copy of the caller's context so per-request state (the RPC profile) follows it.
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _stream(query):
+    return [{'id': doc.id, **doc.to_dict()} for doc in query.stream()]
+
+
+def _stream_replies(db, skill_id):
+    """All replies of a course in one collection-group query, tagged with their parent post id."""
+    query = db.collection_group('replies').where(filter=firestore.FieldFilter('skill_id', '==', skill_id))
+    return [{'id': doc.id, **doc.to_dict(), 'post_id': doc.reference.parent.parent.id} for doc in query.stream()]
+
+
+def load_course_detail(db, skill_ref, user_profiles, author_id=None, include_community=False, lessons=None):
+    """Fetches everything skill_detail_page renders, running independent queries concurrently.
+
+    Lessons, author profile, reviews, discussions and replies are requested in parallel;
+    every review/post/reply author is then resolved with one batched profile lookup.
+    Pass the skill's lesson outline as `lessons` to skip streaming the lesson bodies.
+    """
+    lessons_f = _submit(_stream, skill_ref.collection('lessons')) if lessons is None else None
+    author_f = _submit(user_profiles.get, author_id)
+    reviews, discussions = [], []
+
+    if include_community:
+        reviews_f = _submit(_stream, skill_ref.collection('reviews'))
+        posts_f = _submit(_stream, skill_ref.collection('discussions'))
+        replies_f = _submit(_stream_replies, db, skill_ref.id)
+
+        reviews = sorted(reviews_f.result(), key=lambda r: r.get('created_at'), reverse=True)
+
+        replies_by_post = defaultdict(list)
+        for reply in replies_f.result(): replies_by_post[reply['post_id']].append(reply)
+        discussions = sorted((post for post in posts_f.result() if not post.get('deleting')), key=lambda p: p.get('created_at'))
+        for post in discussions: post['replies'] = sorted(replies_by_post.get(post['id'], []), key=lambda r: r.get('created_at'))
+
+        all_entries = reviews + discussions + [reply for post in discussions for reply in post['replies']]
+        profiles = user_profiles.get_many(entry.get('user_id') for entry in all_entries)
+        for entry in all_entries: entry['user_profile'] = profiles.get(entry.get('user_id'))
+
+    return {
+        'lessons': sorted(lessons_f.result() if lessons_f else lessons, key=lambda l: l.get('order') or 0),
+        'author': author_f.result(),
+        'reviews': reviews,
+        'discussions': discussions,
+    }
@@ -0,0 +1,63 @@
+# enrollments.py
+import threading
+from firebase_admin import firestore
+from shared_cache import LocalCache
+
+
+class EnrollmentCache:
+    """Keeps each user's enrolled skill ids as a frozenset behind a TTL/LRU cache.
+
+    The first check for a user loads all of their enrollments with one query; single
+    (`is_enrolled`) and bulk (`enrolled_in`) checks are then answered from memory.
+    `add` is called by the enroll view and drops the user's entry, so the serving process
+    reloads it on the next check. Other worker processes only learn about it when their
+    entry expires, so gates that refuse access pass `confirm=True` to double-check a miss
+    with a document read. With a shared `cache` (see UserProfileLoader) the entry is
+    dropped for every worker, which learn of it within its local TTL.
+    """
+
+    def __init__(self, db, maxsize=4096, ttl=60, cache=None):
+        self.db = db
+        self._cache = cache if cache is not None else LocalCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+    def skill_ids(self, user_id):
+        """Returns the frozenset of skill ids `user_id` is enrolled in."""
+        if not user_id: return frozenset()
+        with self._lock:
+            cached, epoch = self._cache.get(user_id), self._epoch
+        if cached is not None: return cached
+        version = self._cache.version()
+        query = self.db.collection('enrollments').where(filter=firestore.FieldFilter('user_id', '==', user_id)).select(['skill_id'])
+        loaded = frozenset(skill_id for doc in query.stream() if (skill_id := doc.to_dict().get('skill_id')))
+        with self._lock:
+            # A load that raced with add/invalidate (here, or a clear in any worker) may predate the write, so it is served once but not stored.
+            if epoch == self._epoch: self._cache.set(user_id, loaded, version)
+        return loaded
+
+    def is_enrolled(self, user_id, skill_id, confirm=False):
+        if not user_id or not skill_id: return False
+        if skill_id in self.skill_ids(user_id): return True
+        if not confirm: return False
+        if not self.db.collection('enrollments').document(f'{user_id}_{skill_id}').get().exists: return False
+        self.add(user_id, skill_id)
+        return True
+
+    def enrolled_in(self, user_id, skill_ids):
+        """Returns the subset of `skill_ids` the user is enrolled in, for card grids and lists."""
+        return self.skill_ids(user_id).intersection(skill_ids)
+
+    def add(self, user_id, skill_id):
+        # Dropping the entry rather than extending it keeps a copy another worker is loading from winning over the enrollment.
+        self.invalidate(user_id)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._epoch += 1
+            self._cache.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._cache.clear()
@@ -0,0 +1,47 @@
+# fragment_cache.py
+import threading
+from cachetools import LRUCache
+from shared_cache import LocalCache
+
+
+class FragmentCache:
+    """Caches rendered HTML fragments (card grids) keyed by section.
+
+    Views pass a `render` callable that runs the Firestore queries and renders the
+    fragment; on a hit neither happens. Write paths call `bump()` after changing
+    anything a card shows, which clears the cache and advances `version`, so renders
+    that started before it are not stored. The TTL bounds how long another worker
+    process can keep serving fragments from before a bump; with a shared `cache` (a
+    shared_cache.TieredCache) the bump clears it for every worker on the host within
+    its check interval instead. While the backend is down (a `stale_on` error), the
+    last fragment rendered for a section is served instead.
+    """
+
+    def __init__(self, maxsize=512, ttl=60, cache=None, stale_on=()):
+        self._cache = cache if cache is not None else LocalCache(maxsize=maxsize, ttl=ttl)
+        # Last good render per section, kept through bumps and expiry for renders failing with a `stale_on` error.
+        self._stale, self.stale_on = LRUCache(maxsize=maxsize), stale_on
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._cache.clear()
+
+    def get_or_render(self, section, render):
+        with self._lock:
+            version = self.version
+            cached = self._cache.get(section)
+        if cached is not None: return cached
+        shared_version = self._cache.version()
+        try: value = render()
+        except self.stale_on:
+            with self._lock: stale = self._stale.get(section)
+            if stale is None: raise
+            return stale
+        with self._lock:
+            self._stale[section] = value
+            # A render that raced with a bump (here, or in any worker) may contain pre-bump data, so it is served once but not stored.
+            if version == self.version: self._cache.set(section, value, shared_version)
+        return value
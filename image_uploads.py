@@ -0,0 +1,232 @@
+# image_uploads.py
+import json
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import traceback
+import uuid
+import cloudinary.uploader
+from cachetools import TTLCache
+from firebase_admin import firestore
+
+
+def get_public_id_from_url(url):
+    try:
+        parts = url.split("/"); filename = parts[-1]; folder = parts[-2]
+        return f"{folder}/{filename.rsplit('.', 1)[0]}"
+    except: return None
+
+
+@firestore.transactional
+def _patch_in_transaction(transaction, doc_ref, field, url):
+    """Writes `url` onto the document unless it is gone or marked `deleting`; returns (patched, the URL it replaced).
+
+    Reading in the transaction means a delete marked meanwhile retries it, so a URL is never
+    written onto a document whose background delete would drop it without destroying the image.
+    """
+    doc = doc_ref.get(transaction=transaction)
+    if not doc.exists or doc.to_dict().get('deleting'): return False, None
+    transaction.update(doc_ref, {field: url})
+    return True, doc.to_dict().get(field)
+
+
+def _process_alive(name):
+    try: os.kill(int(name), 0)
+    except (ValueError, ProcessLookupError): return False
+    except PermissionError: pass
+    return True
+
+
+def _remove(path):
+    try: os.remove(path)
+    except OSError: pass
+
+
+class CloudinaryUploader:
+    def upload(self, path, folder, transformation):
+        return cloudinary.uploader.upload(path, folder=folder, transformation=transformation).get('secure_url')
+
+    def destroy(self, url):
+        if url and 'cloudinary' in url and (public_id := get_public_id_from_url(url)): cloudinary.uploader.destroy(public_id)
+
+
+class LocalUploader:
+    """Stand-in uploader that copies files into a local directory, for development and tests."""
+
+    def __init__(self, directory, base_url='/static/uploads'):
+        self.directory, self.base_url = directory, base_url.rstrip('/')
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, path, folder, transformation):
+        name = f"{folder}_{uuid.uuid4().hex}{os.path.splitext(path)[1]}"
+        shutil.copyfile(path, os.path.join(self.directory, name))
+        return f"{self.base_url}/{name}"
+
+    def destroy(self, url):
+        if url and url.startswith(self.base_url + '/'):
+            try: os.remove(os.path.join(self.directory, url.rsplit('/', 1)[-1]))
+            except FileNotFoundError: pass
+
+
+class ImageUploadQueue:
+    """Moves image uploads off the request thread.
+
+    Views spool the uploaded file to local disk and `enqueue` a job naming the document
+    and field to patch. A small worker pool uploads the file, writes the new URL onto
+    the document, then destroys whichever image the field held before. A failed upload
+    or document update is retried with jittered exponential backoff, without uploading
+    again once the image is up; a job that runs out of attempts destroys its image.
+
+    Job status is kept for an hour in `status_cache` (e.g. a shared_cache tier, so any
+    worker can answer a poll); without one it lives in this process only, and a poll
+    that reaches another worker gets no job. A user's job list is read-modify-written,
+    so it can miss a job enqueued at the same moment from another worker.
+
+    Each process spools into its own subdirectory, with a JSON file per job describing it.
+    recover(), run at worker start-up, re-enqueues the jobs of processes that are no longer
+    running (a restart drops the in-memory queue) and removes spool files no job describes.
+    """
+
+    PUBLIC_FIELDS = ('id', 'status', 'attempts', 'error', 'url', 'user_id', 'collection', 'doc_id')
+    SPOOLED_FIELDS = ('id', 'path', 'folder', 'transformation', 'collection', 'doc_id', 'field', 'user_id', 'uploaded')
+
+    def __init__(self, db, uploader, spool_dir=None, workers=2, max_attempts=4, backoff=1.0, on_complete=None, status_cache=None):
+        self.db, self.uploader, self.on_complete = db, uploader, on_complete
+        self.spool_dir = spool_dir or os.path.join(tempfile.gettempdir(), 'nissahub_uploads')
+        self.workers, self.max_attempts, self.backoff = workers, max_attempts, backoff
+        self._queue, self._jobs, self._lock = queue.Queue(), TTLCache(maxsize=10000, ttl=3600), threading.Lock()
+        self._status, self._started = status_cache, False
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def _ensure_workers(self):
+        # Workers start on first use so they are created in the process that serves requests.
+        with self._lock:
+            if self._started: return
+            for i in range(self.workers): threading.Thread(target=self._work, name=f'image-upload-{i}', daemon=True).start()
+            self._started = True
+
+    def _process_spool_dir(self):
+        # Named after the pid, so recover() can tell a live process's jobs from abandoned ones.
+        path = os.path.join(self.spool_dir, str(os.getpid()))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def enqueue(self, file_storage, folder, transformation, collection, doc_id, field, user_id=None):
+        """Spools an uploaded werkzeug FileStorage and schedules it; returns the job id."""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self._process_spool_dir(), f"{job_id}{os.path.splitext(file_storage.filename or '')[1].lower()}")
+        file_storage.save(path)
+        job = {'id': job_id, 'path': path, 'folder': folder, 'transformation': transformation, 'collection': collection, 'doc_id': doc_id, 'field': field,
+               'user_id': user_id, 'uploaded': None}
+        self._submit(job)
+        if self._status is not None: self._status[('user', user_id)] = (*(self._status.get(('user', user_id)) or ()), job_id)[-100:]
+        return job_id
+
+    def _submit(self, job):
+        job.update(status='queued', attempts=0, error=None, url=None)
+        self._spool(job)
+        with self._lock: self._jobs[job['id']] = job
+        self._publish(job)
+        self._ensure_workers()
+        self._queue.put(job['id'])
+
+    @staticmethod
+    def _description_path(job):
+        return os.path.join(os.path.dirname(job['path']), f"{job['id']}.json")
+
+    def _spool(self, job):
+        with self._lock: description = {key: job[key] for key in self.SPOOLED_FIELDS}
+        with open(self._description_path(job), 'w') as f: json.dump(description, f)
+
+    def recover(self):
+        """Re-enqueues jobs spooled by processes that are no longer running and removes stray spool files; returns how many jobs."""
+        mine, recovered = self._process_spool_dir(), 0
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if not os.path.isdir(path): _remove(path); continue
+            if name == str(os.getpid()) or _process_alive(name): continue
+            # Claiming the directory with a rename means only one recovering worker gets each job.
+            claimed = os.path.join(mine, f'recovering-{name}')
+            try: os.rename(path, claimed)
+            except OSError: continue
+            for entry in os.listdir(claimed):
+                if not entry.endswith('.json'): continue
+                try:
+                    with open(os.path.join(claimed, entry)) as f: job = json.load(f)
+                    target = os.path.join(mine, os.path.basename(job['path']))
+                    os.replace(os.path.join(claimed, os.path.basename(job['path'])), target)
+                except (OSError, ValueError, KeyError): traceback.print_exc(); continue
+                self._submit({**job, 'path': target}); recovered += 1
+            shutil.rmtree(claimed, ignore_errors=True)
+        return recovered
+
+    def _publish(self, job):
+        if self._status is not None:
+            with self._lock: public = {key: job[key] for key in self.PUBLIC_FIELDS}
+            self._status[job['id']] = public
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job: return {key: job[key] for key in self.PUBLIC_FIELDS}
+        return self._status.get(job_id) if self._status is not None else None
+
+    def jobs_for_user(self, user_id):
+        with self._lock: jobs = {job['id']: {key: job[key] for key in self.PUBLIC_FIELDS} for job in self._jobs.values() if job['user_id'] == user_id}
+        for job_id in (self._status.get(('user', user_id)) or ()) if self._status is not None else ():
+            if job_id not in jobs and (job := self._status.get(job_id)): jobs[job_id] = job
+        return list(jobs.values())
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock: job = self._jobs.get(job_id)
+            if job:
+                try: self._process(job)
+                except Exception: traceback.print_exc()
+            self._queue.task_done()
+
+    def _set(self, job, **changes):
+        with self._lock: job.update(changes)
+        self._publish(job)
+
+    def _destroy(self, url):
+        try: self.uploader.destroy(url)
+        except Exception: traceback.print_exc()
+
+    def _process(self, job):
+        self._set(job, status='uploading', attempts=job['attempts'] + 1)
+        try:
+            # A retry after the upload went through only redoes the document update.
+            if not job['uploaded']: self._set(job, uploaded=self.uploader.upload(job['path'], job['folder'], job['transformation'])); self._spool(job)
+            url = job['uploaded']
+            patched, previous_url = _patch_in_transaction(self.db.transaction(), self.db.collection(job['collection']).document(job['doc_id']), job['field'], url)
+            if not patched:
+                self._destroy(url)
+                return self._finish(job, 'failed', error='Document was deleted before the upload finished.')
+        except Exception as e:
+            if job['attempts'] >= self.max_attempts:
+                if job['uploaded']: self._destroy(job['uploaded'])
+                return self._finish(job, 'failed', error=str(e))
+            delay = self.backoff * 2 ** (job['attempts'] - 1) * random.uniform(0.5, 1.5)
+            self._set(job, status='retrying', error=str(e))
+            timer = threading.Timer(delay, self._queue.put, args=(job['id'],))
+            timer.daemon = True
+            timer.start()
+            return
+        if previous_url and previous_url != url:
+            try: self.uploader.destroy(previous_url)
+            except Exception: traceback.print_exc()
+        self._finish(job, 'done', url=url, error=None)
+        if self.on_complete: self.on_complete(job)
+
+    def _finish(self, job, status, **changes):
+        self._set(job, status=status, **changes)
+        _remove(job['path']); _remove(self._description_path(job))
+
+    def join(self):
+        """Blocks until every queued job has been processed once (retries may still be scheduled)."""
+        self._queue.join()
@@ -0,0 +1,76 @@
+# images.py
+import threading
+from cachetools import LRUCache, cached
+from markupsafe import Markup
+
+# Appended to every variant: Cloudinary picks the format (AVIF/WebP/JPEG) and quality per browser.
+DELIVERY = 'f_auto,q_auto'
+# A ~1 KB blurred preview painted behind the image until it loads.
+PLACEHOLDER_TRANSFORMATION = 'w_32,e_blur:1000,q_1,f_auto'
+SKILL_PLACEHOLDER, AVATAR_PLACEHOLDER = 'img/skill_placeholder_default.jpg', 'img/avatar_placeholder.png'
+
+# width: the variant used as plain src; widths: the srcset candidates; ratio: height / width
+# (None keeps the original aspect); sizes: the rendered width, matching the SCSS layout.
+PRESETS = {
+    # .card-grid: one column, two from 768px, three (~380px each) from 1024px.
+    'card': {'width': 400, 'widths': (400, 600, 800, 1200), 'ratio': 3 / 4, 'crop': 'c_fill,g_auto',
+             'sizes': '(min-width: 1024px) 380px, (min-width: 768px) 50vw, 100vw', 'fallback': SKILL_PLACEHOLDER},
+    # Skill and product pages crop in CSS, so the original aspect is kept and only the width is limited.
+    'detail': {'width': 960, 'widths': (640, 960, 1280, 1920), 'ratio': None, 'crop': 'c_limit',
+               'sizes': '(min-width: 1200px) 720px, 100vw', 'fallback': SKILL_PLACEHOLDER},
+    'avatar': {'width': 96, 'widths': (48, 96, 160, 320), 'ratio': 1, 'crop': 'c_fill,g_face',
+               'sizes': '48px', 'fallback': AVATAR_PLACEHOLDER},
+    'thumb': {'width': 200, 'widths': (200, 400), 'ratio': 3 / 4, 'crop': 'c_fill,g_auto',
+              'sizes': '200px', 'fallback': SKILL_PLACEHOLDER},
+}
+
+
+def is_cloudinary(url):
+    return bool(url) and 'res.cloudinary.com' in url and '/upload/' in url
+
+
+class ImageUrls:
+    """Responsive Cloudinary URLs (src, srcset, blur-up placeholder) for the named presets.
+
+    The transformed URLs for each (url, preset) pair are built once and kept in a
+    bounded LRU cache, so re-rendering a grid does no string work. Other absolute URLs
+    (local uploads) are served untransformed; a missing image or a stored static path
+    resolves to the preset's static fallback through static_url.
+    """
+
+    def __init__(self, static_url, maxsize=4096, presets=PRESETS):
+        self.static_url, self.presets = static_url, presets
+        self._variants = cached(LRUCache(maxsize=maxsize), lock=threading.Lock())(self._build_variants)
+
+    def _build_variants(self, url, preset_name):
+        """Returns (src, srcset, placeholder) for a Cloudinary URL."""
+        preset = self.presets[preset_name]
+        head, tail = url.split('/upload/', 1)
+        def variant(transformation): return f"{head}/upload/{transformation}/{tail}"
+        def sized(width):
+            height = f",h_{round(width * preset['ratio'])}" if preset['ratio'] else ''
+            return variant(f"w_{width}{height},{preset['crop']},{DELIVERY}")
+        srcset = ', '.join(f"{sized(width)} {width}w" for width in preset['widths'])
+        return sized(preset['width']), srcset, variant(PLACEHOLDER_TRANSFORMATION)
+
+    def _resolve(self, url, preset_name):
+        if is_cloudinary(url): return self._variants(url, preset_name)
+        if url and url.startswith(('/', 'http://', 'https://')): return url, None, None
+        return self.static_url(self.presets[preset_name]['fallback']), None, None
+
+    def src(self, url, preset='card'):
+        return self._resolve(url, preset)[0]
+
+    def srcset(self, url, preset='card'):
+        return self._resolve(url, preset)[1]
+
+    def placeholder(self, url, preset='card'):
+        return self._resolve(url, preset)[2]
+
+    def img(self, url, preset='card', alt='', class_=None, sizes=None, loading='lazy', **attrs):
+        """Renders an <img> with srcset/sizes and the blurred placeholder as its background."""
+        src, srcset, placeholder = self._resolve(url, preset)
+        attributes = {'src': src, 'srcset': srcset, 'sizes': (sizes or self.presets[preset]['sizes']) if srcset else None, 'alt': alt,
+                      'class': class_, 'loading': loading, 'decoding': 'async', **attrs}
+        if placeholder: attributes['style'] = f"background: url('{placeholder}') center / cover no-repeat;" + (f" {attrs['style']}" if attrs.get('style') else '')
+        return Markup('<img {}>').format(Markup(' ').join(Markup('{}="{}"').format(name, value) for name, value in attributes.items() if value is not None))
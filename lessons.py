@@ -0,0 +1,82 @@
+# lessons.py
+from firebase_admin import firestore
+
+OUTLINE_FIELDS = ('title', 'lesson_type', 'order')
+
+
+def outline_entry(lesson_id, lesson_data):
+    return {'id': lesson_id, **{field: lesson_data.get(field) for field in OUTLINE_FIELDS}}
+
+
+def _sorted(outline):
+    return sorted(outline, key=lambda entry: entry.get('order') or 0)
+
+
+def read_outline(skill_ref, transaction=None):
+    """Builds a skill's outline from its lessons, reading only the outline fields."""
+    return _sorted(outline_entry(doc.id, doc.to_dict()) for doc in skill_ref.collection('lessons').select(list(OUTLINE_FIELDS)).stream(transaction=transaction))
+
+
+@firestore.transactional
+def backfill_outline_in_transaction(transaction, skill_ref):
+    """Stores the outline of a skill written before outlines existed; returns False if it already has one.
+
+    The lessons are read in the transaction, so a lesson added meanwhile retries it
+    rather than being left out, and nothing is written once an outline is present.
+    """
+    if (skill_ref.get(transaction=transaction).to_dict() or {}).get('lesson_outline') is not None: return False
+    transaction.update(skill_ref, {'lesson_outline': read_outline(skill_ref, transaction=transaction)})
+    return True
+
+
+def get_outline(skill_ref, skill_data):
+    """Returns the skill's lesson outline (id, title, lesson_type, order) sorted by order.
+
+    The outline lives on the skill document and is kept in sync by the transactional
+    helpers below, so the course player never streams lesson bodies. Skills written
+    before the outline existed have it read from their lessons until
+    `flask backfill-lesson-outlines` stores it.
+    """
+    outline = skill_data.get('lesson_outline')
+    return _sorted(outline) if outline is not None else read_outline(skill_ref)
+
+
+def _outline_update(transaction, skill_ref, change, **fields):
+    # Legacy skills without an outline are left alone; backfill_outline_in_transaction builds it from scratch.
+    outline = (skill_ref.get(transaction=transaction).to_dict() or {}).get('lesson_outline')
+    if outline is not None: fields['lesson_outline'] = _sorted(change(list(outline)))
+    if fields: transaction.update(skill_ref, fields)
+
+
+@firestore.transactional
+def add_lesson_in_transaction(transaction, skill_ref, lesson_ref, lesson_data):
+    def change(outline): return outline + [outline_entry(lesson_ref.id, lesson_data)]
+    _outline_update(transaction, skill_ref, change, lesson_count=firestore.Increment(1))
+    transaction.set(lesson_ref, lesson_data)
+
+
+@firestore.transactional
+def update_lesson_in_transaction(transaction, skill_ref, lesson_ref, lesson_data):
+    def change(outline): return [outline_entry(lesson_ref.id, {**entry, **lesson_data}) if entry['id'] == lesson_ref.id else entry for entry in outline]
+    _outline_update(transaction, skill_ref, change)
+    transaction.update(lesson_ref, lesson_data)
+
+
+@firestore.transactional
+def delete_lesson_in_transaction(transaction, skill_ref, lesson_ref):
+    skill_doc, lesson_doc = skill_ref.get(transaction=transaction), lesson_ref.get(transaction=transaction)
+    if not lesson_doc.exists: return
+    outline = (skill_doc.to_dict() or {}).get('lesson_outline')
+    fields = {'lesson_count': firestore.Increment(-1)}
+    if outline is not None: fields['lesson_outline'] = [entry for entry in outline if entry['id'] != lesson_ref.id]
+    transaction.delete(lesson_ref)
+    transaction.update(skill_ref, fields)
+
+
+@firestore.transactional
+def swap_lesson_order_in_transaction(transaction, skill_ref, lesson_ref, other_ref, lesson_order, other_order):
+    orders = {lesson_ref.id: other_order, other_ref.id: lesson_order}
+    def change(outline): return [{**entry, 'order': orders[entry['id']]} if entry['id'] in orders else entry for entry in outline]
+    _outline_update(transaction, skill_ref, change)
+    transaction.update(lesson_ref, {'order': other_order})
+    transaction.update(other_ref, {'order': lesson_order})
@@ -0,0 +1,701 @@
+# memory_firestore.py
+import datetime
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, namedtuple
+from google.api_core import exceptions as google_exceptions
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore_v1 import ReadAfterWriteError, transforms
+from google.cloud.firestore_v1._helpers import GeoPoint
+from google.cloud.firestore_v1.base_query import And, Or
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+MAX_BATCH_WRITES = 500
+ASCENDING, DESCENDING = 'ASCENDING', 'DESCENDING'
+DOCUMENT_ID = '__name__'
+INEQUALITY_OPERATORS = ('<', '<=', '>', '>=', '!=', 'not-in')
+_UTC = datetime.timezone.utc
+_Reference = namedtuple('_Reference', 'path')
+WriteResult = namedtuple('WriteResult', 'update_time')
+AggregationResult = namedtuple('AggregationResult', 'alias value read_time')
+
+
+def _timestamp(value):
+    value = value.replace(tzinfo=_UTC) if value.tzinfo is None else value.astimezone(_UTC)
+    return DatetimeWithNanoseconds(value.year, value.month, value.day, value.hour, value.minute, value.second, value.microsecond, tzinfo=_UTC)
+
+
+def _encode(value):
+    """Copies a value the way the wire would: tuples become arrays, datetimes UTC timestamps, references paths."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes, GeoPoint, _Reference)): return value
+    if isinstance(value, datetime.datetime): return _timestamp(value)
+    if isinstance(value, dict): return {str(key): _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)): return [_encode(item) for item in value]
+    if isinstance(value, DocumentReference): return _Reference(value.path)
+    if isinstance(value, (transforms.Sentinel, transforms.Increment, transforms.Maximum, transforms.Minimum, transforms.ArrayUnion, transforms.ArrayRemove)):
+        raise ValueError(f"{value!r} is only allowed as a field value, not inside an array")
+    raise TypeError(f"Cannot convert to a Firestore Value: {value!r}")
+
+
+def _copy(value):
+    """A copy of stored data that a write can change in place; scalars are immutable and shared."""
+    if isinstance(value, dict): return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list): return [_copy(item) for item in value]
+    return value
+
+
+def _decode(client, value):
+    """A fresh copy of a stored value, as each to_dict() of a real snapshot decodes one."""
+    if isinstance(value, dict): return {key: _decode(client, item) for key, item in value.items()}
+    if isinstance(value, list): return [_decode(client, item) for item in value]
+    if isinstance(value, _Reference): return DocumentReference(client, value.path)
+    return value
+
+
+def _key(value):
+    """Sort key following Firestore's cross-type value ordering; equal keys mean equal values (so 1 == 1.0)."""
+    if value is None: return (0,)
+    if isinstance(value, bool): return (1, value)
+    if isinstance(value, (int, float)): return (2, value if value == value else float('-inf'))
+    if isinstance(value, datetime.datetime): return (3, value)
+    if isinstance(value, str): return (4, value)
+    if isinstance(value, bytes): return (5, value)
+    if isinstance(value, _Reference): return (6, tuple(value.path.split('/')))
+    if isinstance(value, GeoPoint): return (7, value.latitude, value.longitude)
+    if isinstance(value, list): return (9, tuple(_key(item) for item in value))
+    return (10, tuple((name, _key(item)) for name, item in sorted(value.items())))
+
+
+def _parts(field_path):
+    return DOCUMENT_ID if field_path == DOCUMENT_ID else tuple(field_path.split('.'))
+
+
+def _lookup(data, parts):
+    for part in parts:
+        if not isinstance(data, dict) or part not in data: return False, None
+        data = data[part]
+    return True, data
+
+
+def _assign(data, parts, value):
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict): data[part] = {}
+        data = data[part]
+    data[parts[-1]] = value
+
+
+def _remove(data, parts):
+    found, parent = _lookup(data, parts[:-1])
+    if found and isinstance(parent, dict): parent.pop(parts[-1], None)
+
+
+def _leaves(data, prefix=()):
+    """(path, value) for every leaf of a set() payload; non-empty maps are descended into, so merge=True merges them."""
+    for key, value in data.items():
+        path = prefix + (key,)
+        if isinstance(value, dict) and value: yield from _leaves(value, path)
+        else: yield path, value
+
+
+def _resolve(old, value, now):
+    """Applies a transform (server timestamp, increment, array union...) to the field's current value."""
+    if value is transforms.SERVER_TIMESTAMP: return now
+    numeric = isinstance(old, (int, float)) and not isinstance(old, bool)
+    if isinstance(value, transforms.Increment): return (old if numeric else 0) + value.value
+    if isinstance(value, transforms.Maximum): return max(old, value.value) if numeric else value.value
+    if isinstance(value, transforms.Minimum): return min(old, value.value) if numeric else value.value
+    if isinstance(value, (transforms.ArrayUnion, transforms.ArrayRemove)):
+        items, values = list(old) if isinstance(old, list) else [], [_encode(item) for item in value.values]
+        if isinstance(value, transforms.ArrayRemove): return [item for item in items if _key(item) not in {_key(v) for v in values}]
+        for item in values:
+            if _key(item) not in {_key(existing) for existing in items}: items.append(item)
+        return items
+    if isinstance(value, dict): return {key: _resolve(old.get(key) if isinstance(old, dict) else None, item, now) for key, item in value.items() if item is not transforms.DELETE_FIELD}
+    return _encode(value)
+
+
+def _compare(a, b):
+    a, b = _key(a), _key(b)
+    return (a > b) - (a < b)
+
+
+class _Document:
+    __slots__ = ('data', 'create_time', 'update_time')
+
+    def __init__(self, data, create_time, update_time): self.data, self.create_time, self.update_time = data, create_time, update_time
+
+
+class _Collection:
+    """One collection's documents by id, with equality indexes built on first use and kept up to date by writes."""
+
+    def __init__(self): self.documents, self.indexes = {}, {}
+
+    def candidates(self, filters):
+        """Document ids that can match: the smallest equality index hit among top-level `==` filters, else every id."""
+        best = None
+        for parts, op, value in filters:
+            if op != '==' or parts == DOCUMENT_ID or len(parts) != 1: continue
+            if parts[0] not in self.indexes: self.indexes[parts[0]] = self._index(parts[0])
+            ids = self.indexes[parts[0]].get(_key(value), ())
+            if best is None or len(ids) < len(best): best = ids
+        return self.documents.keys() if best is None else list(best)
+
+    def _index(self, field):
+        index = {}
+        for doc_id, document in self.documents.items():
+            if field in document.data: index.setdefault(_key(document.data[field]), set()).add(doc_id)
+        return index
+
+    def put(self, doc_id, document):
+        old = self.documents.get(doc_id)
+        for field, index in self.indexes.items():
+            if old is not None and field in old.data: index.get(_key(old.data[field]), set()).discard(doc_id)
+            if document is not None and field in document.data: index.setdefault(_key(document.data[field]), set()).add(doc_id)
+        if document is None: self.documents.pop(doc_id, None)
+        else: self.documents[doc_id] = document
+
+
+class DocumentSnapshot:
+    """A document as read: `to_dict()` returns a fresh copy each call, `get()` raises KeyError for a missing field."""
+
+    def __init__(self, reference, document, read_time):
+        self.reference, self.read_time, self.exists = reference, read_time, document is not None
+        self._data = document.data if document is not None else None
+        self.create_time, self.update_time = (document.create_time, document.update_time) if document is not None else (None, None)
+
+    def _select(self, projection):
+        """The snapshot with only the given field paths, as select() or field_paths return it."""
+        if projection is None or not self.exists: return self
+        data = {}
+        for parts in projection:
+            found, value = _lookup(self._data, parts) if parts != DOCUMENT_ID else (False, None)
+            if found: _assign(data, parts, value)
+        snapshot = DocumentSnapshot.__new__(DocumentSnapshot)
+        snapshot.__dict__.update(self.__dict__, _data=data)
+        return snapshot
+
+    @property
+    def id(self): return self.reference.id
+
+    def to_dict(self):
+        return _decode(self.reference._client, self._data) if self.exists else None
+
+    def get(self, field_path):
+        if not self.exists: return None
+        found, value = _lookup(self._data, _parts(field_path))
+        if not found: raise KeyError(f"'{field_path}' is not contained in the data")
+        return _decode(self.reference._client, value)
+
+    def _value(self, parts):
+        return (True, _Reference(self.reference.path)) if parts == DOCUMENT_ID else _lookup(self._data, parts)
+
+
+class DocumentReference:
+
+    def __init__(self, client, path):
+        self._client, self.path = client, path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self): return CollectionReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def collection(self, collection_id): return CollectionReference(self._client, f'{self.path}/{collection_id}')
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        return next(iter(self._client.get_all([self], field_paths=field_paths, transaction=transaction)))
+
+    def create(self, document_data, retry=None, timeout=None): return self._client._write([('create', self.path, document_data, None)])[0]
+    def set(self, document_data, merge=False, retry=None, timeout=None): return self._client._write([('set', self.path, document_data, merge)])[0]
+    def update(self, field_updates, option=None, retry=None, timeout=None): return self._client._write([('update', self.path, field_updates, None)])[0]
+
+    def delete(self, option=None, retry=None, timeout=None):
+        return self._client._write([('delete', self.path, None, None)])[0].update_time
+
+    def collections(self, page_size=None, retry=None, timeout=None):
+        return [self.collection(collection_id) for collection_id in self._client._collection_ids(self.path)]
+
+    def on_snapshot(self, callback):
+        return self.parent.where(DOCUMENT_ID, '==', self).on_snapshot(callback)
+
+    def __eq__(self, other): return isinstance(other, DocumentReference) and other._client is self._client and other.path == self.path
+    def __hash__(self): return hash(self.path)
+    def __repr__(self): return f'<DocumentReference {self.path}>'
+
+
+class Query:
+    """An immutable query; each builder method returns a new one, as in google.cloud.firestore."""
+
+    def __init__(self, client, parent, collection_id, all_descendants=False):
+        self._client, self._parent, self._collection_id, self._all_descendants = client, parent, collection_id, all_descendants
+        self._filters, self._orders, self._projection = (), (), None
+        self._limit, self._limit_to_last, self._offset, self._start, self._end = None, False, 0, None, None
+
+    def _copy(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update({name: value for name, value in self.__dict__.items() if name.startswith('_')}, **changes)
+        return query
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        condition = self._filter(filter) if filter is not None else self._filter_args(field_path, op_string, value)
+        return self._copy(_filters=self._filters + (condition,))
+
+    def _filter(self, condition):
+        if isinstance(condition, (And, Or)): return ('or' if isinstance(condition, Or) else 'and', tuple(self._filter(item) for item in condition.filters))
+        return self._filter_args(condition.field_path, condition.op_string, condition.value)
+
+    @staticmethod
+    def _filter_args(field_path, op_string, value):
+        if op_string in ('in', 'not-in', 'array_contains_any'): value = [_encode(item) for item in value]
+        return (_parts(field_path), op_string, _encode(value))
+
+    def order_by(self, field_path, direction=ASCENDING): return self._copy(_orders=self._orders + ((_parts(field_path), direction),))
+    def limit(self, count): return self._copy(_limit=count, _limit_to_last=False)
+    def limit_to_last(self, count): return self._copy(_limit=count, _limit_to_last=True)
+    def offset(self, num_to_skip): return self._copy(_offset=num_to_skip)
+    def select(self, field_paths): return self._copy(_projection=tuple(_parts(field_path) for field_path in field_paths))
+    def start_at(self, document_fields_or_snapshot): return self._copy(_start=(document_fields_or_snapshot, True))
+    def start_after(self, document_fields_or_snapshot): return self._copy(_start=(document_fields_or_snapshot, False))
+    def end_at(self, document_fields_or_snapshot): return self._copy(_end=(document_fields_or_snapshot, True))
+    def end_before(self, document_fields_or_snapshot): return self._copy(_end=(document_fields_or_snapshot, False))
+
+    def count(self, alias=None): return AggregationQuery(self).count(alias)
+    def sum(self, field_ref, alias=None): return AggregationQuery(self).sum(field_ref, alias)
+    def avg(self, field_ref, alias=None): return AggregationQuery(self).avg(field_ref, alias)
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        return iter(self._client._query(self, transaction))
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        return self._client._listen(self, callback)
+
+    def _covers(self, collection_path):
+        parent, _, collection_id = collection_path.rpartition('/')
+        if collection_id != self._collection_id: return False
+        return parent.startswith(self._parent + '/') or parent == self._parent or not self._parent if self._all_descendants else parent == self._parent
+
+    def _orders_normalized(self):
+        """Explicit orders, then inequality fields not yet ordered, then the document name, as the backend orders results."""
+        orders = list(self._orders)
+        if not orders:
+            for parts, op, _ in self._flat_filters():
+                if op in INEQUALITY_OPERATORS and parts not in [field for field, _ in orders]: orders.append((parts, ASCENDING))
+        if DOCUMENT_ID not in [field for field, _ in orders]: orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _flat_filters(self, filters=None):
+        for condition in self._filters if filters is None else filters:
+            if condition[0] in ('and', 'or'): yield from self._flat_filters(condition[1])
+            else: yield condition
+
+    def _matches(self, snapshot, filters=None, any_of=False):
+        results = (self._matches(snapshot, condition[1], condition[0] == 'or') if condition[0] in ('and', 'or') else self._test(snapshot, *condition)
+                   for condition in (self._filters if filters is None else filters))
+        return any(results) if any_of else all(results)
+
+    @staticmethod
+    def _test(snapshot, parts, op, value):
+        found, field = snapshot._value(parts)
+        if not found: return False
+        if op == '==': return _key(field) == _key(value)
+        if op == 'in': return _key(field) in {_key(item) for item in value}
+        if op == 'array_contains': return isinstance(field, list) and _key(value) in {_key(item) for item in field}
+        if op == 'array_contains_any': return isinstance(field, list) and bool({_key(item) for item in field} & {_key(item) for item in value})
+        if field is None: return False
+        if op == '!=': return _key(field) != _key(value)
+        if op == 'not-in': return _key(field) not in {_key(item) for item in value}
+        a, b = _key(field), _key(value)
+        if a[0] != b[0]: return False
+        return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[op]
+
+    def _cursor(self, cursor, orders):
+        """Cursor values, one per order: taken from a snapshot or a dict of fields, or given as a list."""
+        if isinstance(cursor, DocumentSnapshot): return [cursor._value(parts)[1] for parts, _ in orders]
+        # Like the client, a dict gives values for the leading orders it has keys for, the document id under '__name__'.
+        if isinstance(cursor, dict): cursor = [cursor.get(DOCUMENT_ID) if parts == DOCUMENT_ID else _lookup(cursor, parts)[1] for parts, _ in orders[:len(cursor)]]
+        values = [_encode(value) for value in cursor]
+        for i, (parts, _) in enumerate(orders[:len(values)]):
+            if parts == DOCUMENT_ID and isinstance(values[i], str): values[i] = _Reference(values[i] if '/' in values[i] else f'{self._parent}/{self._collection_id}/{values[i]}'.lstrip('/'))
+        return values
+
+    @staticmethod
+    def _position(snapshot, cursor, orders):
+        """Compares a document with a cursor over the cursor's length: <0 before it, 0 at it, >0 after it."""
+        for value, (parts, direction) in zip(cursor, orders):
+            order = _compare(snapshot._value(parts)[1], value)
+            if order: return -order if direction == DESCENDING else order
+        return 0
+
+    def _arrange(self, snapshots):
+        """Orders, cuts at the cursors and applies offset/limit to matching snapshots."""
+        orders = self._orders_normalized()
+        snapshots = [snapshot for snapshot in snapshots if all(snapshot._value(parts)[0] for parts, _ in orders)]
+        for parts, direction in reversed(orders): snapshots.sort(key=lambda snapshot: _key(snapshot._value(parts)[1]), reverse=direction == DESCENDING)
+        if self._start:
+            cursor, inclusive = self._cursor(self._start[0], orders), self._start[1]
+            snapshots = [snapshot for snapshot in snapshots if (position := self._position(snapshot, cursor, orders)) > 0 or (inclusive and position == 0)]
+        if self._end:
+            cursor, inclusive = self._cursor(self._end[0], orders), self._end[1]
+            snapshots = [snapshot for snapshot in snapshots if (position := self._position(snapshot, cursor, orders)) < 0 or (inclusive and position == 0)]
+        snapshots = snapshots[self._offset:]
+        if self._limit is not None: snapshots = snapshots[-self._limit:] if self._limit_to_last else snapshots[:self._limit]
+        return snapshots
+
+
+class CollectionReference(Query):
+
+    def __init__(self, client, path):
+        parent, _, collection_id = path.rpartition('/')
+        super().__init__(client, parent, collection_id)
+        self.path, self.id = path, collection_id
+
+    @property
+    def parent(self): return DocumentReference(self._client, self._parent) if self._parent else None
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f'{self.path}/{document_id or uuid.uuid4().hex[:20]}')
+
+    def add(self, document_data, document_id=None, retry=None, timeout=None):
+        reference = self.document(document_id)
+        return reference.create(document_data).update_time, reference
+
+    def list_documents(self, page_size=None, retry=None, timeout=None):
+        """Every document id in the collection, including "missing" ones that only exist as parents of subcollections."""
+        return [self.document(doc_id) for doc_id in self._client._list_documents(self.path)]
+
+
+class AggregationQuery:
+    """count()/sum()/avg() over a query, answered by one run_aggregation_query RPC."""
+
+    def __init__(self, query): self._query, self._aggregations = query, []
+
+    def _add(self, kind, field_ref, alias):
+        self._aggregations.append((kind, _parts(field_ref) if field_ref else None, alias or f'field_{len(self._aggregations) + 1}'))
+        return self
+
+    def count(self, alias=None): return self._add('count', None, alias)
+    def sum(self, field_ref, alias=None): return self._add('sum', field_ref, alias)
+    def avg(self, field_ref, alias=None): return self._add('avg', field_ref, alias)
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        return self._query._client._aggregate(self._query, self._aggregations, transaction)
+
+    def stream(self, transaction=None, retry=None, timeout=None): return iter(self.get(transaction=transaction))
+
+
+class WriteBatch:
+    """Writes applied atomically on commit(); more than MAX_BATCH_WRITES is rejected like the backend does."""
+
+    def __init__(self, client): self._client, self._writes = client, []
+
+    def _add(self, kind, reference, data, option):
+        self._writes.append((kind, reference.path, data, option))
+
+    def create(self, reference, document_data): self._add('create', reference, document_data, None)
+    def set(self, reference, document_data, merge=False): self._add('set', reference, document_data, merge)
+    def update(self, reference, field_updates, option=None): self._add('update', reference, field_updates, None)
+    def delete(self, reference, option=None): self._add('delete', reference, None, None)
+
+    def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        return self._client._write(writes)
+
+    def __len__(self): return len(self._writes)
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None: self.commit()
+
+
+class Transaction(WriteBatch):
+    """Run by @firestore.transactional: holds the store's lock from _begin until _commit or _rollback.
+
+    Serialising transactions this way means none ever aborts, where Firestore would
+    abort and retry the loser of a conflict; reads still have to come before writes.
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts, self._read_only, self._id = max_attempts, read_only, None
+
+    @property
+    def in_progress(self): return self._id is not None
+
+    def _add(self, kind, reference, data, option):
+        if self._read_only: raise ValueError("Cannot perform write operation in read-only transaction.")
+        super()._add(kind, reference, data, option)
+
+    def _check_read(self):
+        if self._writes: raise ReadAfterWriteError("Attempted read after write in a transaction.")
+
+    def _clean_up(self): self._writes, self._id = [], None
+
+    def _begin(self, retry_id=None):
+        if self.in_progress: raise ValueError("The transaction has already begun.")
+        self._client._lock.acquire()
+        self._id = uuid.uuid4().bytes
+        self._client._rpc('begin_transaction', time.perf_counter())
+
+    def _rollback(self):
+        if not self.in_progress: raise ValueError("There is no transaction in progress.")
+        started = time.perf_counter()
+        self._clean_up(); self._client._lock.release()
+        self._client._rpc('rollback', started)
+
+    def _commit(self):
+        if not self.in_progress: raise ValueError("There is no transaction in progress.")
+        # A failed commit keeps the lock: @transactional calls _rollback, which releases it.
+        results = self._client._write(self._writes, locked=True)
+        self._clean_up(); self._client._lock.release()
+        self._client._deliver()
+        return results
+
+    def commit(self, retry=None, timeout=None): raise ValueError("Use @firestore.transactional to run a transaction.")
+
+    def get(self, ref_or_query, retry=None, timeout=None):
+        if isinstance(ref_or_query, DocumentReference): return iter(self._client.get_all([ref_or_query], transaction=self))
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references, retry=None, timeout=None): return self._client.get_all(references, transaction=self)
+
+
+class _Listener:
+    __slots__ = ('query', 'callback', 'snapshots')
+
+    def __init__(self, query, callback): self.query, self.callback, self.snapshots = query, callback, {}
+
+
+class Watch:
+    """Returned by on_snapshot(); unsubscribe() stops further callbacks."""
+
+    def __init__(self, client, listener): self._client, self._listener, self.is_active = client, listener, True
+
+    def unsubscribe(self):
+        self.is_active = False
+        with self._client._lock:
+            if self._listener in self._client._listeners: self._client._listeners.remove(self._listener)
+
+
+class MemoryFirestore:
+    """In-process stand-in for google.cloud.firestore.Client with the same query and write semantics.
+
+    Documents live in per-collection dicts under one lock; values are copied in and out
+    and come back as UTC DatetimeWithNanoseconds, lists and DocumentReferences, as from
+    the wire. Filters follow Firestore's typed comparisons (a range filter only matches
+    values of the same type, documents without an ordered-by field are left out) and
+    results are ordered with the implicit document-name tie-break, so cursors paginate
+    the same way. Writes take SERVER_TIMESTAMP, Increment, Maximum/Minimum, ArrayUnion/
+    ArrayRemove and DELETE_FIELD; update() of a missing document raises NotFound and
+    create() of an existing one AlreadyExists. Snapshot listeners are called from a
+    background thread, as a real watch stream's are.
+
+    Every operation counts as the GAPIC call the real client would make (batch_get_documents,
+    run_query, run_aggregation_query, commit, begin_transaction, rollback, list_documents,
+    list_collection_ids, listen), so counts read like rpc_profiler's. Each then sleeps
+    `latency` seconds (a number, or a dict by method with a 'default'), scaled by up to
+    ±`jitter` and plus `per_document` for each document returned, outside the lock; a
+    'listen' entry also delays each snapshot delivery. `on_rpc(method, started, docs)` is
+    called after each one, e.g. to feed rpc_profiler.
+    """
+
+    def __init__(self, project='memory', latency=0.0, jitter=0.0, per_document=0.0, on_rpc=None, seed=None):
+        self.project, self.latency, self.jitter, self.per_document, self.on_rpc = project, latency, jitter, per_document, on_rpc
+        self._lock, self._stats_lock = threading.RLock(), threading.Lock()
+        self._collections, self._listeners, self._pending = {}, [], []
+        self._rng, self._last_write = random.Random(seed), None
+        self._events, self._delivery, self._delivery_pid = queue.Queue(), None, None
+        self.reset_counters()
+
+    # --- references ---
+
+    def collection(self, *collection_path): return CollectionReference(self, '/'.join(collection_path))
+    def document(self, *document_path): return DocumentReference(self, '/'.join(document_path))
+    def collection_group(self, collection_id): return Query(self, '', collection_id, all_descendants=True)
+    def collections(self, retry=None, timeout=None): return [self.collection(collection_id) for collection_id in self._collection_ids('')]
+    def batch(self): return WriteBatch(self)
+    def transaction(self, max_attempts=5, read_only=False): return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    # --- accounting ---
+
+    def reset_counters(self):
+        with self._stats_lock: self.rpcs, self.documents_read = Counter(), 0
+
+    def stats(self):
+        with self._stats_lock: counts, documents_read = dict(self.rpcs), self.documents_read
+        with self._lock: stored = sum(len(collection.documents) for collection in self._collections.values())
+        return {'rpcs': counts, 'calls': sum(counts.values()), 'documents_read': documents_read, 'documents': stored}
+
+    def _rpc(self, method, started, docs=0):
+        with self._stats_lock: self.rpcs[method] += 1; self.documents_read += docs
+        latency = self.latency.get(method, self.latency.get('default', 0.0)) if isinstance(self.latency, dict) else self.latency
+        delay = latency * (1 + self.jitter * (2 * self._rng.random() - 1)) + self.per_document * docs
+        if delay > 0: time.sleep(delay)
+        if self.on_rpc:
+            try: self.on_rpc(method, started, docs)
+            except Exception: traceback.print_exc()
+
+    # --- reads ---
+
+    def _now(self):
+        """A commit timestamp, strictly after the previous one, like the backend's."""
+        now = datetime.datetime.now(tz=_UTC)
+        if self._last_write is not None and now <= self._last_write: now = self._last_write + datetime.timedelta(microseconds=1)
+        self._last_write = now
+        return _timestamp(now)
+
+    def _document(self, path):
+        collection_path, _, doc_id = path.rpartition('/')
+        collection = self._collections.get(collection_path)
+        return collection.documents.get(doc_id) if collection else None
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        started, projection = time.perf_counter(), [_parts(field_path) for field_path in field_paths] if field_paths is not None else None
+        if transaction is not None: transaction._check_read()
+        references = list({reference.path: reference for reference in references}.values())
+        with self._lock:
+            read_time = datetime.datetime.now(tz=_UTC)
+            snapshots = [DocumentSnapshot(reference, self._document(reference.path), read_time)._select(projection) for reference in references]
+        self._rpc('batch_get_documents', started, sum(snapshot.exists for snapshot in snapshots))
+        return iter(snapshots)
+
+    def _select(self, query):
+        """Matching snapshots in final order; call with the lock held."""
+        read_time, snapshots = datetime.datetime.now(tz=_UTC), []
+        filters = [condition for condition in query._filters if condition[0] not in ('and', 'or')]
+        for path, collection in self._collections.items():
+            if not query._covers(path): continue
+            for doc_id in collection.candidates(filters):
+                snapshot = DocumentSnapshot(DocumentReference(self, f'{path}/{doc_id}'), collection.documents[doc_id], read_time)
+                if query._matches(snapshot): snapshots.append(snapshot)
+        return query._arrange(snapshots) if snapshots else snapshots
+
+    def _query(self, query, transaction=None):
+        started = time.perf_counter()
+        if transaction is not None: transaction._check_read()
+        with self._lock: snapshots = [snapshot._select(query._projection) for snapshot in self._select(query)]
+        self._rpc('run_query', started, len(snapshots))
+        return snapshots
+
+    def _aggregate(self, query, aggregations, transaction=None):
+        started = time.perf_counter()
+        if transaction is not None: transaction._check_read()
+        with self._lock: snapshots, read_time = self._select(query), datetime.datetime.now(tz=_UTC)
+        results = []
+        for kind, parts, alias in aggregations:
+            if kind == 'count': results.append(AggregationResult(alias, len(snapshots), read_time)); continue
+            # Non-numeric values are skipped; a sum of nothing is 0 and an average of nothing None.
+            values = [value for found, value in (snapshot._value(parts) for snapshot in snapshots) if found and isinstance(value, (int, float)) and not isinstance(value, bool)]
+            results.append(AggregationResult(alias, sum(values) if kind == 'sum' else sum(values) / len(values) if values else None, read_time))
+        self._rpc('run_aggregation_query', started)
+        return [results]
+
+    def _collection_ids(self, document_path):
+        started, prefix = time.perf_counter(), f'{document_path}/' if document_path else ''
+        with self._lock: ids = sorted({path[len(prefix):].split('/')[0] for path, collection in self._collections.items() if collection.documents and path.startswith(prefix)})
+        self._rpc('list_collection_ids', started)
+        return ids
+
+    def _list_documents(self, collection_path):
+        started, prefix = time.perf_counter(), collection_path + '/'
+        with self._lock:
+            ids = set(self._collections[collection_path].documents) if collection_path in self._collections else set()
+            ids.update(path[len(prefix):].split('/')[0] for path, collection in self._collections.items() if collection.documents and path.startswith(prefix))
+        self._rpc('list_documents', started)
+        return sorted(ids)
+
+    # --- writes ---
+
+    def _apply(self, kind, path, data, option, current, now):
+        """The document's data after one write, or None once deleted; raises as the backend would reject it."""
+        if kind == 'delete': return None
+        if kind == 'create' and current is not None: raise google_exceptions.AlreadyExists(f'Document already exists: {path}')
+        if kind == 'update':
+            if current is None: raise google_exceptions.NotFound(f'No document to update: {path}')
+            result = _copy(current.data)
+            for field_path, value in data.items():
+                parts = _parts(field_path)
+                if value is transforms.DELETE_FIELD: _remove(result, parts)
+                else: _assign(result, parts, _resolve(_lookup(result, parts)[1], value, now))
+            return result
+        if option is True: result, leaves = _copy(current.data) if current is not None else {}, list(_leaves(data))
+        elif option: result, leaves = _copy(current.data) if current is not None else {}, [(path_, value) for path_, value in _leaves(data) if any(path_[:len(_parts(field))] == _parts(field) for field in option)]
+        else: result, leaves = {}, list(_leaves(data))
+        for parts, value in leaves:
+            if value is transforms.DELETE_FIELD:
+                if not option: raise ValueError("Cannot apply DELETE_FIELD in a set request without specifying 'merge=True' or 'merge=[field_paths]'.")
+                _remove(result, parts)
+            else: _assign(result, parts, _resolve(_lookup(result, parts)[1], value, now))
+        return result
+
+    def _write(self, writes, locked=False):
+        """Validates every write, then applies them all under one commit timestamp; one commit RPC."""
+        started = time.perf_counter()
+        if len(writes) > MAX_BATCH_WRITES: raise google_exceptions.InvalidArgument(f'A write batch can contain at most {MAX_BATCH_WRITES} writes.')
+        with self._lock:
+            now, staged = self._now(), {}
+            for kind, path, data, option in writes:
+                current = staged[path] if path in staged else self._document(path)
+                result = self._apply(kind, path, data, option, current, now)
+                staged[path] = _Document(result, current.create_time if current is not None else now, now) if result is not None else None
+            changed = []
+            for path, document in staged.items():
+                collection_path, _, doc_id = path.rpartition('/')
+                self._collections.setdefault(collection_path, _Collection()).put(doc_id, document)
+                changed.append(collection_path)
+            self._notify(set(changed), now)
+        if not locked: self._deliver()
+        self._rpc('commit', started)
+        return [WriteResult(now) for _ in writes]
+
+    # --- listeners ---
+
+    def _listen(self, query, callback):
+        started = time.perf_counter()
+        with self._lock:
+            listener = _Listener(query, callback)
+            self._listeners.append(listener)
+            self._notify(None, datetime.datetime.now(tz=_UTC), [listener])
+        self._deliver()
+        self._rpc('listen', started)
+        return Watch(self, listener)
+
+    def _notify(self, collection_paths, read_time, listeners=None):
+        """Queues each affected listener's new result set and its changes; call with the lock held."""
+        for listener in listeners if listeners is not None else self._listeners:
+            query = listener.query
+            if collection_paths is not None and not any(query._covers(path) for path in collection_paths): continue
+            snapshots, previous = self._select(query), listener.snapshots
+            current = {snapshot.reference.path: snapshot for snapshot in snapshots}
+            order, old_order = {path: index for index, path in enumerate(current)}, {path: index for index, path in enumerate(previous)}
+            changes = [DocumentChange(ChangeType.REMOVED, previous[path], old_order[path], -1) for path in previous if path not in current]
+            for path, snapshot in current.items():
+                if path not in previous: changes.append(DocumentChange(ChangeType.ADDED, snapshot, -1, order[path]))
+                elif snapshot.update_time != previous[path].update_time: changes.append(DocumentChange(ChangeType.MODIFIED, snapshot, old_order[path], order[path]))
+            if changes or collection_paths is None:
+                listener.snapshots = current
+                self._pending.append((listener, (snapshots, changes, read_time)))
+
+    def _deliver(self):
+        """Hands queued snapshots to the delivery thread, (re)starting it in this process if needed."""
+        with self._lock: pending, self._pending = self._pending, []
+        if not pending: return
+        if self._delivery is None or not self._delivery.is_alive() or self._delivery_pid != os.getpid():
+            self._events, self._delivery_pid = queue.Queue(), os.getpid()
+            self._delivery = threading.Thread(target=self._run_delivery, args=(self._events,), name='memory-firestore-watch', daemon=True)
+            self._delivery.start()
+        for event in pending: self._events.put(event)
+
+    def _run_delivery(self, events):
+        while True:
+            listener, args = events.get()
+            if isinstance(self.latency, dict) and self.latency.get('listen'): time.sleep(self.latency['listen'])
+            if listener not in self._listeners: continue
+            try: listener.callback(*args)
+            except Exception: traceback.print_exc()
@@ -0,0 +1,60 @@
+# orders.py
+from firebase_admin import firestore
+from analytics import order_rollups
+
+MAX_BATCH_WRITES = 500
+
+
+class CartError(ValueError):
+    """Raised when a submitted cart cannot be priced (unknown or unpublished product, bad quantity)."""
+
+
+def price_cart(db, cart_items):
+    """Re-prices client cart lines from the products collection with one get_all.
+
+    Only product ids and quantities are taken from the client; names and prices come
+    from Firestore. Returns (order_items, total_price).
+    """
+    quantities = {}
+    for item in cart_items:
+        try: quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError): raise CartError("Invalid cart item.")
+        if quantity < 1 or not item.get('id'): raise CartError("Invalid cart item.")
+        quantities[item['id']] = quantities.get(item['id'], 0) + quantity
+    refs = [db.collection('products').document(product_id) for product_id in quantities]
+    products = {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+    order_items = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if not product or not product.get('isPublished'): raise CartError("Some items in your cart are no longer available.")
+        price = float(product.get('price', 0))
+        order_items.append({'product_id': product_id, 'author_id': product.get('author_id'), 'name': product.get('name'), 'price': price, 'quantity': quantity,
+                            'line_total': round(price * quantity, 2)})
+    return order_items, round(sum(item['price'] * item['quantity'] for item in order_items), 2)
+
+
+def write_order(db, user_id, order_items, total_price):
+    """Writes an order, its items and its revenue rollups with batched writes, chunked at Firestore's 500-write limit.
+
+    Orders that fit one batch are written atomically as 'completed'. Larger orders are
+    written as 'pending' and only flipped to 'completed' by the very last write, after
+    every item and rollup (see analytics.order_rollups), so a failure part-way never
+    leaves a half-written order marked complete. Such a failure may leave some of the
+    pending order's rollups applied.
+    """
+    order_ref = db.collection('orders').document()
+    items_ref = order_ref.collection('items')
+    rollups = order_rollups(db, order_items, total_price)
+    single_batch = len(order_items) + 1 + len(rollups) <= MAX_BATCH_WRITES
+    batch, pending = db.batch(), 0
+    def write(apply):
+        nonlocal batch, pending
+        if pending == MAX_BATCH_WRITES: batch.commit(); batch, pending = db.batch(), 0
+        apply(batch); pending += 1
+    write(lambda batch: batch.set(order_ref, {'user_id': user_id, 'created_at': firestore.SERVER_TIMESTAMP, 'total_price': total_price,
+                                              'item_count': len(order_items), 'status': 'completed' if single_batch else 'pending'}))
+    for item in order_items: write(lambda batch, item=item: batch.set(items_ref.document(), item))
+    for ref, increments in rollups: write(lambda batch, ref=ref, increments=increments: batch.set(ref, increments, merge=True))
+    if not single_batch: write(lambda batch: batch.update(order_ref, {'status': 'completed'}))
+    batch.commit()
+    return order_ref
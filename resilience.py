@@ -0,0 +1,307 @@
+# resilience.py
+import asyncio
+import collections
+import contextvars
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+import cloudinary.exceptions
+from google.api_core import exceptions as google_exceptions
+from rpc_profiler import FIRESTORE_METHODS
+
+# Read-only GAPIC methods, retried on transient errors; writes (commit, batch_write, transactions) get one attempt.
+IDEMPOTENT_FIRESTORE_METHODS = ('batch_get_documents', 'run_query', 'run_aggregation_query', 'list_documents', 'list_collection_ids', 'partition_query')
+STREAMING_METHODS = ('batch_get_documents', 'run_query', 'run_aggregation_query')
+# Errors that say the backend is slow, overloaded or unreachable rather than that the call was wrong.
+TRANSIENT_ERRORS = (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError,
+                    google_exceptions.TooManyRequests, cloudinary.exceptions.GeneralError, cloudinary.exceptions.RateLimited, ConnectionError, TimeoutError)
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+_END = object()
+
+
+def is_transient(error):
+    # Cloudinary raises its base Error (not a subclass) for connection failures and unmapped 5xx responses.
+    return isinstance(error, TRANSIENT_ERRORS) or type(error) is cloudinary.exceptions.Error
+
+
+class BackendUnavailable(Exception):
+    """A call was refused or gave up: the breaker is open, the in-flight limit or request budget is spent, or retries ran out.
+
+    It is deliberately not a GoogleAPICallError, so Firestore's own stream-resume logic
+    does not retry it; views handle it like any other backend failure.
+    """
+
+
+def start_budget(seconds):
+    """Gives the current request `seconds` to spend on backend calls (None or 0 for no limit)."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def end_budget():
+    _deadline.set(None)
+
+
+def remaining_budget():
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive transient failures and refuses calls for `reset_after` seconds.
+
+    Then one trial call is let through (half-open): success closes the breaker, a
+    transient failure opens it for another `reset_after`.
+    """
+
+    def __init__(self, threshold=5, reset_after=10):
+        self.threshold, self.reset_after = threshold, reset_after
+        self._lock = threading.Lock()
+        self.failures, self.opened_at, self._trial = 0, None, False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None: return 'closed'
+            return 'half-open' if self._trial or time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None: return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_after: return False
+            self._trial = True
+            return True
+
+    def release_trial(self):
+        """Gives the trial slot back when a call allowed through never reached the backend."""
+        with self._lock: self._trial = False
+
+    def success(self):
+        with self._lock: self.failures, self.opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold: self.opened_at, self._trial = time.monotonic(), False
+
+
+class _Slots:
+    """A counting semaphore that hands free slots to waiters in arrival order.
+
+    threading.Semaphore is not fair: a thread that has just released a slot usually
+    takes it straight back, so waiters can time out while the backend keeps up.
+    """
+
+    def __init__(self, count):
+        self._condition, self._free, self._waiting = threading.Condition(), count, collections.deque()
+
+    def acquire(self, timeout=0):
+        with self._condition:
+            if self._free and not self._waiting: self._free -= 1; return True
+            ticket = object()
+            self._waiting.append(ticket)
+            acquired = self._condition.wait_for(lambda: self._free and self._waiting[0] is ticket, timeout)
+            self._waiting.remove(ticket)
+            if acquired: self._free -= 1
+            # The next waiter may now be first in line for a slot that is already free.
+            self._condition.notify_all()
+            return acquired
+
+    def release(self):
+        with self._condition:
+            self._free += 1
+            self._condition.notify_all()
+
+
+class Backend:
+    """Deadlines, retries, an in-flight limit and a circuit breaker for one remote service.
+
+    Every call gets a deadline: the smaller of `timeout`, the caller's own and what is
+    left of the request budget (see start_budget). At most `max_in_flight` calls run at
+    once; a call that cannot get a slot within `queue_wait` seconds is refused rather
+    than queued, and so is every call while the breaker is open. Idempotent calls are
+    retried on transient errors with full-jitter exponential backoff, as long as the
+    budget allows. Streaming calls are retried only until their first response; Firestore
+    resumes failures after that itself. Refusals and exhausted retries raise BackendUnavailable.
+    """
+
+    def __init__(self, name, timeout=10, max_in_flight=32, queue_wait=0.25, attempts=3, backoff=0.1, max_backoff=2, threshold=5, reset_after=10,
+                 extra_kwargs=None, transient=is_transient):
+        self.name, self.timeout, self.max_in_flight, self.queue_wait = name, timeout, max_in_flight, queue_wait
+        self.attempts, self.backoff, self.max_backoff, self.transient = attempts, backoff, max_backoff, transient
+        self.threshold, self.reset_after = threshold, reset_after
+        # e.g. {'retry': None} for GAPIC methods, whose built-in retry would otherwise run inside ours.
+        self.extra_kwargs = extra_kwargs or {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'): os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.breaker = CircuitBreaker(self.threshold, self.reset_after)
+        self._slots, self._lock = _Slots(self.max_in_flight), threading.Lock()
+        self._stats = {'calls': 0, 'retries': 0, 'failures': 0, 'refused_open': 0, 'shed': 0, 'budget_spent': 0, 'in_flight': 0}
+
+    def _count(self, stat, amount=1):
+        with self._lock: self._stats[stat] += amount
+
+    def _kwargs(self, kwargs):
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            self._count('budget_spent'); raise BackendUnavailable(f"{self.name}: request budget spent")
+        timeout = min(value for value in (self.timeout, kwargs.get('timeout'), budget) if value is not None)
+        return {**kwargs, **self.extra_kwargs, 'timeout': timeout}
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count('refused_open'); raise BackendUnavailable(f"{self.name}: circuit open")
+        budget = remaining_budget()
+        wait = self.queue_wait if budget is None else max(0, min(self.queue_wait, budget))
+        if not self._slots.acquire(timeout=wait):
+            self.breaker.release_trial(); self._count('shed')
+            raise BackendUnavailable(f"{self.name}: {self.max_in_flight} calls already in flight")
+        self._count('in_flight')
+
+    async def _admit_async(self):
+        # Polls instead of blocking, so a full backend never stalls the event loop.
+        if not self.breaker.allow():
+            self._count('refused_open'); raise BackendUnavailable(f"{self.name}: circuit open")
+        budget = remaining_budget()
+        give_up = time.monotonic() + (self.queue_wait if budget is None else max(0, min(self.queue_wait, budget)))
+        while not self._slots.acquire():
+            if time.monotonic() >= give_up:
+                self.breaker.release_trial(); self._count('shed')
+                raise BackendUnavailable(f"{self.name}: {self.max_in_flight} calls already in flight")
+            await asyncio.sleep(0.005)
+        self._count('in_flight')
+
+    def _release(self, error=None):
+        self._slots.release(); self._count('in_flight', -1)
+        if error is not None and self.transient(error): self._count('failures'); self.breaker.failure()
+        else: self.breaker.success()
+
+    def _retry_delay(self, attempt, error, idempotent):
+        """Seconds to sleep before the next attempt, or None to give up and raise."""
+        if not idempotent or not self.transient(error) or attempt >= self.attempts: return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        budget = remaining_budget()
+        if budget is not None and delay >= budget: return None
+        self._count('retries')
+        return delay
+
+    def _give_up(self, error, attempt):
+        if self.transient(error): raise BackendUnavailable(f"{self.name}: {type(error).__name__} after {attempt} attempt(s)") from error
+        raise error
+
+    def call(self, fn, args, kwargs, idempotent=False):
+        self._count('calls')
+        for attempt in range(1, self.attempts + 1):
+            call_kwargs = self._kwargs(kwargs)
+            self._admit()
+            try: result = fn(*args, **call_kwargs)
+            except Exception as error:
+                self._release(error)
+                if (delay := self._retry_delay(attempt, error, idempotent)) is None: self._give_up(error, attempt)
+                time.sleep(delay); continue
+            self._release()
+            return result
+
+    def stream(self, fn, args, kwargs, idempotent=False):
+        """Generator over a server-streaming call; the call starts on the first next()."""
+        self._count('calls')
+        for attempt in range(1, self.attempts + 1):
+            call_kwargs = self._kwargs(kwargs)
+            self._admit()
+            try:
+                responses = iter(fn(*args, **call_kwargs))
+                first = next(responses, _END)
+            except Exception as error:
+                self._release(error)
+                if (delay := self._retry_delay(attempt, error, idempotent)) is None: self._give_up(error, attempt)
+                time.sleep(delay); continue
+            # The slot covers the wait for the first response, where a slow backend shows; reading the rest is the caller's pace.
+            self._release()
+            break
+        if first is _END: return
+        yield first
+        try: yield from responses
+        except Exception as error:
+            if self.transient(error): self._count('failures'); self.breaker.failure()
+            raise
+
+    async def call_async(self, fn, args, kwargs, idempotent=False):
+        self._count('calls')
+        for attempt in range(1, self.attempts + 1):
+            call_kwargs = self._kwargs(kwargs)
+            await self._admit_async()
+            try: result = await fn(*args, **call_kwargs)
+            except Exception as error:
+                self._release(error)
+                if (delay := self._retry_delay(attempt, error, idempotent)) is None: self._give_up(error, attempt)
+                await asyncio.sleep(delay); continue
+            self._release()
+            return result
+
+    async def stream_async(self, fn, args, kwargs, idempotent=False):
+        self._count('calls')
+        for attempt in range(1, self.attempts + 1):
+            call_kwargs = self._kwargs(kwargs)
+            await self._admit_async()
+            try:
+                responses = (await fn(*args, **call_kwargs)).__aiter__()
+                first = await anext(responses, _END)
+            except Exception as error:
+                self._release(error)
+                if (delay := self._retry_delay(attempt, error, idempotent)) is None: self._give_up(error, attempt)
+                await asyncio.sleep(delay); continue
+            self._release()
+            break
+        if first is _END: return
+        yield first
+        try:
+            async for response in responses: yield response
+        except Exception as error:
+            if self.transient(error): self._count('failures'); self.breaker.failure()
+            raise
+
+    def wrap(self, fn, idempotent=False, streaming=False, asynchronous=None):
+        """Returns fn routed through this backend; `asynchronous` is needed for async GAPIC methods that are plain functions returning awaitables."""
+        if asynchronous if asynchronous is not None else inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def guarded_async(*args, **kwargs):
+                if streaming: return self.stream_async(fn, args, kwargs, idempotent)
+                return await self.call_async(fn, args, kwargs, idempotent)
+            guarded_async._guarded = True
+            return guarded_async
+        @functools.wraps(fn)
+        def guarded(*args, **kwargs):
+            if streaming: return self.stream(fn, args, kwargs, idempotent)
+            return self.call(fn, args, kwargs, idempotent)
+        guarded._guarded = True
+        return guarded
+
+    def stats(self):
+        with self._lock: return {**self._stats, 'breaker': self.breaker.state, 'consecutive_failures': self.breaker.failures}
+
+
+def guard_firestore(client, backend, methods=FIRESTORE_METHODS):
+    """Routes the GAPIC methods of a Firestore Client or AsyncClient through `backend`; returns the client.
+
+    Like rpc_profiler.instrument_firestore it works on the client's private
+    `_firestore_api`, and leaves clients without one (test fakes) untouched.
+    """
+    try: api = client._firestore_api
+    except AttributeError: return client
+    asynchronous = type(api).__name__.endswith('AsyncClient')
+    for method in methods:
+        if hasattr(api, method) and not getattr(getattr(api, method), '_guarded', False):
+            setattr(api, method, backend.wrap(getattr(api, method), idempotent=method in IDEMPOTENT_FIRESTORE_METHODS, streaming=method in STREAMING_METHODS, asynchronous=asynchronous))
+    return client
+
+
+def guard_module(module, backend, methods, idempotent=()):
+    """Routes module-level functions (e.g. cloudinary.uploader's upload/destroy) through `backend`."""
+    for method in methods:
+        if not getattr(getattr(module, method), '_guarded', False): setattr(module, method, backend.wrap(getattr(module, method), idempotent=method in idempotent))
@@ -0,0 +1,154 @@
+# rpc_profiler.py
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+
+# GAPIC methods the Firestore client calls; streaming ones are timed until fully consumed.
+FIRESTORE_METHODS = ('batch_get_documents', 'run_query', 'run_aggregation_query', 'commit', 'begin_transaction', 'rollback',
+                     'list_documents', 'list_collection_ids', 'batch_write', 'partition_query')
+# Which field of a streamed response carries a document, per streaming method.
+DOCUMENT_FIELDS = {'batch_get_documents': 'found', 'run_query': 'document', 'run_aggregation_query': None}
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = contextvars.ContextVar('rpc_profile', default=None)
+
+
+class RequestProfile:
+    """RPC calls, documents read and time spent per (service, method) during one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = defaultdict(lambda: {'count': 0, 'docs': 0, 'ms': 0.0})
+        self._lock = threading.Lock()
+
+    def record(self, service, method, ms, docs=0):
+        with self._lock:
+            call = self.calls[(service, method)]
+            call['count'] += 1; call['docs'] += docs; call['ms'] += ms
+
+    def totals(self):
+        """Returns service -> {'count', 'docs', 'ms'} summed over methods."""
+        totals = defaultdict(lambda: {'count': 0, 'docs': 0, 'ms': 0.0})
+        with self._lock:
+            for (service, _), call in self.calls.items():
+                for key in ('count', 'docs', 'ms'): totals[service][key] += call[key]
+        return dict(totals)
+
+    def breakdown(self):
+        with self._lock:
+            return {f'{service}.{method}': {**call, 'ms': round(call['ms'], 1)} for (service, method), call in self.calls.items()}
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Formats the profile as a Server-Timing header value."""
+        entries = [f'{service};dur={total["ms"]:.1f};desc="{total["count"]} calls, {total["docs"]} docs"' for service, total in self.totals().items()]
+        return ', '.join(entries + [f'total;dur={self.elapsed_ms():.1f}'])
+
+
+def start():
+    profile = RequestProfile()
+    _current.set(profile)
+    return profile
+
+
+def finish():
+    profile = _current.get()
+    _current.set(None)
+    return profile
+
+
+def record(service, method, started, docs=0):
+    profile = _current.get()
+    if profile: profile.record(service, method, (time.perf_counter() - started) * 1000, docs)
+
+
+def _count_documents(responses, service, method, started):
+    field, docs = DOCUMENT_FIELDS.get(method), 0
+    try:
+        for response in responses:
+            if field and getattr(response, field, None): docs += 1
+            yield response
+    finally: record(service, method, started, docs)
+
+
+async def _count_documents_async(responses, service, method, started):
+    field, docs = DOCUMENT_FIELDS.get(method), 0
+    try:
+        async for response in responses:
+            if field and getattr(response, field, None): docs += 1
+            yield response
+    finally: record(service, method, started, docs)
+
+
+def _wrap(service, method, fn, asynchronous=None):
+    # Async GAPIC streaming methods are plain functions returning awaitables, so callers may say so explicitly.
+    if asynchronous if asynchronous is not None else inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def call_async(*args, **kwargs):
+            started = time.perf_counter()
+            try: result = await fn(*args, **kwargs)
+            except Exception: record(service, method, started); raise
+            if method in DOCUMENT_FIELDS: return _count_documents_async(result, service, method, started)
+            record(service, method, started); return result
+        return call_async
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        try: result = fn(*args, **kwargs)
+        except Exception: record(service, method, started); raise
+        if method in DOCUMENT_FIELDS: return _count_documents(result, service, method, started)
+        record(service, method, started); return result
+    return call
+
+
+def instrument_firestore(client):
+    """Wraps the GAPIC methods of a Firestore Client or AsyncClient so each RPC is recorded; returns the client.
+
+    Works at the RPC layer (the client's private `_firestore_api`) so every query,
+    document read, batch and transaction is counted without wrapping references.
+    Clients without that attribute (test fakes) are returned untouched.
+    """
+    try: api = client._firestore_api
+    except AttributeError: return client
+    asynchronous = type(api).__name__.endswith('AsyncClient')
+    for method in FIRESTORE_METHODS:
+        if hasattr(api, method) and not hasattr(getattr(api, method), '__wrapped__'): setattr(api, method, _wrap('firestore', method, getattr(api, method), asynchronous))
+    return client
+
+
+def instrument_module(module, service, methods):
+    """Wraps module-level functions (e.g. cloudinary.uploader's upload/destroy) so each call is recorded."""
+    for method in methods:
+        if not hasattr(getattr(module, method), '__wrapped__'): setattr(module, method, _wrap(service, method, getattr(module, method)))
+
+
+class EndpointMetrics:
+    """Per-endpoint request-duration histograms with RPC and document totals."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, profile):
+        elapsed, totals = profile.elapsed_ms(), profile.totals()
+        bucket = next((str(bound) for bound in self.buckets if elapsed <= bound), '+Inf')
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {'requests': 0, 'total_ms': 0.0, 'histogram_ms': {**{str(b): 0 for b in self.buckets}, '+Inf': 0}, 'services': {}})
+            stats['requests'] += 1; stats['total_ms'] += elapsed; stats['histogram_ms'][bucket] += 1
+            for service, total in totals.items():
+                service_stats = stats['services'].setdefault(service, {'count': 0, 'docs': 0, 'ms': 0.0})
+                for key in ('count', 'docs', 'ms'): service_stats[key] += total[key]
+
+    def snapshot(self):
+        """Returns endpoint -> request count, mean duration, histogram and per-service averages."""
+        with self._lock:
+            return {endpoint: {'requests': stats['requests'], 'mean_ms': round(stats['total_ms'] / stats['requests'], 1), 'histogram_ms': dict(stats['histogram_ms']),
+                               'services': {service: {'calls_per_request': round(total['count'] / stats['requests'], 2), 'docs_per_request': round(total['docs'] / stats['requests'], 2),
+                                                      'ms_per_request': round(total['ms'] / stats['requests'], 1)} for service, total in stats['services'].items()}}
+                    for endpoint, stats in self._endpoints.items()}
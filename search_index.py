@@ -0,0 +1,148 @@
+# search_index.py
+import bisect
+import datetime
+import re
+import threading
+import time
+import traceback
+from firebase_admin import firestore
+
+WORD_RE = re.compile(r'\w+')
+NAME_WEIGHT, DESCRIPTION_WEIGHT, EXACT_MATCH_BOOST = 3, 1, 2
+INDEXED_COLLECTIONS = {'skill': 'skills', 'product': 'products'}
+# Incremental refreshes re-read from this long before the last one started, covering clock skew between host and server.
+REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower()) if text else []
+
+
+def _timestamp(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else time.time()
+
+
+class SearchIndex:
+    """In-memory inverted index over published skills and products.
+
+    Each term maps to a postings dict of (kind, doc_id) -> weight, where words in the
+    name weigh more than words in the description. A lazily re-sorted term array
+    serves prefix lookups, so "weav" still finds "weaving" without storing every
+    prefix on the Firestore documents. Queries AND their terms together and rank by
+    summed weight, then by recency. upsert/remove calls made while a rebuild streams
+    are recorded and replayed onto the rebuilt index, so they are not lost in the swap.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings, self._docs, self._terms, self._terms_dirty = {}, {}, [], False
+        # (kind, doc_id) -> data (None for a removal) written while a rebuild runs; None when none is running.
+        self._changed_during_rebuild = None
+        # When the last rebuild or refresh started reading, by this host's clock.
+        self.synced_at = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, key, data):
+        weights = {}
+        for term in tokenize(data.get('name')): weights[term] = weights.get(term, 0) + NAME_WEIGHT
+        for term in tokenize(data.get('description')): weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            bucket = self._postings.get(term)
+            if bucket is None: self._postings[term] = bucket = {}; self._terms_dirty = True
+            bucket[key] = weight
+        self._docs[key] = (data.get('category'), _timestamp(data.get('created_at')), tuple(weights))
+
+    def _remove(self, key):
+        entry = self._docs.pop(key, None)
+        if not entry: return None
+        for term in entry[2]:
+            bucket = self._postings[term]; bucket.pop(key, None)
+            if not bucket: del self._postings[term]; self._terms_dirty = True
+        return entry
+
+    def upsert(self, kind, doc_id, data):
+        """Indexes a document if it is published, otherwise drops it from the index."""
+        with self._lock:
+            if self._changed_during_rebuild is not None: self._changed_during_rebuild[(kind, doc_id)] = data
+            previous = self._remove((kind, doc_id))
+            if data.get('isPublished'):
+                if previous and data.get('created_at') in (None, firestore.SERVER_TIMESTAMP): data = {**data, 'created_at': datetime.datetime.fromtimestamp(previous[1], tz=datetime.timezone.utc)}
+                self._add((kind, doc_id), data)
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            if self._changed_during_rebuild is not None: self._changed_during_rebuild[(kind, doc_id)] = None
+            self._remove((kind, doc_id))
+
+    def search(self, query, kind=None, category=None):
+        """Returns ids of documents matching every term of `query` (as prefixes), best match first."""
+        terms = tokenize(query)
+        if not terms: return []
+        with self._lock:
+            if self._terms_dirty: self._terms, self._terms_dirty = sorted(self._postings), False
+            candidates = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                scores, i = {}, bisect.bisect_left(self._terms, term)
+                while i < len(self._terms) and self._terms[i].startswith(term):
+                    boost = EXACT_MATCH_BOOST if self._terms[i] == term else 1
+                    for key, weight in self._postings[self._terms[i]].items():
+                        if (kind and key[0] != kind) or (candidates is not None and key not in candidates): continue
+                        scores[key] = max(scores.get(key, 0), weight * boost)
+                    i += 1
+                candidates = scores if candidates is None else {key: candidates[key] + score for key, score in scores.items()}
+                if not candidates: return []
+            ranked = [(score, self._docs[key][1], key[1]) for key, score in candidates.items() if not category or self._docs[key][0] == category]
+        ranked.sort(reverse=True)
+        return [doc_id for _, _, doc_id in ranked]
+
+    def rebuild(self, db):
+        """Rebuilds the whole index from Firestore off to the side, then swaps it in and replays writes made meanwhile."""
+        fresh, started = SearchIndex(), datetime.datetime.now(tz=datetime.timezone.utc)
+        with self._lock: self._changed_during_rebuild = {}
+        try:
+            for kind, collection in INDEXED_COLLECTIONS.items():
+                for doc in db.collection(collection).where(filter=firestore.FieldFilter('isPublished', '==', True)).stream():
+                    fresh._add((kind, doc.id), doc.to_dict())
+            with self._lock:
+                self._postings, self._docs, self._terms, self._terms_dirty = fresh._postings, fresh._docs, [], True
+                for (kind, doc_id), data in self._changed_during_rebuild.items():
+                    if data is None: self._remove((kind, doc_id))
+                    else: self.upsert(kind, doc_id, data)
+                self.ready, self.synced_at = True, started
+        finally:
+            with self._lock: self._changed_during_rebuild = None
+
+    def refresh(self, db):
+        """Applies documents whose `updated_at` moved since the last sync; returns how many were read.
+
+        Every write that changes what the index holds (create, edit, publish toggle, the
+        delete mark) stamps `updated_at`, so this reads only what changed. Documents that
+        are no longer published are dropped by upsert().
+        """
+        started, count = datetime.datetime.now(tz=datetime.timezone.utc), 0
+        for kind, collection in INDEXED_COLLECTIONS.items():
+            for doc in db.collection(collection).where(filter=firestore.FieldFilter('updated_at', '>=', self.synced_at - REFRESH_OVERLAP)).stream():
+                self.upsert(kind, doc.id, doc.to_dict()); count += 1
+        with self._lock: self.synced_at = started
+        return count
+
+    def start_background_refresh(self, db, interval=300, delay=0, full_interval=86400):
+        """Builds the index in a daemon thread (after `delay` seconds), then refreshes it every `interval` seconds.
+
+        Refreshes read only documents updated since the last one, picking up writes made by
+        other worker processes; a full rebuild every `full_interval` seconds catches any
+        write that did not stamp `updated_at` (e.g. a hard delete from the console).
+        """
+        def refresh_loop():
+            time.sleep(delay)
+            rebuilt = time.monotonic() if self.ready else float('-inf')
+            while True:
+                try:
+                    if not self.ready or time.monotonic() - rebuilt >= full_interval: self.rebuild(db); rebuilt = time.monotonic()
+                    else: self.refresh(db)
+                except Exception: traceback.print_exc()
+                time.sleep(interval)
+        threading.Thread(target=refresh_loop, name='search-index-refresh', daemon=True).start()
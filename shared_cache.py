@@ -0,0 +1,238 @@
+# shared_cache.py
+import datetime
+import os
+import sqlite3
+import stat
+import threading
+import time
+import traceback
+import msgpack
+from cachetools import TTLCache
+from markupsafe import Markup
+
+# msgpack extension codes for what cached values hold beyond plain data; tz-aware datetimes use msgpack's own.
+_MARKUP, _FROZENSET, _TUPLE = 1, 2, 3
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (namespace TEXT NOT NULL, version INTEGER NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL, expires REAL NOT NULL,
+                                    PRIMARY KEY (namespace, version, key)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+CREATE TABLE IF NOT EXISTS versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL);
+"""
+
+
+def _default(obj):
+    # strict_types sends subclasses here too, so Markup stays Markup and Firestore's DatetimeWithNanoseconds becomes a datetime.
+    if isinstance(obj, Markup): return msgpack.ExtType(_MARKUP, str(obj).encode())
+    if isinstance(obj, (set, frozenset)): return msgpack.ExtType(_FROZENSET, pack(list(obj)))
+    if isinstance(obj, tuple): return msgpack.ExtType(_TUPLE, pack(list(obj)))
+    if isinstance(obj, datetime.datetime) and obj.tzinfo: return datetime.datetime.combine(obj.date(), obj.time(), obj.tzinfo)
+    for base in (str, int, float, list, dict):
+        if isinstance(obj, base): return base(obj)
+    raise TypeError(f"cannot serialize {type(obj).__name__} for the shared cache")
+
+
+def _ext_hook(code, data):
+    if code == _MARKUP: return Markup(data.decode())
+    if code == _FROZENSET: return frozenset(unpack(data))
+    if code == _TUPLE: return tuple(unpack(data))
+    return msgpack.ExtType(code, data)
+
+
+def pack(value):
+    return msgpack.packb(value, default=_default, datetime=True, strict_types=True, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, timestamp=3, strict_map_key=False)
+
+
+class SharedCache:
+    """One cache file read and written by every worker process on the host.
+
+    Values are msgpack-encoded into a WAL-mode SQLite database, so readers never block
+    on the single writer. Every entry has an absolute expiry and belongs to a namespace
+    version: bump() moves a namespace on, which makes everything written under the old
+    version unreachable at once for all workers. Dead versions, expired entries and,
+    past `max_entries`, the entries closest to expiry are evicted every `evict_every`
+    writes, so reads never write. Each thread opens its own connection, and a forked
+    child opens new ones. A database error (e.g. a lock held past `timeout`) is printed
+    and treated as a miss, so the tier can slow a request down but never fail it.
+
+    Cached values are trusted (user flags, pre-rendered Markup), so the file is created
+    with mode 0600 and one another user owns, or can read or write, is refused.
+    """
+
+    def __init__(self, path, max_entries=100_000, timeout=0.1, evict_every=256):
+        self.path, self.max_entries, self.timeout, self.evict_every = path, max_entries, timeout, evict_every
+        self._local = threading.local()
+        self._writes = 0
+        self._check_ownership()
+
+    def _check_ownership(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600))
+        # SQLite creates the -wal and -shm files with the database's mode, but would also use ones planted beforehand.
+        for path in (self.path, self.path + '-wal', self.path + '-shm'):
+            try: info = os.lstat(path)
+            except FileNotFoundError: continue
+            if not stat.S_ISREG(info.st_mode) or (hasattr(os, 'geteuid') and info.st_uid != os.geteuid()) or info.st_mode & 0o077:
+                raise PermissionError(f"Refusing to use {path} as the shared cache: it must be a file owned by this user with mode 0600.")
+
+    def _connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def _run(self, fallback, operation):
+        try: return operation(self._connection())
+        except sqlite3.Error:
+            traceback.print_exc()
+            return fallback
+
+    def version(self, namespace):
+        """Returns the namespace's current version, or None if the database cannot be read."""
+        def read(connection):
+            row = connection.execute('SELECT version FROM versions WHERE namespace = ?', (namespace,)).fetchone()
+            return row[0] if row else 0
+        return self._run(None, read)
+
+    def bump(self, namespace):
+        """Invalidates every entry of the namespace; returns the new version, or None on error."""
+        def write(connection):
+            connection.execute('INSERT INTO versions VALUES (?, 1) ON CONFLICT (namespace) DO UPDATE SET version = version + 1', (namespace,))
+            return connection.execute('SELECT version FROM versions WHERE namespace = ?', (namespace,)).fetchone()[0]
+        return self._run(None, write)
+
+    def get(self, namespace, version, key):
+        """Returns the live value stored under key, or None."""
+        row = self._run(None, lambda connection: connection.execute('SELECT value FROM entries WHERE namespace = ? AND version = ? AND key = ? AND expires > ?',
+                                                                    (namespace, version, pack(key), time.time())).fetchone())
+        return unpack(row[0]) if row else None
+
+    def set(self, namespace, version, key, value, ttl):
+        """Stores value for ttl seconds if the namespace is still at `version`; returns False if it was not stored.
+
+        Checking the version in the same statement keeps a value loaded before a bump
+        (by any worker) from landing after it.
+        """
+        try: data = pack(value)
+        except TypeError: return False
+        def write(connection):
+            written = connection.execute('INSERT OR REPLACE INTO entries SELECT ?, ?, ?, ?, ? WHERE ? = coalesce((SELECT version FROM versions WHERE namespace = ?), 0)',
+                                         (namespace, version, pack(key), data, time.time() + ttl, version, namespace)).rowcount > 0
+            self._writes += 1
+            if self._writes % self.evict_every == 0: self._evict(connection)
+            return written
+        return self._run(False, write)
+
+    def delete(self, namespace, version, key):
+        self._run(None, lambda connection: connection.execute('DELETE FROM entries WHERE namespace = ? AND version = ? AND key = ?', (namespace, version, pack(key))))
+
+    def _evict(self, connection):
+        connection.execute('DELETE FROM entries WHERE expires <= ?', (time.time(),))
+        connection.execute('DELETE FROM entries WHERE version < (SELECT version FROM versions WHERE versions.namespace = entries.namespace)')
+        excess = connection.execute('SELECT count(*) FROM entries').fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute('DELETE FROM entries WHERE (namespace, version, key) IN (SELECT namespace, version, key FROM entries ORDER BY expires LIMIT ?)', (excess,))
+
+    def stats(self):
+        def read(connection):
+            rows = connection.execute('SELECT namespace, count(*) FROM entries WHERE expires > ? GROUP BY namespace', (time.time(),)).fetchall()
+            return {'path': self.path, 'entries': dict(rows), 'bytes': os.path.getsize(self.path)}
+        return self._run(None, read)
+
+
+class TieredCache:
+    """A per-process TTL/LRU in front of one namespace of a SharedCache.
+
+    It stands in for the LocalCache a loader would otherwise keep (get, item assignment,
+    version/set, pop and clear), so a loader does not know which one it has. A local
+    hit costs a dict lookup; a local miss reads the shared file and keeps the value
+    locally for `local_ttl` seconds. pop() deletes the shared entry, but other workers
+    may serve their local copy until it expires; clear() bumps the namespace version,
+    which every worker notices within `check_interval` seconds. Values the shared tier
+    cannot serialize are kept locally only. A loader reads version() before loading and
+    stores with set(key, value, version), which drops the value if any worker cleared
+    the namespace in between.
+    """
+
+    def __init__(self, shared, namespace, maxsize=1024, ttl=60, local_ttl=5, check_interval=1):
+        self.shared, self.namespace, self.ttl, self.check_interval = shared, namespace, ttl, check_interval
+        self._local = TTLCache(maxsize=maxsize, ttl=min(local_ttl, ttl))
+        self._lock = threading.Lock()
+        self._version, self._checked = None, float('-inf')
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def _current_version(self):
+        """The namespace version, re-read at most every check_interval; a change drops the local tier."""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval: return self._version
+        version = self.shared.version(self.namespace)
+        with self._lock:
+            self._checked = now
+            if version != self._version: self._local.clear(); self._version = version
+        return version
+
+    def get(self, key, default=None):
+        version = self._current_version()
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None: self._stats['local_hits'] += 1; return value
+        value = self.shared.get(self.namespace, version, key) if version is not None else None
+        with self._lock:
+            if value is None: self._stats['misses'] += 1; return default
+            self._stats['shared_hits'] += 1
+            if version == self._version: self._local[key] = value
+        return value
+
+    def version(self):
+        """The namespace version to pass to set() for a value loaded from now on; None if the shared file cannot be read."""
+        return self._current_version()
+
+    def set(self, key, value, version):
+        """Stores a value loaded after version() returned `version`, unless the namespace has moved on since."""
+        with self._lock:
+            if version == self._version: self._local[key] = value
+        if version is not None: self.shared.set(self.namespace, version, key, value, self.ttl)
+
+    def __setitem__(self, key, value):
+        version = self._current_version()
+        with self._lock: self._local[key] = value
+        if version is not None: self.shared.set(self.namespace, version, key, value, self.ttl)
+
+    def pop(self, key, default=None):
+        version = self._current_version()
+        with self._lock: value = self._local.pop(key, default)
+        if version is not None: self.shared.delete(self.namespace, version, key)
+        return value
+
+    def clear(self):
+        version = self.shared.bump(self.namespace)
+        with self._lock:
+            self._local.clear()
+            self._version, self._checked = version, time.monotonic() if version is not None else float('-inf')
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._stats.values())
+            return {**self._stats, 'hit_ratio': round((lookups - self._stats['misses']) / max(lookups, 1), 3), 'version': self._version}
+
+
+class LocalCache(TTLCache):
+    """A per-process TTLCache with TieredCache's version()/set(), for loaders running without a shared tier."""
+
+    def version(self):
+        return 0
+
+    def set(self, key, value, version):
+        self[key] = value
+
+
+def cache_backend(shared, namespace, maxsize, ttl, local_ttl=5):
+    """The mapping a loader caches into: tiered over `shared` when there is one, else a per-process LocalCache."""
+    if shared is None: return LocalCache(maxsize=maxsize, ttl=ttl)
+    return TieredCache(shared, namespace, maxsize=maxsize, ttl=ttl, local_ttl=local_ttl)
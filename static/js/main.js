@@ -60,6 +60,42 @@ document.addEventListener('DOMContentLoaded', () => {
     
     // The broken Shopping Cart Module has been correctly removed from here.
 
+    // --- Infinite Scroll for Paginated Card Grids ---
+    const scrollGrid = document.querySelector('.card-grid[data-infinite-scroll]');
+    if (scrollGrid && scrollGrid.dataset.nextUrl && 'IntersectionObserver' in window) {
+        const loadMoreLink = document.querySelector('[data-load-more]');
+        const sentinel = document.createElement('div');
+        sentinel.className = 'infinite-scroll-sentinel';
+        scrollGrid.after(sentinel);
+        if (loadMoreLink) loadMoreLink.closest('.load-more').style.display = 'none';
+
+        let isLoading = false;
+        const observer = new IntersectionObserver((entries) => {
+            if (!entries[0].isIntersecting || isLoading || !scrollGrid.dataset.nextUrl) return;
+            isLoading = true;
+            fetch(scrollGrid.dataset.nextUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(res => res.json())
+                .then(data => {
+                    if (data.status !== 'success') throw new Error(data.message);
+                    scrollGrid.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_url) {
+                        scrollGrid.dataset.nextUrl = data.next_url;
+                    } else {
+                        delete scrollGrid.dataset.nextUrl;
+                        observer.disconnect();
+                        sentinel.remove();
+                    }
+                })
+                .catch(error => {
+                    console.error('Infinite scroll failed:', error);
+                    observer.disconnect();
+                    if (loadMoreLink) loadMoreLink.closest('.load-more').style.display = '';
+                })
+                .finally(() => { isLoading = false; });
+        }, { rootMargin: '400px 0px' });
+        observer.observe(sentinel);
+    }
+
     const reviewList = document.getElementById('review-list');
     if(reviewList) {
         reviewList.addEventListener('click', function(event) {
@@ -0,0 +1,77 @@
+# user_profiles.py
+import threading
+from collections import defaultdict
+from cachetools import LRUCache
+from shared_cache import LocalCache
+
+
+class UserProfileLoader:
+    """Resolves user profile documents in batches, behind a process-wide TTL/LRU cache.
+
+    Views collect every author/user id they need and call `get_many` once; ids that
+    are not cached are fetched with a single `db.get_all` round trip. Missing users
+    are cached as empty dicts so repeat lookups of deleted accounts stay cheap.
+    Passing a `label` (e.g. the request endpoint) records cache hits/misses under it.
+    `cache` replaces the default shared_cache.LocalCache with any mapping offering
+    get, version/set, pop and clear (e.g. a shared_cache.TieredCache). While the
+    backend is down (a `stale_on` error), the last profile fetched for each id is
+    served instead, until invalidate() drops it.
+    """
+
+    def __init__(self, db, maxsize=2048, ttl=300, cache=None, stale_on=()):
+        self.db = db
+        self._cache = cache if cache is not None else LocalCache(maxsize=maxsize, ttl=ttl)
+        # Last fetched profile per id, kept through expiry for fetches failing with a `stale_on` error.
+        self._stale, self.stale_on = LRUCache(maxsize=maxsize), stale_on
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._epoch = 0
+
+    def get_many(self, user_ids, label=None):
+        """Returns a dict of uid -> profile dict for every truthy id in `user_ids`."""
+        wanted = {uid for uid in user_ids if uid}
+        profiles, missing = {}, []
+        with self._lock:
+            for uid in wanted:
+                cached = self._cache.get(uid)
+                if cached is None: missing.append(uid)
+                else: profiles[uid] = cached
+            if label:
+                self._stats[label]['hits'] += len(profiles); self._stats[label]['misses'] += len(missing)
+            epoch = self._epoch
+        if missing:
+            version = self._cache.version()
+            refs = [self.db.collection('users').document(uid) for uid in missing]
+            try: fetched = {doc.id: (doc.to_dict() or {}) if doc.exists else {} for doc in self.db.get_all(refs)}
+            except self.stale_on:
+                with self._lock: stale = {uid: self._stale[uid] for uid in missing if uid in self._stale}
+                if len(stale) < len(missing): raise
+                return {**profiles, **stale}
+            with self._lock:
+                # A fetch that raced with invalidate/clear may predate the write, so it is served once but not stored.
+                for uid in missing:
+                    profiles[uid] = fetched.get(uid, {})
+                    if epoch == self._epoch:
+                        self._cache.set(uid, profiles[uid], version)
+                        if self.stale_on: self._stale[uid] = profiles[uid]
+        return profiles
+
+    def get(self, user_id, label=None):
+        """Returns a single user's profile dict, or an empty dict if it does not exist."""
+        if not user_id: return {}
+        return self.get_many([user_id], label=label).get(user_id, {})
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._epoch += 1
+            self._cache.pop(user_id, None); self._stale.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._cache.clear(); self._stale.clear()
+
+    def stats(self):
+        """Returns per-label hit/miss counts and hit ratios recorded so far."""
+        with self._lock:
+            return {label: {**counts, 'hit_ratio': round(counts['hits'] / max(counts['hits'] + counts['misses'], 1), 3)} for label, counts in self._stats.items()}